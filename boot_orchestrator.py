@@ -0,0 +1,107 @@
+import time
+
+# Step states
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+
+class BootStep():
+
+    def __init__(self, name, generator, timeout, critical=False, on_done=None):
+        self.name = name
+        self.generator = generator
+        self.timeout = timeout
+        self.critical = critical
+        self.on_done = on_done
+        self.state = PENDING
+        self.result = None
+        self.timer_start = None
+        self.elapsed_ms = None
+
+class BootOrchestrator():
+    # Brings devices up as independent cooperative steps, so the control loop can start as soon
+    # as the critical ones are ready while slow devices (e.g. the gascard) attach later.
+    #
+    # Each step is a generator that yields whenever it is waiting, and returns its device(s).
+    # service() advances every pending step by one yield. A step that runs past its timeout, or
+    # raises, is abandoned and its device stays unavailable. The timeout is checked at each yield,
+    # so it can only stop a step between yields, never interrupt a call that hangs.
+    # A timeout of None never expires, see call().
+    # on_done(result) is called once a step has returned.
+    # Step times are passed on to profiler (a BootProfiler) if one is given.
+
+    def __init__(self, log=None, profiler=None):
+        self.log = log
+        self.profiler = profiler
+        self.steps = []
+        self.timer_start = time.monotonic()
+
+    def add(self, name, generator, timeout, critical=False, on_done=None):
+        self.steps.append(BootStep(name, generator, timeout, critical, on_done))
+
+    def step(self, name):
+        for s in self.steps:
+            if s.name == name:
+                return s
+        return None
+
+    def pending(self, names=None):
+        # True while any of the named steps (default all) is still running
+        for s in self.steps:
+            if s.state == PENDING and (names is None or s.name in names):
+                return True
+        return False
+
+    def _finish(self, s, state, message=None):
+        s.state = state
+        s.elapsed_ms = int((time.monotonic() - s.timer_start) * 1000)
+        if self.profiler:
+            self.profiler.record(s.name, s.elapsed_ms)
+        if self.log:
+            if state == DONE:
+                self.log.info(f'boot step {s.name} done in {s.elapsed_ms}ms')
+            else:
+                self.log.warning(f'boot step {s.name} {state} after {s.elapsed_ms}ms {message}')
+
+    def _advance(self, s):
+        if s.timer_start is None:
+            s.timer_start = time.monotonic()
+        try:
+            next(s.generator)
+        except StopIteration as e:
+            s.result = e.value
+            self._finish(s, DONE)
+            if s.on_done:
+                s.on_done(s.result)
+            return
+        except Exception as e:
+            self._finish(s, FAILED, e)
+            return
+
+        if s.timeout is not None and time.monotonic() - s.timer_start > s.timeout:
+            s.generator.close()
+            self._finish(s, TIMEOUT, f'(limit {s.timeout}s)')
+
+    def service(self, critical_only=False):
+        for s in self.steps:
+            if s.state != PENDING:
+                continue
+            if critical_only and not s.critical:
+                continue
+            self._advance(s)
+
+    def run_critical(self):
+        # Blocks until every critical step has finished, one way or another
+        while self.pending([s.name for s in self.steps if s.critical]):
+            self.service(critical_only=True)
+        if self.log:
+            elapsed_ms = int((time.monotonic() - self.timer_start) * 1000)
+            self.log.info(f'critical devices up after {elapsed_ms}ms')
+
+
+def call(function):
+    # A step that runs a plain function to completion on its first service. It never yields,
+    # so a timeout could never fire: add it with timeout=None.
+    return function()
+    yield
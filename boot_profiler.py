@@ -0,0 +1,35 @@
+import gc
+import time
+
+class BootProfiler():
+    # Duration and free heap at the end of each boot phase, sent once as compact note fields
+    # so slow boots can be compared across boxes.
+    # mark() ends the phase running since the previous mark. Phases that overlap others, like
+    # BootOrchestrator steps, are timed by their owner and added with record().
+
+    def __init__(self):
+        self.timer_start = time.monotonic_ns()
+        self.timer_phase = self.timer_start
+        self.phases = [] # (name, ms, free heap kB)
+        self.total_ms = None
+
+    def mark(self, name):
+        now = time.monotonic_ns()
+        self.phases.append((name, (now - self.timer_phase) // 1000000, gc.mem_free() // 1024))
+        self.timer_phase = now
+
+    def record(self, name, ms):
+        self.phases.append((name, ms, gc.mem_free() // 1024))
+
+    def complete(self):
+        # Time from the profiler being created until the control loop can start
+        self.mark('complete')
+        self.total_ms = (self.timer_phase - self.timer_start) // 1000000
+
+    def report(self):
+        return {
+            'boot-phases'   : ','.join([p[0] for p in self.phases]),
+            'boot-ms'       : [p[1] for p in self.phases],
+            'boot-kb'       : [p[2] for p in self.phases],
+            'boot-total-ms' : self.total_ms,
+        }
@@ -3,10 +3,19 @@ import supervisor
 supervisor.disable_autoreload()
 
 # If CIRCUITPY drive is writable (configured in boot.py) this will update code files over-the-air
-from circuitpy_mcu.ota_bootloader import Bootloader
-url = 'https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_list.py'
-bl = Bootloader(url)
+# Only files whose hash differs from ota_manifest.jsonl are downloaded, plus any it lists unpinned.
+# Falls back to fetching everything in ota_list.py if the delta update can't run.
+import storage
+if not storage.getmount('/').readonly:
+    try:
+        from circuitpy_septic_tank.ota_manifest import Updater, connect_wifi
+        Updater(connect_wifi()).update()
+    except Exception as e:
+        print(f'Delta OTA failed: {e}')
+        from circuitpy_mcu.ota_bootloader import Bootloader
+        url = 'https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_list.py'
+        bl = Bootloader(url)
 
 code = '/circuitpy_septic_tank/septic_tank.py'
 supervisor.set_next_code_file(code, reload_on_success=False)
-supervisor.reload()
\ No newline at end of file
+supervisor.reload()
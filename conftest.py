@@ -0,0 +1,30 @@
+# pytest setup for the host-side tests, run from the repo root with either of:
+#
+#   pytest
+#   python -m pytest
+#
+# Host only, never copied to a device.
+
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# The device entry point code.py has the same name as the standard library's code module,
+# which pytest's debugger support imports. python -m pytest puts the repo root first on sys.path,
+# so load the standard library module before anything else can pick up code.py instead.
+_path = sys.path[:]
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or os.curdir) != REPO_ROOT]
+import code
+sys.path[:] = _path
+
+import sim
+
+@pytest.fixture(autouse=True)
+def host():
+    # Every test starts and ends on the plain host: no stand-in modules, real time functions
+    sim.uninstall()
+    yield
+    sim.uninstall()
@@ -0,0 +1,38 @@
+# Device drivers, imported the first time they are asked for rather than at startup, so boxes
+# without a peripheral (or with it disabled in env) don't spend the import time and RAM on it.
+#
+#   MCP9600 = drivers.get('MCP9600')
+#
+# Each entry is name -> (module, attribute). An attribute of None gives the module itself.
+
+REGISTRY = {
+    'MCP9600'           : ('adafruit_mcp9600', 'MCP9600'),
+    'ADS1115'           : ('adafruit_ads1x15.ads1115', None),
+    'AnalogIn'          : ('adafruit_ads1x15.analog_in', 'AnalogIn'),
+    'MotorKit'          : ('adafruit_motorkit', 'MotorKit'),
+    'Gascard'           : ('circuitpy_septic_tank.gascard', 'Gascard'),
+    'PhProbe'           : ('circuitpy_septic_tank.ph_probe', 'PhProbe'),
+    'read_batch'        : ('circuitpy_septic_tank.ph_probe', 'read_batch'),
+    'ph_calibration'    : ('circuitpy_septic_tank.ph_calibration_bank', None),
+    'make_controller'   : ('circuitpy_septic_tank.jacket_controller', 'make_controller'),
+    'RelayStats'        : ('circuitpy_septic_tank.relay_stats', 'RelayStats'),
+    'journal'           : ('circuitpy_septic_tank.journal', None),
+    'Journal'           : ('circuitpy_septic_tank.journal', 'Journal'),
+    'PumpTuner'         : ('circuitpy_septic_tank.pump_tuner', 'PumpTuner'),
+    'pump_tuning'       : ('circuitpy_septic_tank.pump_tuner', None),
+}
+
+loaded = {}
+
+def get(name):
+    if name not in loaded:
+        module_name, attribute = REGISTRY[name]
+        # __import__ returns the top level package, walk down to the submodule
+        module = __import__(module_name)
+        for part in module_name.split('.')[1:]:
+            module = getattr(module, part)
+        if attribute is None:
+            loaded[name] = module
+        else:
+            loaded[name] = getattr(module, attribute)
+    return loaded[name]
@@ -0,0 +1,50 @@
+import time
+
+def _snapshot(val):
+    # Copy mutable values, so in-place changes to env are still seen as a diff
+    if isinstance(val, list):
+        return list(val)
+    if isinstance(val, dict):
+        return dict(val)
+    return val
+
+class EnvDispatcher():
+    # Applies environment variables as a diff against the last applied values.
+    # handlers is a precomputed table of key -> function(key, val).
+    # Only keys whose value has changed are dispatched, keys with no handler are ignored.
+    # A handler shared by several keys (e.g. an alarm depending on two settings) runs once per update.
+
+    def __init__(self, handlers, log=None):
+        self.handlers = handlers
+        self.log = log
+        self.applied = {}
+
+    def changed_keys(self, env):
+        changed = []
+        for key, val in env.items():
+            if key in self.applied and self.applied[key] == val:
+                continue
+            changed.append(key)
+        return changed
+
+    def apply(self, env):
+        start = time.monotonic_ns()
+
+        changed = self.changed_keys(env)
+        for key in changed:
+            self.applied[key] = _snapshot(env[key])
+
+        touched = []
+        called = []
+        for key in changed:
+            handler = self.handlers.get(key)
+            if handler and handler not in called:
+                handler(key, env[key])
+                called.append(handler)
+                touched.append(key)
+
+        if self.log:
+            elapsed_ms = (time.monotonic_ns() - start) / 1000000
+            self.log.info(f'env applied in {elapsed_ms:.1f}ms, {len(touched)}/{len(changed)} changed keys handled {touched}')
+
+        return touched
@@ -4,6 +4,11 @@ from circuitpy_mcu.mcu import Mcu
 from circuitpy_mcu.notecard_manager import Notecard_manager
 
 from circuitpy_septic_tank.solenoid_valve import Valve
+from circuitpy_septic_tank.valve_events import ValveEvents
+from circuitpy_septic_tank.env_dispatch import EnvDispatcher
+from circuitpy_septic_tank.valve_commands import parse_command
+from circuitpy_septic_tank.send_policy import SendPolicy
+from circuitpy_septic_tank.heap_monitor import HeapMonitor
 
 import time
 import board
@@ -56,6 +61,10 @@ def main():
         'utc-offset-hours'      : 1,
         'valve-open-duration'   : 10, #seconds open in a pulse
         'valve-close-duration'  : 120, #seconds closed in a pulse
+        'valve-event-window'    : 30, #seconds, valve changes within this are sent as one record
+        'note-send-interval'    : 15, #minutes, when there is new data to send
+        'note-send-max-interval': 60, #minutes, longest notes are held back, or between syncs when offline
+        'heap-monitor'          : False, # per loop stage heap use, sent with each sync
         'v01-mode'              : "auto", # or "manual"
         'v01-manual-pos'        : "closed", # or "open"
         'v02-mode'              : "auto", # or "manual"
@@ -83,61 +92,92 @@ def main():
         'ota'                   : __version__
     }
 
-    def parse_environment():
+    def set_pulses(key, val):
+        for v in valves:
+            v.pulses = val
+
+    def set_close_duration(key, val):
+        for v in valves:
+            v.close_duration = val
+
+    def set_open_duration(key, val):
+        for v in valves:
+            v.open_duration = val
+
+    def set_event_window(key, val):
+        valve_events.window = val
+
+    def set_feed_alarm(key, val):
         nonlocal next_feed_countdown
         nonlocal next_feed
         nonlocal timer_feed
 
-        for key, val in env.items():
-
-            if key == 'pulses':
-                for v in valves:
-                    v.pulses = val
-
-            if key == 'valve-close-duration':
-                for v in valves:
-                    v.close_duration = val
-
-            if key == 'valve-open-duration':
-                for v in valves:
-                    v.open_duration = val
-
-            if key == 'feed-times':
-                timer_feed = time.monotonic()
-                next_feed_countdown = mcu.get_next_alarm(val, env['utc-offset-hours'])
-                next_feed = time.localtime(time.time() + next_feed_countdown + env['utc-offset-hours']*60*60)
-                mcu.log.info(f"alarm set for {next_feed.tm_hour:02d}:{next_feed.tm_min:02d}:00 localtime")
-
-            if key[0] == 'v' and key[3] == '-':
-                valve_index = int(key[1:3])
-                category = key[4:]
-                try:
-                    if category == 'mode':
-                        if val == 'auto':
-                            valves[valve_index-1].manual = False
-                        else:
-                            valves[valve_index-1].manual = True
-
-                    elif category == 'manual-pos':
-                        if val == 'open':
-                            valves[valve_index-1].manual_pos = True
-                        else:
-                            valves[valve_index-1].manual_pos = False
-                except IndexError:
-                    # May get this if valve has not been instantiated
-                    mcu.log.warning(f"IndexError: Could not set {key} to {val}")
-
-            if key == 'ota':
-                if val == __version__:
-                    mcu.log.info(f"Not performing OTA, version matches {val}")
-                else:
-                    for v in valves:
-                        v.throttle = 0
-                    mcu.ota_reboot()
+        timer_feed = time.monotonic()
+        next_feed_countdown = mcu.get_next_alarm(env['feed-times'], env['utc-offset-hours'])
+        next_feed = time.localtime(time.time() + next_feed_countdown + env['utc-offset-hours']*60*60)
+        mcu.log.info(f"alarm set for {next_feed.tm_hour:02d}:{next_feed.tm_min:02d}:00 localtime")
+
+    def valve_setting_handler(valve_index, category):
+        # Index and category are resolved once here, rather than sliced from the key on every update
+        def handler(key, val):
+            try:
+                if category == 'mode':
+                    if val == 'auto':
+                        valves[valve_index-1].manual = False
+                    else:
+                        valves[valve_index-1].manual = True
+
+                elif category == 'manual-pos':
+                    if val == 'open':
+                        valves[valve_index-1].manual_pos = True
+                    else:
+                        valves[valve_index-1].manual_pos = False
+            except IndexError:
+                # May get this if valve has not been instantiated
+                mcu.log.warning(f"IndexError: Could not set {key} to {val}")
+        return handler
+
+    def set_heap_monitor(key, val):
+        heap.enabled = val
+        heap.reset()
+
+    def check_ota(key, val):
+        if val == __version__:
+            mcu.log.info(f"Not performing OTA, version matches {val}")
+        else:
+            for v in valves:
+                v.throttle = 0
+            mcu.ota_reboot()
+
+    def set_send_policy(key, val):
+        send_policy.configure(env['note-send-interval'] * MINUTES,
+                              env['note-send-max-interval'] * MINUTES)
+
+    # Only changed environment variables are dispatched, see parse_environment()
+    env_handlers = {
+        'pulses'                : set_pulses,
+        'valve-close-duration'  : set_close_duration,
+        'valve-open-duration'   : set_open_duration,
+        'valve-event-window'    : set_event_window,
+        'feed-times'            : set_feed_alarm,
+        'utc-offset-hours'      : set_feed_alarm,
+        'heap-monitor'          : set_heap_monitor,
+        'note-send-interval'    : set_send_policy,
+        'note-send-max-interval': set_send_policy,
+        'ota'                   : check_ota,
+    }
+    for key in env:
+        if key[0] == 'v' and key[3] == '-':
+            env_handlers[key] = valve_setting_handler(int(key[1:3]), key[4:])
+
+    def parse_environment():
+        env_dispatcher.apply(env)
 
     next_feed_countdown = 0
     next_feed = None
     timer_feed = time.monotonic()
+    valve_events = ValveEvents(window=env['valve-event-window'])
+    heap = HeapMonitor()
 
     mcu = Mcu(loglevel=LOGLEVEL, i2c_freq=100000)
     mcu.i2c_identify(i2c_dict)
@@ -146,6 +186,14 @@ def main():
     ncm = Notecard_manager(loghandler=mcu.loghandler, i2c=mcu.i2c, watchdog=120, loglevel=LOGLEVEL)
     mcu.log.info(f'STARTING {__filename__} {__version__}')
     ncm.set_default_envs(env)
+    # Valve event records are what's worth sending, so they are all novel (deadband 0)
+    # Intervals are set again from env by set_send_policy()
+    send_policy = SendPolicy(
+        interval = env['note-send-interval'] * MINUTES,
+        max_interval = env['note-send-max-interval'] * MINUTES,
+        deadband = 0,
+        log = mcu.log)
+    env_dispatcher = EnvDispatcher(env_handlers, log=mcu.log)
 
     try:
         global valves
@@ -175,7 +223,9 @@ def main():
         i=0
         for m in motors:
             valves.append(Valve(motor=m, name=f'v{i+1:02}', loghandler=mcu.loghandler))
+            # Only the closed position switches are wired, so opening travel is not timed
             valves[i].setup_position_signals(pin_close=closed_position_signals[i])
+            valves[i].driver = i // 4 # 4 motor channels per PCA9685 featherwing
             i+=1                                
         
     except Exception as e:
@@ -184,33 +234,79 @@ def main():
 
     parse_environment()
     
+    def apply_valve_command(action, indices, arg):
+        targets = [valves[i] for i in indices]
+
+        for v in targets:
+            if action == 'toggle':
+                v.manual_pos = not v.manual_pos
+                v.manual = True
+            elif action == 'open':
+                v.manual_pos = True
+                v.manual = True
+            elif action == 'close':
+                v.manual_pos = False
+                v.manual = True
+            elif action == 'auto':
+                v.manual = False
+            elif action == 'pulse':
+                v.manual = False
+                v.pulses = arg
+                v.pulse = 0
+                v.pulsing = True
+                # Backdate the toggle timer so the first pulse opens straight away
+                v.timer_toggle = time.monotonic() - v.close_duration - 1
+
+        # Drive the motors now rather than on the next loop pass.
+        # Grouped by driver, so each PCA9685 sees its writes back to back.
+        for driver in sorted(set(v.driver for v in targets)):
+            for v in targets:
+                if v.driver == driver:
+                    v.update()
+
+        mcu.log.info(f'valve command {action} applied to {[v.name for v in targets]}')
+
     def usb_serial_parser(string):
         global valves
 
-        if string.startswith('v'):
+        if string.startswith('v') or string.startswith('pulse'):
             try:
-                index = int(string[1:])-1
-                valves[index].manual_pos = not valves[index].manual_pos
-                valves[index].manual = True
-
+                action, indices, arg = parse_command(string, len(valves))
             except Exception as e:
                 print(e)
                 mcu.log.warning(f'string {string} not valid for valve settings\n'
-                                 +'input valve settings in format "v valve_number" e.g. v0')
+                                 +'input valve settings in format "v1", "v1-6 open", "v1,3,5 auto", "v* close" or "pulse v2 3"')
+                return
+            apply_valve_command(action, indices, arg)
+
+        elif string.startswith('heap'):
+            # "heap" shows heap use per loop stage, "heap on" / "heap off" switch monitoring
+            if string == 'heap on':
+                set_heap_monitor('heap-monitor', True)
+            elif string == 'heap off':
+                set_heap_monitor('heap-monitor', False)
+            if heap.enabled:
+                mcu.log.info(f'heap {heap.report(reset=False)}')
+            else:
+                mcu.log.info('heap monitor off, enable with "heap on"')
 
     def display():
 
         status = ''
+        open_mask = 0
+        blocked_mask = 0
         i=0
         for v in valves:
-            i+=1
             if v.blocked:
                 s = '*'
+                blocked_mask |= 1 << i
             elif v.motor.throttle == 1:
                 s = 1
+                open_mask |= 1 << i
             else:
                 s = 0
-            mcu.data[f'v{i:02}-status'] = s
+            i+=1
+            mcu.data[f'v{i:02}-health'] = v.health()
             status += f'{s}'
 
         mcu.display.set_cursor(0,0)
@@ -223,23 +319,25 @@ def main():
         mcu.display.set_cursor(0,3)
         mcu.display.write(f'Pulse {valves[0].pulse}/{env["pulses"]} {int(time.monotonic()-valves[0].timer_toggle)}               '[:20])
 
-        try:
-            if status != mcu.valve_status:
-                mcu.log.info(f'Valves: {status} Pulse {valves[0].pulse}/{env["pulses"]}' )
-                ncm.add_to_timestamped_note(mcu.data)
-
-        except AttributeError:
-            pass
-        mcu.valve_status = status
+        # Valve changes are coalesced, so a feed produces one note per window rather than per valve edge
+        valve_events.update(open_mask, blocked_mask, valves[0].pulse)
+        record = valve_events.poll()
+        if record:
+            mcu.log.info('Valves: %s Pulse %s/%s (%s changes)', status, valves[0].pulse, env['pulses'], record['vt'])
+            mcu.data.update(record)
+            ncm.add_to_timestamped_note(mcu.data)
+            send_policy.note_added(record)
 
     mcu.log.warning(f'BOOT complete at {mcu.get_timestamp()} UTC, {mcu.get_timestamp(env["utc-offset-hours"])} local')
     
     timer_A = 0
     timer_B = 0
-    timer_C=-15*MINUTES
+    feeding = False
 
     while True:
+        heap.start()
         mcu.service(serial_parser=usb_serial_parser)
+        heap.stage('service')
         for v in valves:
             v.update()
 
@@ -251,17 +349,29 @@ def main():
             mcu.log.info(f"alarm set for {next_feed.tm_hour:02d}:{next_feed.tm_min:02d}:00 localtime")
             
             for v in valves:
+                v.pulses = env['pulses'] # in case a "pulse" serial command changed it
                 v.pulsing = True
 
+        # Send promptly once a feed has finished
+        pulsing = False
+        for v in valves:
+            if v.pulsing:
+                pulsing = True
+        if feeding and not pulsing:
+            send_policy.flush()
+        feeding = pulsing
+        heap.stage('valves')
+
         if time.monotonic() - timer_A > 1:
             timer_A = time.monotonic()
             mcu.led.value = not mcu.led.value #heartbeat LED
             display()
+        heap.stage('display')
 
         if time.monotonic() - timer_B > (5):
             timer_B = time.monotonic()
             timestamp = mcu.get_timestamp(env['utc-offset-hours'])
-            mcu.log.debug(f"servicing notecard now {timestamp}")
+            mcu.log.debug("servicing notecard now %s", timestamp)
             # ncm.add_to_timestamped_note(mcu.data)
 
             # Checks if connected, storage availablity, etc.
@@ -279,13 +389,20 @@ def main():
             if ncm.receive_environment(env):
                 parse_environment()
 
-        if time.monotonic() - timer_C > (15 * MINUTES):
-            timer_C = time.monotonic()
+        # Sync when there is something worth sending, to minimise consumption credit and modem time
+        connected = ncm.connected
+        if send_policy.due(connected):
             # mcu.log.info('heartbeat log for debug')
-
-            # Send note infrequently (e.g. 15 mins) to minimise consumption credit usage
+            if heap.enabled:
+                ncm.add_to_timestamped_note(heap.report())
             ncm.send_timestamped_note(sync=True)
             ncm.send_timestamped_log(sync=True)
+            # Offline, the notes stay queued on the notecard and the next attempt backs off
+            if connected:
+                send_policy.sent()
+            else:
+                send_policy.failed()
+        heap.stage('notecard')
 
 
 if __name__ == "__main__":
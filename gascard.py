@@ -57,7 +57,7 @@ class Gascard():
     def parse_serial(self):
         data_string = self.read_serial()
         try:
-            self.log.debug(f'{data_string=}')
+            self.log.debug('data_string=%r', data_string)
 
             if not data_string:
                 return
@@ -82,7 +82,7 @@ class Gascard():
                 try:
                     self.concentration = float(data[1])
                 except ValueError:
-                    self.log.debug(f'Gascard error {data_string=}')
+                    self.log.debug('Gascard error data_string=%r', data_string)
                     self.concentration = -100.0
                 self.temperature = int(data[6])
                 self.pressure = float(data[7])
@@ -0,0 +1,62 @@
+import gc
+import time
+
+class HeapMonitor():
+    # Opt-in heap instrumentation around each stage of a main loop pass, to confirm or rule out
+    # allocation churn behind slowdowns and fragmentation.
+    #   start() at the top of the pass, then stage(name) after each stage. The drop in free heap
+    #   since the previous mark is charged to that stage.
+    # CircuitPython collects when an allocation doesn't fit, so free heap going up across a stage
+    # means a collection ran during it. That is counted for the stage, and its allocation is lost.
+    # report() gives per stage allocation rates (bytes/s) and collection counts as note fields.
+    # While disabled start() and stage() return straight away.
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.names = []
+        self.allocated = {}
+        self.collections = {}
+        self.reset()
+
+    def reset(self):
+        # Stages keep their order, counting restarts at the top of the next pass
+        for name in self.names:
+            self.allocated[name] = 0
+            self.collections[name] = 0
+        self.free = None
+        self.min_free = gc.mem_free()
+        self.timer_reset = time.monotonic()
+
+    def start(self):
+        if self.enabled:
+            self.free = gc.mem_free()
+
+    def stage(self, name):
+        if not self.enabled or self.free is None:
+            return
+        free = gc.mem_free()
+        if name not in self.allocated:
+            self.names.append(name)
+            self.allocated[name] = 0
+            self.collections[name] = 0
+        if free > self.free:
+            self.collections[name] += 1
+        else:
+            self.allocated[name] += self.free - free
+        if free < self.min_free:
+            self.min_free = free
+        self.free = free
+
+    def report(self, reset=True):
+        # Rates since the last reset, which starts a new window unless reset is False
+        elapsed = max(time.monotonic() - self.timer_reset, 1)
+        report = {
+            'heap-stages'   : ','.join(self.names),
+            'heap-bps'      : [int(self.allocated[name] / elapsed) for name in self.names],
+            'heap-gc'       : [self.collections[name] for name in self.names],
+            'heap-free'     : self.free,
+            'heap-min'      : self.min_free,
+        }
+        if reset:
+            self.reset()
+        return report
@@ -0,0 +1,48 @@
+import json
+
+# Devices found on each I2C bus at the last full probe, and how long that probe took.
+# Trusted at the next boot if a single verification scan finds the same addresses. That scan
+# runs every boot, it is what catches a device being added or removed: the cache only saves
+# identifying each device again.
+TOPOLOGY_FILE = '/i2c_topology.json'
+
+def scan(i2c):
+    # Returns a sorted list of addresses that acknowledge on the bus
+    if i2c is None:
+        return []
+    while not i2c.try_lock():
+        pass
+    try:
+        return sorted(i2c.scan())
+    finally:
+        i2c.unlock()
+
+def load(path=None):
+    if path is None:
+        path = TOPOLOGY_FILE
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save(topology, path=None):
+    # Returns False if the file can't be written, e.g. CIRCUITPY is read-only
+    if path is None:
+        path = TOPOLOGY_FILE
+    try:
+        with open(path, 'w') as f:
+            json.dump(topology, f)
+        return True
+    except OSError:
+        return False
+
+def matches(cached, topology):
+    if not cached:
+        return False
+    for bus in topology:
+        if bus == 'probe-ms':
+            continue
+        if cached.get(bus) != topology[bus]:
+            return False
+    return True
@@ -0,0 +1,200 @@
+import time
+
+# Jacket heating controllers. Each one decides whether a single jacket relay should be on.
+# update() is called about once a second with the latest tank temperature.
+
+class HysteresisController():
+    # Bang-bang control, on below target-hysteresis and off above target+hysteresis
+
+    def __init__(self, target=30, hysteresis=0.5):
+        self.target = target
+        self.hysteresis = hysteresis
+
+    def update(self, temp, on, liquid_temp=None):
+        if temp <= (self.target - self.hysteresis) and on == False:
+            return True
+        if temp >= (self.target + self.hysteresis) and on == True:
+            return False
+        return on
+
+
+class ThermalModel():
+    # First order tank model around the target temperature: dT/dt = loss_rate + heating_rate*duty.
+    # Both rates (C/s) are learnt from the slope of the liquid temperature over each complete
+    # relay run, ignoring the start of the run while the jacket itself warms up or cools down.
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.loss_rate = None
+        self.on_rate = None
+        self.samples = 0
+
+    def learn(self, on, slope):
+        if on:
+            if self.on_rate is None:
+                self.on_rate = slope
+            self.on_rate += self.alpha * (slope - self.on_rate)
+        else:
+            if self.loss_rate is None:
+                self.loss_rate = slope
+            self.loss_rate += self.alpha * (slope - self.loss_rate)
+        self.samples += 1
+
+    @property
+    def heating_rate(self):
+        if self.on_rate is None or self.loss_rate is None:
+            return None
+        return self.on_rate - self.loss_rate
+
+    def rate(self, duty):
+        return self.loss_rate + self.heating_rate * duty
+
+    @property
+    def valid(self):
+        # Needs to heat when on and cool when off, or it has not learnt anything useful yet
+        return (self.on_rate is not None and self.loss_rate is not None
+                and self.on_rate > 0 and self.loss_rate < 0)
+
+
+class PredictiveController():
+    # Schedules on and off windows from a ThermalModel learnt as the tank runs.
+    #
+    # At the start of each window the model predicts how long the relay can stay as it is:
+    # heating until the liquid will coast up to target+hysteresis, or resting until it has
+    # cooled to target-hysteresis. So the whole hysteresis band is used and the relay switches
+    # as little as possible. Windows are replanned every 'replan' seconds from fresh readings,
+    # which corrects model errors without extra switching. The temperature rise after switching
+    # off (heat still stored in the jacket) is learnt too, which is what stops the overshoot.
+    # Until the model is valid, control is hysteresis on the liquid temperature.
+
+    def __init__(self, target=30, hysteresis=0.5, replan=300, min_run=120,
+                 settle=300, name='jacket'):
+        self.target = target
+        self.hysteresis = hysteresis
+        self.replan = replan # seconds between replanning
+        self.min_run = min_run # seconds, shortest on or off window
+        self.settle = settle # seconds ignored at the start of a run when learning
+        self.name = name
+
+        self.model = ThermalModel()
+        self.fallback = HysteresisController(target, hysteresis)
+        self.coast = 0.0 # learnt temperature rise after switching off
+
+        self.filtered = None
+        self.timer_update = None
+
+        # Current run/window
+        self.timer_switch = None
+        self.settled_temp = None
+        self.window_end = None
+        self.timer_plan = None
+
+        # Coast learning, from the temperature when the relay last switched off
+        self.off_temp = None
+        self.off_peak = None
+
+        # Totals reported for tuning/validation
+        self.energy_on_seconds = 0
+        self.switches = 0
+
+    @property
+    def trusted(self):
+        return self.model.valid
+
+    def time_to_reach(self, temp, goal, duty):
+        # Seconds for the model to take temp to goal, 0 if already past it
+        rate = self.model.rate(duty)
+        t = (goal - temp) / rate
+        return max(t, 0)
+
+    def plan(self, now, temp, on):
+        if on:
+            t = self.time_to_reach(temp, self.target + self.hysteresis - self.coast, 1)
+        else:
+            t = self.time_to_reach(temp, self.target - self.hysteresis, 0)
+        self.window_end = now + t
+        self.timer_plan = now
+
+    def end_run(self, now, temp, on):
+        # Learn from the run that is just finishing
+        if self.settled_temp is not None:
+            elapsed = now - self.timer_switch - self.settle
+            if elapsed > 0:
+                self.model.learn(on, (temp - self.settled_temp) / elapsed)
+        self.settled_temp = None
+
+        if on:
+            # Switching off, start watching for the coast
+            self.off_temp = temp
+            self.off_peak = temp
+        elif self.off_peak is not None:
+            rise = self.off_peak - self.off_temp
+            self.coast += 0.3 * (max(rise, 0) - self.coast)
+            self.off_peak = None
+
+    def decide(self, now, temp, on):
+        since_switch = now - self.timer_switch
+
+        # Safety limits, always obeyed
+        if temp >= self.target + self.hysteresis:
+            return False
+        if since_switch < self.min_run:
+            return on
+        if temp <= self.target - self.hysteresis - 0.5:
+            return True
+
+        if self.timer_plan is None or now - self.timer_plan >= self.replan:
+            self.plan(now, temp, on)
+
+        if now >= self.window_end:
+            return not on
+        return on
+
+    def update(self, temp, on, liquid_temp=None):
+        now = time.monotonic()
+
+        # Control on the liquid temperature when available, smoothed to remove sensor noise
+        control_temp = liquid_temp if liquid_temp is not None else temp
+        if self.filtered is None:
+            self.filtered = control_temp
+        self.filtered += 0.05 * (control_temp - self.filtered)
+        temp = self.filtered
+
+        if self.timer_update is not None and on:
+            self.energy_on_seconds += now - self.timer_update
+        self.timer_update = now
+        if self.timer_switch is None:
+            self.timer_switch = now
+
+        if self.settled_temp is None and now - self.timer_switch >= self.settle:
+            self.settled_temp = temp
+        if self.off_peak is not None:
+            self.off_peak = max(self.off_peak, temp)
+
+        if self.trusted:
+            state = self.decide(now, temp, on)
+        else:
+            self.fallback.target = self.target
+            self.fallback.hysteresis = self.hysteresis
+            state = self.fallback.update(temp, on)
+
+        if state != on:
+            self.end_run(now, temp, on)
+            self.timer_switch = now
+            self.timer_plan = None
+            self.switches += 1
+        return state
+
+    def stats(self):
+        return {
+            'on-seconds'    : int(self.energy_on_seconds),
+            'switches'      : self.switches,
+            'trusted'       : self.trusted,
+            'coast'         : self.coast,
+        }
+
+
+def make_controller(kind, target, hysteresis, name='jacket'):
+    if kind == 'mpc':
+        return PredictiveController(target, hysteresis, name=name)
+    return HysteresisController(target, hysteresis)
@@ -0,0 +1,269 @@
+import os
+import struct
+import time
+
+# Ring journal of every capture frame, in fixed size binary records on the SD card.
+# The Notecard only gets regular notes while it is connected. Frames that missed a note while
+# it was offline are later sent as summarised batches (backfill), a few at a time, once the
+# link is back. Decode the journal on a host with journal_to_csv.py.
+#
+# File layout, little endian:
+#   header  magic 'JRNL', version, field count, record size, capacity (records),
+#           next seq, sent seq, gap end seq (0xFFFFFFFF if none), then the field names
+#           comma separated and NUL padded. Records start at HEADER_SIZE.
+#   record  seq, timestamp (epoch seconds), one float32 per field, NaN where missing.
+#           Frame seq is stored in slot seq % capacity.
+#
+# 'sent' is the frame up to which data has reached the Notecard, live or by backfill.
+# Frames from sent up to gap_end are waiting to be backfilled.
+#
+# The header is only rewritten every HEADER_RECORDS frames and after a backfill, so the same
+# SD block isn't written every flush or every note. Its seq can lag the records on the card, so
+# on opening the journal the records after it are scanned for seq numbers carrying on from it.
+# Its sent can lag too, so after a reset up to HEADER_RECORDS frames may be backfilled again.
+# The ring is sized to the card's free space when it is created, up to a week.
+
+JOURNAL_FILE = '/sd/journal.bin'
+SD_MOUNT = '/sd'
+
+MAGIC = b'JRNL'
+VERSION = 1
+HEADER = '<4sBBHIIII'
+HEADER_SIZE = 512 # one SD block
+NAMES_SIZE = HEADER_SIZE - struct.calcsize(HEADER)
+NO_GAP = 0xFFFFFFFF
+
+FLUSH_RECORDS = 30 # frames buffered between SD writes
+HEADER_RECORDS = 600 # frames between header writes
+CAPACITY = 7 * 24 * 3600 # a week of 1s frames, at most
+FREE_SPACE_FRACTION = 0.8 # of the card's free space a new journal may take
+MAX_BATCH_RECORDS = 600 # frames read from the card at once for a backfill batch
+
+def mount_sd(cs_pin):
+    # Mounts the Adalogger FeatherWing SD card at SD_MOUNT, returns False if there isn't one,
+    # or the SD card library isn't installed
+    try:
+        import adafruit_sdcard
+        import board
+        import digitalio
+        import storage
+        sdcard = adafruit_sdcard.SDCard(board.SPI(), digitalio.DigitalInOut(cs_pin))
+        storage.mount(storage.VfsFat(sdcard), SD_MOUNT)
+        return True
+    except (ImportError, OSError):
+        return False
+
+def free_capacity(path, size):
+    # Records of size bytes that fit in FREE_SPACE_FRACTION of the free space where path lives
+    directory = path.rsplit('/', 1)[0] or '/'
+    try:
+        stat = os.statvfs(directory)
+    except OSError:
+        return CAPACITY
+    return int(stat[0] * stat[3] * FREE_SPACE_FRACTION) // size
+
+def record_format(fields):
+    return f'<II{len(fields)}f'
+
+def read_header(f):
+    # Returns (fields, capacity, seq, sent, gap_end) or None if not a journal this code can read
+    f.seek(0)
+    data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        return None
+    magic, version, count, size, capacity, seq, sent, gap_end = struct.unpack_from(HEADER, data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    names = data[struct.calcsize(HEADER):].rstrip(b'\x00').decode()
+    fields = names.split(',') if names else []
+    if len(fields) != count or struct.calcsize(record_format(fields)) != size:
+        return None
+    return fields, capacity, seq, sent, gap_end
+
+def scan_forward(f, fields, capacity, seq):
+    # Returns the seq after the last record written on from seq, i.e. the true next frame when
+    # the header lags the records. Stops at a record left from an earlier lap of the ring.
+    fmt = record_format(fields)
+    size = struct.calcsize(fmt)
+    limit = seq + HEADER_RECORDS + FLUSH_RECORDS
+    while seq < limit:
+        slot = seq % capacity
+        n = min(FLUSH_RECORDS, capacity - slot, limit - seq)
+        f.seek(HEADER_SIZE + slot * size)
+        data = f.read(n * size)
+        for k in range(len(data) // size):
+            if struct.unpack_from('<I', data, k * size)[0] != seq:
+                return seq
+            seq += 1
+        if len(data) < n * size:
+            return seq
+    return seq
+
+
+class Journal():
+
+    def __init__(self, fields, path=None, capacity=None, log=None):
+        # capacity None keeps an existing journal's, or sizes a new one from the free space
+        if path is None:
+            path = JOURNAL_FILE
+        self.path = path
+        self.fields = list(fields)
+        self.log = log
+        self.format = record_format(self.fields)
+        self.size = struct.calcsize(self.format)
+        self.buffer = []
+
+        self.seq = 0
+        self.sent = 0
+        self.live_seq = 0
+        self.gap_end = None
+        self.skipped = False
+
+        self.file = None
+        header = None
+        try:
+            self.file = open(path, 'r+b')
+            header = read_header(self.file)
+        except OSError:
+            pass
+
+        if header and header[0] == self.fields and capacity in (None, header[1]):
+            fields, self.capacity, seq, self.sent, gap_end = header
+            self.seq = scan_forward(self.file, self.fields, self.capacity, seq)
+            self.header_seq = seq
+            if gap_end != NO_GAP:
+                self.gap_end = gap_end
+            self.live_seq = self.sent
+            # Frames after the last note before a reset have not been delivered
+            self.skipped = self.sent < self.seq
+            if self.log:
+                self.log.info(f'journal opened at frame {self.seq}, {self.seq - self.sent} not yet sent')
+        else:
+            # Missing, or written with different fields, start again
+            if self.file:
+                self.file.close()
+                os.remove(path) # so its space counts as free
+            if capacity is None:
+                capacity = max(1, min(CAPACITY, free_capacity(path, self.size)))
+            self.capacity = capacity
+            if self.log:
+                self.log.warning(f'starting new journal {path}, {capacity} frames')
+            self.file = open(path, 'w+b')
+            self._write_header()
+
+    def _write_header(self):
+        names = ','.join(self.fields).encode()
+        if len(names) > NAMES_SIZE:
+            raise ValueError('Too many journal fields')
+        gap_end = NO_GAP if self.gap_end is None else self.gap_end
+        header = struct.pack(HEADER, MAGIC, VERSION, len(self.fields), self.size,
+                             self.capacity, self.seq, self.sent, gap_end)
+        self.file.seek(0)
+        self.file.write(header + names + bytes(NAMES_SIZE - len(names)))
+        self.header_seq = self.seq
+
+    def append(self, data, timestamp=None):
+        # data is a dict of field values, e.g. mcu.data
+        if timestamp is None:
+            timestamp = int(time.time())
+        values = [data.get(key) for key in self.fields]
+        values = [float('nan') if v is None else v for v in values]
+        self.buffer.append(struct.pack(self.format, self.seq + len(self.buffer), timestamp, *values))
+        if len(self.buffer) >= FLUSH_RECORDS:
+            self.flush()
+
+    def flush(self):
+        start = self.seq
+        i = 0
+        while i < len(self.buffer):
+            # Contiguous run of slots, up to the end of the ring
+            slot = (start + i) % self.capacity
+            n = min(len(self.buffer) - i, self.capacity - slot)
+            self.file.seek(HEADER_SIZE + slot * self.size)
+            self.file.write(b''.join(self.buffer[i:i+n]))
+            i += n
+        self.seq += len(self.buffer)
+        self.buffer = []
+        if self.seq - self.header_seq >= HEADER_RECORDS:
+            self._write_header()
+        self.file.flush()
+
+    def read(self, start, count):
+        # Returns [(seq, timestamp, values)] for frames start to start+count-1, all on the card
+        records = []
+        seq = start
+        while count > 0:
+            slot = seq % self.capacity
+            n = min(count, self.capacity - slot)
+            self.file.seek(HEADER_SIZE + slot * self.size)
+            data = self.file.read(n * self.size)
+            for k in range(n):
+                values = struct.unpack_from(self.format, data, k * self.size)
+                records.append((values[0], values[1], values[2:]))
+            seq += n
+            count -= n
+        return records
+
+    def note_skipped(self):
+        # A note was not sent (Notecard offline), its frames will need backfilling
+        self.skipped = True
+
+    def note_sent(self):
+        # A live note has gone to the Notecard, covering frames up to now
+        if self.buffer:
+            self.flush()
+        if self.skipped:
+            self.gap_end = self.seq
+            self.skipped = False
+        if self.gap_end is None:
+            self.sent = self.seq
+        self.live_seq = self.seq
+
+    def backfilling(self):
+        return self.gap_end is not None
+
+    def summarise(self, records):
+        # Mean of each field over a batch, keyed like the live note, plus the time span covered
+        summary = {'backfill': [records[0][1], records[-1][1], len(records)]}
+        for i, key in enumerate(self.fields):
+            total = 0
+            n = 0
+            for seq, t, values in records:
+                if values[i] == values[i]: # not NaN
+                    total += values[i]
+                    n += 1
+            if n:
+                summary[key] = round(total / n, 3)
+        return summary
+
+    def backfill(self, batch_seconds, max_batches=1):
+        # Returns up to max_batches summaries of undelivered frames, oldest first
+        summaries = []
+        while self.gap_end is not None and len(summaries) < max_batches:
+            # Anything older than one ring is already overwritten
+            start = max(self.sent, self.seq - self.capacity)
+            if start >= self.gap_end:
+                self.gap_end = None
+                self.sent = max(self.sent, self.live_seq)
+                break
+
+            records = self.read(start, min(self.gap_end - start, MAX_BATCH_RECORDS))
+            t_end = records[0][1] + batch_seconds
+            n = 1
+            while n < len(records) and records[n][1] < t_end:
+                n += 1
+            summaries.append(self.summarise(records[:n]))
+            self.sent = start + n
+
+        if summaries:
+            self._write_header()
+            self.file.flush()
+            if self.log:
+                self.log.info(f'journal backfilled {len(summaries)} batches, {self.remaining()} frames to go')
+        return summaries
+
+    def remaining(self):
+        # Frames still waiting to be backfilled
+        if self.gap_end is None:
+            return 0
+        return self.gap_end - max(self.sent, self.seq - self.capacity)
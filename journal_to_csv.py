@@ -0,0 +1,50 @@
+# Decodes an SD card journal (see journal.py) to CSV, oldest frame first. Host only.
+#
+#   python journal_to_csv.py /Volumes/SD/journal.bin journal.csv
+
+import csv
+import math
+import struct
+import sys
+import time
+
+from journal import HEADER_SIZE, read_header, record_format, scan_forward
+
+def decode(path):
+    # Returns (fields, rows) with rows as (seq, timestamp, values), in frame order
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        if header is None:
+            raise ValueError(f'{path} is not a journal')
+        fields, capacity, seq, sent, gap_end = header
+        # The header is written less often than the records, take those written after it too
+        seq = scan_forward(f, fields, capacity, seq)
+        f.seek(HEADER_SIZE)
+        data = f.read()
+
+    record = struct.Struct(record_format(fields))
+    data = data[:len(data) - len(data) % record.size]
+    oldest = max(seq - capacity, 0)
+    rows = [(r[0], r[1], r[2:]) for r in record.iter_unpack(data) if oldest <= r[0] < seq]
+    rows.sort(key=lambda r: r[0])
+    return fields, rows
+
+def main():
+    if len(sys.argv) < 2:
+        print('usage: python journal_to_csv.py journal.bin [out.csv]')
+        sys.exit(1)
+    fields, rows = decode(sys.argv[1])
+    out = open(sys.argv[2], 'w', newline='') if len(sys.argv) > 2 else sys.stdout
+
+    writer = csv.writer(out)
+    writer.writerow(['seq', 'time'] + fields)
+    for seq, t, values in rows:
+        iso = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
+        writer.writerow([seq, iso] + ['' if math.isnan(v) else round(v, 4) for v in values])
+
+    if out is not sys.stdout:
+        out.close()
+        print(f'{len(rows)} frames written to {sys.argv[2]}')
+
+if __name__ == '__main__':
+    main()
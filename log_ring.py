@@ -0,0 +1,57 @@
+import adafruit_logging as logging
+
+# Logging for the main loop, where log calls can run every pass.
+#
+# Pass values as arguments rather than f-strings, e.g. log.debug('pressure=%s', gc.pressure),
+# so the message is only formatted if the record passes the level check.
+# Where even the arguments are costly to get (I2C reads, building lists), check first:
+#
+#   if enabled(mcu.log, logging.DEBUG):
+#       mcu.log.debug('thermocouples %s', [tc.temperature for tc in tc_channels])
+#
+# RingLogHandler keeps emitted records in a fixed size ring instead of writing each one out
+# straight away. They are passed on to the target handler (serial console and Notecard log) in a
+# batch by flush(), from the main loop and before each log sync. Warnings and above are passed on
+# at once. If the ring fills between flushes the oldest records are dropped and counted.
+# The ring takes every record its logger lets through, the target's own level is applied as
+# they are passed on, the same check the logger makes before calling a handler.
+
+def enabled(log, level):
+    return level >= log.getEffectiveLevel()
+
+
+class RingLogHandler(logging.Handler):
+
+    def __init__(self, target, capacity=64, flush_level=logging.WARNING):
+        super().__init__()
+        self.target = target
+        self.capacity = capacity
+        self.flush_level = flush_level
+        self.records = [None] * capacity
+        self.head = 0 # slot for the next record
+        self.count = 0
+        self.dropped = 0
+
+    def emit(self, record):
+        self.records[self.head] = record
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.dropped += 1
+        if record.levelno >= self.flush_level:
+            self.flush()
+
+    def flush(self):
+        # Passes buffered records on, oldest first. Returns how many were dropped since last time.
+        i = (self.head - self.count) % self.capacity
+        while self.count:
+            record = self.records[i]
+            self.records[i] = None
+            self.count -= 1
+            i = (i + 1) % self.capacity
+            if record.levelno >= self.target.level:
+                self.target.emit(record)
+        dropped = self.dropped
+        self.dropped = 0
+        return dropped
@@ -0,0 +1,104 @@
+import time
+
+# Upper bounds of the latency buckets in ms, plus one more bucket for anything slower
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+def bucket(ms):
+    for i, edge in enumerate(BUCKETS_MS):
+        if ms < edge:
+            return i
+    return len(BUCKETS_MS)
+
+def percentile(histogram, fraction):
+    # Upper bound (ms) of the bucket holding that fraction of passes, None if over the top bucket
+    total = sum(histogram)
+    if total == 0:
+        return 0
+    target = fraction * total
+    count = 0
+    for i, n in enumerate(histogram):
+        count += n
+        if count >= target:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else None
+    return None
+
+
+class LoopStats():
+    # Fixed bucket latency histograms for each main loop pass and for each stage of it, plus the
+    # slowest pass seen and the stage that took longest in it.
+    #   start() at the top of the pass, then stage(name) after each stage, as HeapMonitor.
+    # A pass is timed from one start() to the next, so it includes time between the stages too.
+    # Marks are passed on to the heap monitor, if one is given, so the loop only needs one set.
+
+    def __init__(self, heap=None):
+        self.heap = heap
+        self.names = []
+        self.histograms = {}
+        self.timer_pass = None
+        self.reset()
+
+    def reset(self):
+        for name in self.names:
+            self.histograms[name] = [0] * (len(BUCKETS_MS) + 1)
+        self.loop = [0] * (len(BUCKETS_MS) + 1)
+        self.worst_ms = 0
+        self.worst_stage = None
+        self.worst_stage_ms = 0
+        self.slowest_stage = None
+        self.slowest_ms = 0
+        self.timer_reset = time.monotonic()
+
+    def start(self):
+        now = time.monotonic_ns()
+        if self.timer_pass is not None:
+            ms = (now - self.timer_pass) // 1000000
+            self.loop[bucket(ms)] += 1
+            if ms >= self.worst_ms:
+                self.worst_ms = ms
+                self.worst_stage = self.slowest_stage
+                self.worst_stage_ms = self.slowest_ms
+        self.timer_pass = now
+        self.timer_stage = now
+        self.slowest_stage = None
+        self.slowest_ms = 0
+        if self.heap:
+            self.heap.start()
+
+    def stage(self, name):
+        now = time.monotonic_ns()
+        ms = (now - self.timer_stage) // 1000000
+        self.timer_stage = now
+        if name not in self.histograms:
+            self.names.append(name)
+            self.histograms[name] = [0] * (len(BUCKETS_MS) + 1)
+        self.histograms[name][bucket(ms)] += 1
+        if ms >= self.slowest_ms:
+            self.slowest_ms = ms
+            self.slowest_stage = name
+        if self.heap:
+            self.heap.stage(name)
+
+    def report(self, reset=True):
+        # Summary as note fields, since the last reset, which starts a new window unless reset is False
+        report = {
+            'loop-passes'       : sum(self.loop),
+            'loop-p50-ms'       : percentile(self.loop, 0.5),
+            'loop-p99-ms'       : percentile(self.loop, 0.99),
+            'loop-max-ms'       : self.worst_ms,
+            'loop-max-stage'    : self.worst_stage,
+            'loop-stages'       : ','.join(self.names),
+            'loop-stage-p99-ms' : [percentile(self.histograms[name], 0.99) for name in self.names],
+        }
+        if reset:
+            self.reset()
+        return report
+
+    def lines(self):
+        # Full histograms as text, for the serial console
+        header = ''.join([f'{"<" + str(edge):>6}' for edge in BUCKETS_MS]) + f'{">=" + str(BUCKETS_MS[-1]):>7}'
+        lines = [f'{"ms":10}{header}']
+        for name, histogram in [('pass', self.loop)] + [(name, self.histograms[name]) for name in self.names]:
+            lines.append(f'{name:10}' + ''.join([f'{n:6}' for n in histogram[:-1]]) + f'{histogram[-1]:7}')
+        lines.append(f'slowest pass {self.worst_ms}ms, {self.worst_stage} took {self.worst_stage_ms}ms, '
+                     f'over {int(time.monotonic() - self.timer_reset)}s')
+        return lines
@@ -2,23 +2,111 @@
   "f627" : {
       "/circuitpy_mcu/mcu.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/mcu.py",
       "/circuitpy_mcu/notecard_manager.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/notecard_manager.py",
-      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py"
+      "/circuitpy_mcu/ota_bootloader.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/ota_bootloader.py",
+      "/circuitpy_septic_tank/boot_orchestrator.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_orchestrator.py",
+      "/circuitpy_septic_tank/boot_profiler.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_profiler.py",
+      "/circuitpy_septic_tank/drivers.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/drivers.py",
+      "/circuitpy_septic_tank/env_dispatch.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/env_dispatch.py",
+      "/circuitpy_septic_tank/gascard.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/gascard.py",
+      "/circuitpy_septic_tank/heap_monitor.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/heap_monitor.py",
+      "/circuitpy_septic_tank/i2c_topology.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/i2c_topology.py",
+      "/circuitpy_septic_tank/jacket_controller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/jacket_controller.py",
+      "/circuitpy_septic_tank/journal.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/journal.py",
+      "/circuitpy_septic_tank/log_ring.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/log_ring.py",
+      "/circuitpy_septic_tank/loop_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/loop_stats.py",
+      "/circuitpy_septic_tank/ota_manifest.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_manifest.py",
+      "/circuitpy_septic_tank/ph_calibration_bank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_calibration_bank.py",
+      "/circuitpy_septic_tank/ph_probe.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_probe.py",
+      "/circuitpy_septic_tank/pump_tuner.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/pump_tuner.py",
+      "/circuitpy_septic_tank/relay_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/relay_stats.py",
+      "/circuitpy_septic_tank/send_policy.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/send_policy.py",
+      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py",
+      "/circuitpy_septic_tank/telemetry.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/telemetry.py",
+      "/circuitpy_septic_tank/thermocouple_poller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/thermocouple_poller.py",
+      "/calibration/ph_calibration.bin" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/calibration/ph_calibration.bin",
+      "/code.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/code.py"
   },
   "1205" : {
       "/circuitpy_mcu/mcu.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/mcu.py",
       "/circuitpy_mcu/notecard_manager.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/notecard_manager.py",
-      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py"
+      "/circuitpy_mcu/ota_bootloader.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/ota_bootloader.py",
+      "/circuitpy_septic_tank/boot_orchestrator.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_orchestrator.py",
+      "/circuitpy_septic_tank/boot_profiler.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_profiler.py",
+      "/circuitpy_septic_tank/drivers.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/drivers.py",
+      "/circuitpy_septic_tank/env_dispatch.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/env_dispatch.py",
+      "/circuitpy_septic_tank/gascard.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/gascard.py",
+      "/circuitpy_septic_tank/heap_monitor.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/heap_monitor.py",
+      "/circuitpy_septic_tank/i2c_topology.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/i2c_topology.py",
+      "/circuitpy_septic_tank/jacket_controller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/jacket_controller.py",
+      "/circuitpy_septic_tank/journal.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/journal.py",
+      "/circuitpy_septic_tank/log_ring.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/log_ring.py",
+      "/circuitpy_septic_tank/loop_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/loop_stats.py",
+      "/circuitpy_septic_tank/ota_manifest.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_manifest.py",
+      "/circuitpy_septic_tank/ph_calibration_bank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_calibration_bank.py",
+      "/circuitpy_septic_tank/ph_probe.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_probe.py",
+      "/circuitpy_septic_tank/pump_tuner.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/pump_tuner.py",
+      "/circuitpy_septic_tank/relay_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/relay_stats.py",
+      "/circuitpy_septic_tank/send_policy.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/send_policy.py",
+      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py",
+      "/circuitpy_septic_tank/telemetry.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/telemetry.py",
+      "/circuitpy_septic_tank/thermocouple_poller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/thermocouple_poller.py",
+      "/calibration/ph_calibration.bin" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/calibration/ph_calibration.bin",
+      "/code.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/code.py"
   },
   "856d" : {
       "/circuitpy_mcu/mcu.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/mcu.py",
       "/circuitpy_mcu/notecard_manager.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/notecard_manager.py",
+      "/circuitpy_mcu/ota_bootloader.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/ota_bootloader.py",
       "/circuitpy_mcu/DFRobot_PH.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/DFRobot_PH.py",
-      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py"
+      "/circuitpy_septic_tank/boot_orchestrator.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_orchestrator.py",
+      "/circuitpy_septic_tank/boot_profiler.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_profiler.py",
+      "/circuitpy_septic_tank/drivers.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/drivers.py",
+      "/circuitpy_septic_tank/env_dispatch.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/env_dispatch.py",
+      "/circuitpy_septic_tank/gascard.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/gascard.py",
+      "/circuitpy_septic_tank/heap_monitor.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/heap_monitor.py",
+      "/circuitpy_septic_tank/i2c_topology.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/i2c_topology.py",
+      "/circuitpy_septic_tank/jacket_controller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/jacket_controller.py",
+      "/circuitpy_septic_tank/journal.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/journal.py",
+      "/circuitpy_septic_tank/log_ring.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/log_ring.py",
+      "/circuitpy_septic_tank/loop_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/loop_stats.py",
+      "/circuitpy_septic_tank/ota_manifest.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_manifest.py",
+      "/circuitpy_septic_tank/ph_calibration_bank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_calibration_bank.py",
+      "/circuitpy_septic_tank/ph_probe.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_probe.py",
+      "/circuitpy_septic_tank/pump_tuner.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/pump_tuner.py",
+      "/circuitpy_septic_tank/relay_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/relay_stats.py",
+      "/circuitpy_septic_tank/send_policy.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/send_policy.py",
+      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py",
+      "/circuitpy_septic_tank/telemetry.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/telemetry.py",
+      "/circuitpy_septic_tank/thermocouple_poller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/thermocouple_poller.py",
+      "/calibration/ph_calibration.bin" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/calibration/ph_calibration.bin",
+      "/code.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/code.py"
   },
   "81aa" : {
       "/circuitpy_mcu/mcu.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/mcu.py",
       "/circuitpy_mcu/notecard_manager.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/notecard_manager.py",
-      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py"
+      "/circuitpy_mcu/ota_bootloader.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/main/ota_bootloader.py",
+      "/circuitpy_septic_tank/boot_orchestrator.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_orchestrator.py",
+      "/circuitpy_septic_tank/boot_profiler.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/boot_profiler.py",
+      "/circuitpy_septic_tank/drivers.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/drivers.py",
+      "/circuitpy_septic_tank/env_dispatch.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/env_dispatch.py",
+      "/circuitpy_septic_tank/gascard.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/gascard.py",
+      "/circuitpy_septic_tank/heap_monitor.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/heap_monitor.py",
+      "/circuitpy_septic_tank/i2c_topology.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/i2c_topology.py",
+      "/circuitpy_septic_tank/jacket_controller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/jacket_controller.py",
+      "/circuitpy_septic_tank/journal.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/journal.py",
+      "/circuitpy_septic_tank/log_ring.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/log_ring.py",
+      "/circuitpy_septic_tank/loop_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/loop_stats.py",
+      "/circuitpy_septic_tank/ota_manifest.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ota_manifest.py",
+      "/circuitpy_septic_tank/ph_calibration_bank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_calibration_bank.py",
+      "/circuitpy_septic_tank/ph_probe.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/ph_probe.py",
+      "/circuitpy_septic_tank/pump_tuner.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/pump_tuner.py",
+      "/circuitpy_septic_tank/relay_stats.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/relay_stats.py",
+      "/circuitpy_septic_tank/send_policy.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/send_policy.py",
+      "/circuitpy_septic_tank/septic_tank.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/septic_tank.py",
+      "/circuitpy_septic_tank/telemetry.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/telemetry.py",
+      "/circuitpy_septic_tank/thermocouple_poller.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/thermocouple_poller.py",
+      "/calibration/ph_calibration.bin" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/calibration/ph_calibration.bin",
+      "/code.py" : "https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/code.py"
   },
   "2b41" : {
       "/circuitpy_mcu/mcu.py" : "https://raw.githubusercontent.com/calcut/circuitpy_mcu/manual_switches/mcu.py",
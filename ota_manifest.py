@@ -0,0 +1,329 @@
+import binascii
+import json
+import os
+
+try:
+    import hashlib
+except ImportError:
+    import adafruit_hashlib as hashlib
+
+# Delta OTA updates. The manifest gives, for each device, every file it should have with the
+# content hash and size, so a box only downloads the files that have actually changed.
+# Each changed file is downloaded to <path>.tmp, checked against the manifest, then swapped in,
+# so an interrupted or corrupt download never replaces a working file.
+# sha1 because it is the only hash the CircuitPython core hashlib provides.
+#
+# The manifest is compiled on a host from ota_list.py (device -> {path: url}) with
+#   python ota_manifest.py ota_list.py ota_manifest.jsonl
+# Files served from this repo (REPO_URL) are hashed from the checkout next to ota_list.py, so
+# the manifest is committed together with the files it describes. Other files (circuitpy_mcu,
+# branch overrides) are fetched, or with --offline listed unpinned, with no hash or size.
+# A box downloads unpinned files whole at every update, as the legacy ota_list.py update does,
+# and can only check them against the Content-Length the server sends.
+#
+# Most devices list the same files, so they are stored once. Files listed by the same set of
+# devices form a shared group, and each device has a small overlay of the files only it lists
+# (e.g. a branch override). One JSON object per line:
+#   index   {"version": 1, "url": common url prefix, "lines": {name: [offset, length]}}
+#   group   {"files": {path: [url suffix, sha1, size]}}
+#   device  {"groups": [group names], "files": {path: [url suffix, sha1, size]}}
+# sha1 and size are null for an unpinned file.
+# Offsets count from the end of the index line. Group names start with '*', the rest are
+# device serials. A box parses the index and only the lines for its own entry.
+
+REPO_URL = 'https://raw.githubusercontent.com/calcut/circuitpy_septic_tank/main/'
+MANIFEST_URL = REPO_URL + 'ota_manifest.jsonl'
+VERSION = 1
+HASH = 'sha1'
+CHUNK = 1024
+TMP_SUFFIX = '.tmp'
+
+def hash_file(path):
+    # Returns the hex digest of a file, or None if it doesn't exist
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    h = hashlib.new(HASH)
+    buf = bytearray(CHUNK)
+    view = memoryview(buf)
+    with f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return binascii.hexlify(h.digest()).decode()
+
+def file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return None
+
+def is_current(path, entry):
+    # Size first, so most changed files are found without hashing them.
+    # An unpinned file is never current, so it is always downloaded.
+    if entry[HASH] is None:
+        return False
+    if file_size(path) != entry['size']:
+        return False
+    return hash_file(path) == entry[HASH]
+
+def lookup(manifest, device_id):
+    # Returns {path: {'url', 'sha1', 'size'}} for one device from compiled manifest bytes,
+    # or None if the device isn't listed
+    end = manifest.find(b'\n')
+    index = json.loads(manifest[:end])
+    if index['version'] != VERSION:
+        raise ValueError(f'Unsupported OTA manifest version {index["version"]}')
+    lines = index['lines']
+    if device_id not in lines:
+        return None
+
+    def entry(name):
+        offset, length = lines[name]
+        start = end + 1 + offset
+        return json.loads(manifest[start:start+length])
+
+    device = entry(device_id)
+    files = {}
+    for name in device['groups'] + [None]:
+        group = device if name is None else entry(name)
+        for path, (url, digest, size) in group['files'].items():
+            files[path] = {'url': index['url'] + url, HASH: digest, 'size': size}
+    return files
+
+def changed_files(files):
+    # Paths from a device's manifest entries whose local copy is missing or different
+    return [path for path, entry in files.items() if not is_current(path, entry)]
+
+def content_length(response):
+    for key, val in response.headers.items():
+        if key.lower() == 'content-length':
+            return int(val)
+    return None
+
+def make_dirs(path):
+    parts = path.split('/')[1:-1]
+    directory = ''
+    for part in parts:
+        directory += '/' + part
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass # already exists
+
+def connect_wifi():
+    # Returns a requests session over WiFi, using the credentials in secrets.py
+    import adafruit_requests
+    import socketpool
+    import ssl
+    import wifi
+    from secrets import secrets
+    wifi.radio.connect(secrets['ssid'], secrets['password'])
+    pool = socketpool.SocketPool(wifi.radio)
+    return adafruit_requests.Session(pool, ssl.create_default_context())
+
+
+class Updater():
+
+    def __init__(self, session, manifest_url=MANIFEST_URL, device_id=None, log=print):
+        if device_id is None:
+            import microcontroller
+            device_id = microcontroller.cpu.uid[-2:].hex()
+        self.session = session
+        self.manifest_url = manifest_url
+        self.device_id = device_id
+        self.log = log
+        self.bytes_downloaded = 0
+        self.files_updated = []
+        self.files_failed = []
+
+    def get_manifest(self):
+        response = self.session.get(self.manifest_url)
+        try:
+            # Raised rather than parsed, so code.py falls back to the whole file update
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code} for {self.manifest_url}')
+            manifest = response.content
+            self.bytes_downloaded += len(manifest)
+        finally:
+            response.close()
+        files = lookup(manifest, self.device_id)
+        if files is None:
+            self.log(f'OTA: no manifest entry for device {self.device_id}')
+            return {}
+        return files
+
+    def download(self, url, path, entry):
+        # Streams url to path, returns True if it matched the manifest size and hash,
+        # or for an unpinned file, the size the server gave
+        h = hashlib.new(HASH)
+        size = 0
+        expected_size = entry['size']
+        make_dirs(path)
+        response = self.session.get(url, stream=True)
+        try:
+            if response.status_code != 200:
+                self.log(f'OTA: HTTP {response.status_code} for {url}')
+                return False
+            if expected_size is None:
+                expected_size = content_length(response)
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK):
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+        finally:
+            response.close()
+            self.bytes_downloaded += size
+        if expected_size is not None and size != expected_size:
+            self.log(f'OTA: {url} failed verification ({size} bytes)')
+            return False
+        if entry[HASH] is not None and binascii.hexlify(h.digest()).decode() != entry[HASH]:
+            self.log(f'OTA: {url} failed verification ({size} bytes)')
+            return False
+        return True
+
+    def swap(self, tmp, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass # new file
+        os.rename(tmp, path)
+
+    def update_file(self, path, entry):
+        tmp = path + TMP_SUFFIX
+        # A verified download from a boot that was interrupted before the swap can be used as is
+        if not is_current(tmp, entry):
+            if not self.download(entry['url'], tmp, entry):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                return False
+        self.swap(tmp, path)
+        return True
+
+    def update(self):
+        # Brings every file in this device's manifest up to date, returns the paths replaced
+        files = self.get_manifest()
+        changed = changed_files(files)
+        unpinned = len([path for path in changed if files[path][HASH] is None])
+        self.log(f'OTA: {len(changed) - unpinned} of {len(files)} files changed, {unpinned} unpinned')
+        for path in changed:
+            if self.update_file(path, files[path]):
+                self.log(f'OTA: updated {path}')
+                self.files_updated.append(path)
+            else:
+                self.files_failed.append(path)
+        self.log(f'OTA: {self.bytes_downloaded} bytes downloaded')
+        return self.files_updated
+
+
+def build(ota_list, fetch):
+    # Host side. Adds the hash and size of every listed file, fetch(url) returns its bytes,
+    # or None to list the file unpinned. Each url is fetched once, however many devices list it.
+    # Returns {device: {path: {'url', 'sha1', 'size'}}}, the same form lookup() gives.
+    import hashlib as host_hashlib
+    contents = {}
+    manifest = {}
+    for device, files in ota_list.items():
+        manifest[device] = {}
+        for path, url in files.items():
+            if url not in contents:
+                contents[url] = fetch(url)
+            data = contents[url]
+            if data is None:
+                manifest[device][path] = {'url': url, HASH: None, 'size': None}
+                continue
+            manifest[device][path] = {
+                'url'   : url,
+                HASH    : host_hashlib.new(HASH, data).hexdigest(),
+                'size'  : len(data),
+            }
+    return manifest
+
+def compile_manifest(manifest):
+    # Host side. Turns build() output into the compact indexed form, returned as bytes
+    urls = [entry['url'] for files in manifest.values() for entry in files.values()]
+    prefix = urls[0] if urls else ''
+    for url in urls:
+        while not url.startswith(prefix):
+            prefix = prefix[:-1]
+    prefix = prefix[:prefix.rfind('/') + 1]
+
+    # Which devices list each (path, url), files listed by the same set of devices share a group
+    listed_by = {}
+    for device in sorted(manifest):
+        for path, entry in manifest[device].items():
+            key = (path, entry['url'], entry[HASH], entry['size'])
+            listed_by.setdefault(key, []).append(device)
+    groups = {}
+    for key, devices in listed_by.items():
+        if len(devices) > 1:
+            groups.setdefault(tuple(devices), []).append(key)
+    # Biggest groups first, so names stay stable as overlays come and go
+    group_names = {}
+    for i, devices in enumerate(sorted(groups, key=lambda d: (-len(d), d))):
+        group_names[devices] = f'*{i}'
+
+    def files_object(keys):
+        return {path: [url[len(prefix):], digest, size] for path, url, digest, size in sorted(keys)}
+
+    records = []
+    for devices, name in sorted(group_names.items(), key=lambda item: item[1]):
+        records.append((name, {'files': files_object(groups[devices])}))
+    for device in sorted(manifest):
+        member_of = [name for devices, name in group_names.items() if device in devices]
+        own = [key for key, devices in listed_by.items() if devices == [device]]
+        records.append((device, {'groups': sorted(member_of), 'files': files_object(own)}))
+
+    lines = {}
+    body = b''
+    for name, record in records:
+        line = json.dumps(record, separators=(',', ':')).encode()
+        lines[name] = [len(body), len(line)]
+        body += line + b'\n'
+    index = {'version': VERSION, 'url': prefix, 'lines': lines}
+    return json.dumps(index, separators=(',', ':')).encode() + b'\n' + body
+
+def local_fetch(repo_root, fetch=None):
+    # Host side. A fetch for build() reading this repo's files from repo_root,
+    # anything else goes to fetch, or is listed unpinned if that is None
+    def local(url):
+        if url.startswith(REPO_URL):
+            with open(os.path.join(repo_root, url[len(REPO_URL):]), 'rb') as f:
+                return f.read()
+        if fetch is None:
+            return None
+        return fetch(url)
+    return local
+
+if __name__ == '__main__':
+    import sys
+    import urllib.request
+
+    def fetch(url):
+        with urllib.request.urlopen(url) as response:
+            return response.read()
+
+    args = [arg for arg in sys.argv[1:] if arg != '--offline']
+    if len(args) < 2:
+        print('usage: python ota_manifest.py [--offline] ota_list.py ota_manifest.jsonl')
+        sys.exit(1)
+    with open(args[0]) as f:
+        ota_list = json.load(f)
+    repo_root = os.path.dirname(os.path.abspath(args[0]))
+    if '--offline' in sys.argv:
+        print(f'--offline, files not under {REPO_URL} are listed unpinned')
+        fetch = None
+    manifest = build(ota_list, local_fetch(repo_root, fetch))
+    compiled = compile_manifest(manifest)
+    with open(args[1], 'wb') as f:
+        f.write(compiled)
+    expanded = len(json.dumps(manifest, separators=(',', ':')))
+    unpinned = sum(1 for files in manifest.values() for entry in files.values() if entry[HASH] is None)
+    print(f'{sum(len(files) for files in manifest.values())} entries ({unpinned} unpinned) for '
+          f'{len(manifest)} devices, {len(compiled)} bytes ({expanded} expanded) written to {args[1]}')
@@ -0,0 +1,227 @@
+import struct
+
+# All pH probe calibrations, for every site and channel, compiled into one small binary file.
+# A box picks its own set by site ID (e.g. 'ST20C') or by device serial, so the same file can be
+# copied to every box, and its calibrations are loaded with a single read.
+#
+# Compile from the text calibration files on a host with:
+#   python ph_calibration_bank.py calibration
+#
+# File layout, little endian:
+#   header  magic 'PHCB', version, channels per site, number of index entries
+#   index   one entry per site ID or alias: name (8 bytes, NUL padded), offset of its record
+#   records channels per site x (v0, tref, c0, c1, c2) as float32, see ph_probe.PhProbe.
+#           A missing channel has v0 stored as NaN.
+#
+# Version 1 banks stored (neutral_voltage, acid_voltage, calibration_temp) per channel, they are
+# still read and converted to coefficients. Text files are two point calibrations, converted the same way.
+#
+# Aliases map other names onto a site's record, e.g. device serials. They are read from
+# site_aliases.txt in the source directory if it exists, one 'alias=SITE' per line. None are
+# committed yet, so a box without a site-id falls back to its legacy text files.
+
+BANK_FILE = '/calibration/ph_calibration.bin'
+LEGACY_FILE = '/calibration/ph_calibration_ch{}.txt'
+
+MAGIC = b'PHCB'
+VERSION = 2
+HEADER = '<4sBBH'
+INDEX_ENTRY = '<8sH'
+NAME_LENGTH = 8
+FIELDS = ('v0', 'tref', 'c0', 'c1', 'c2')
+RECORD = '<5f'
+TWO_POINT_FIELDS = ('neutral_voltage', 'acid_voltage', 'calibration_temp')
+RECORD_V1 = '<3f'
+
+def two_point_coefficients(neutral_voltage, acid_voltage, calibration_temp):
+    # pH 7 at neutral_voltage, pH 4 at acid_voltage, linear between
+    return {
+        'v0'    : neutral_voltage,
+        'tref'  : calibration_temp,
+        'c0'    : 7.0,
+        'c1'    : (4.0 - 7.0) / (acid_voltage - neutral_voltage),
+        'c2'    : 0.0,
+        }
+
+def load_text(path):
+    # Parses a DFRobot style 'key=value' calibration file, returns None if unreadable
+    calibration = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, sep, val = line.strip().partition('=')
+                if key in TWO_POINT_FIELDS:
+                    calibration[key] = float(val)
+    except (OSError, ValueError):
+        return None
+    for key in TWO_POINT_FIELDS:
+        if key not in calibration:
+            return None
+    return two_point_coefficients(*[calibration[key] for key in TWO_POINT_FIELDS])
+
+def _name(name):
+    name = name.encode()
+    if len(name) > NAME_LENGTH:
+        raise ValueError(f'Site name too long: {name}')
+    return name + bytes(NAME_LENGTH - len(name))
+
+def write_bank(sites, path=None, aliases=None):
+    # sites is {site: {channel: calibration}}, channels numbered from 1
+    if path is None:
+        path = BANK_FILE
+    if aliases is None:
+        aliases = {}
+
+    names = sorted(sites)
+    channels = 0
+    for site in names:
+        channels = max([channels] + list(sites[site]))
+
+    entries = [(site, site) for site in names]
+    for alias in sorted(aliases):
+        if aliases[alias] in sites:
+            entries.append((alias, aliases[alias]))
+
+    record_size = channels * struct.calcsize(RECORD)
+    records_start = struct.calcsize(HEADER) + len(entries) * struct.calcsize(INDEX_ENTRY)
+
+    data = bytearray(struct.pack(HEADER, MAGIC, VERSION, channels, len(entries)))
+    for name, site in entries:
+        offset = records_start + names.index(site) * record_size
+        data += struct.pack(INDEX_ENTRY, _name(name), offset)
+    for site in names:
+        for ch in range(1, channels + 1):
+            cal = sites[site].get(ch)
+            if cal is None:
+                data += struct.pack(RECORD, float('nan'), 0, 0, 0, 0)
+            else:
+                data += struct.pack(RECORD, *[cal[key] for key in FIELDS])
+
+    try:
+        with open(path, 'wb') as f:
+            f.write(data)
+        return True
+    except OSError:
+        return False
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < struct.calcsize(HEADER):
+        return None
+    magic, version, channels, count = struct.unpack_from(HEADER, data)
+    if magic != MAGIC or version not in (1, VERSION):
+        return None
+    return data, version, channels, count
+
+def _unpack_record(data, version, offset, channels):
+    calibrations = []
+    record = RECORD if version == VERSION else RECORD_V1
+    size = struct.calcsize(record)
+    for ch in range(channels):
+        values = struct.unpack_from(record, data, offset + ch * size)
+        if values[0] != values[0]: # NaN, no calibration for this channel
+            calibrations.append(None)
+        elif version == VERSION:
+            calibrations.append(dict(zip(FIELDS, values)))
+        else:
+            calibrations.append(two_point_coefficients(*values))
+    return calibrations
+
+def load(site, path=None):
+    # Returns a list of calibrations indexed by channel-1 (None where missing),
+    # or None if the bank can't be read or has no entry for this site
+    if path is None:
+        path = BANK_FILE
+    bank = _read(path)
+    if bank is None:
+        return None
+    data, version, channels, count = bank
+
+    if len(site.encode()) > NAME_LENGTH:
+        return None # can't be in the bank
+    name = _name(site)
+    pos = struct.calcsize(HEADER)
+    for i in range(count):
+        entry, offset = struct.unpack_from(INDEX_ENTRY, data, pos)
+        if entry == name:
+            return _unpack_record(data, version, offset, channels)
+        pos += struct.calcsize(INDEX_ENTRY)
+    return None
+
+def load_all(path=None):
+    # Returns ({site: {channel: calibration}}, {alias: site}), e.g. to edit and rewrite the bank
+    if path is None:
+        path = BANK_FILE
+    sites = {}
+    aliases = {}
+    bank = _read(path)
+    if bank is None:
+        return sites, aliases
+    data, version, channels, count = bank
+
+    owners = {}
+    pos = struct.calcsize(HEADER)
+    for i in range(count):
+        entry, offset = struct.unpack_from(INDEX_ENTRY, data, pos)
+        name = entry.rstrip(b'\x00').decode()
+        pos += struct.calcsize(INDEX_ENTRY)
+        if offset in owners:
+            aliases[name] = owners[offset]
+            continue
+        # Sites are written before aliases, so the first name for a record is the site
+        owners[offset] = name
+        sites[name] = {}
+        for ch, cal in enumerate(_unpack_record(data, version, offset, channels)):
+            if cal is not None:
+                sites[name][ch+1] = cal
+    return sites, aliases
+
+def update(site, channel, calibration, path=None):
+    # Rewrites the bank with a new calibration for one site/channel.
+    # Returns False if the file can't be written, e.g. CIRCUITPY is read-only
+    sites, aliases = load_all(path)
+    site = aliases.get(site, site)
+    sites.setdefault(site, {})[channel] = calibration
+    return write_bank(sites, path, aliases)
+
+def compile_bank(source_dir, path=None):
+    # Collects '<SITE>_ph_calibration_ch<n>.txt' files from source_dir into one bank
+    import os
+    sites = {}
+    for filename in sorted(os.listdir(source_dir)):
+        site, sep, rest = filename.partition('_ph_calibration_ch')
+        if not sep or not rest.endswith('.txt'):
+            continue
+        calibration = load_text(f'{source_dir}/{filename}')
+        if calibration is None:
+            continue
+        sites.setdefault(site, {})[int(rest[:-4])] = calibration
+
+    aliases = {}
+    try:
+        with open(f'{source_dir}/site_aliases.txt', 'r') as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                alias, sep, site = line.partition('=')
+                if sep:
+                    aliases[alias.strip()] = site.strip()
+    except OSError:
+        pass
+
+    if path is None:
+        path = f'{source_dir}/ph_calibration.bin'
+    write_bank(sites, path, aliases)
+    return sites, aliases
+
+if __name__ == '__main__':
+    import sys
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else 'calibration'
+    sites, aliases = compile_bank(source_dir)
+    for site in sorted(sites):
+        print(f'{site}: channels {sorted(sites[site])}')
+    for alias in sorted(aliases):
+        print(f'{alias} -> {aliases[alias]}')
@@ -0,0 +1,137 @@
+# Converts pH probe voltage to pH from precomputed calibration coefficients:
+#
+#   x  = (voltage - v0) * (tref + 273.15) / (temperature + 273.15)
+#   pH = c0 + x*(c1 + x*c2)
+#
+# v0 is the voltage at pH 7, where the response pivots with temperature. The electrode slope is
+# proportional to absolute temperature (Nernst), so x is the voltage offset rescaled to tref, the
+# temperature the calibration was fitted at. Without a temperature, x is the raw voltage offset.
+#
+# Coefficients come from ph_calibration_bank, either converted from a two point (pH 7 and pH 4)
+# DFRobot calibration, or fitted by least squares to any number of buffer points with fit_points().
+
+ZERO_CELSIUS = 273.15
+
+DEFAULT_CALIBRATION = {
+    'v0'    : 1.5,
+    'tref'  : 25.0,
+    'c0'    : 7.0,
+    'c1'    : -5.6344, # DFRobot default, pH 4 at 2.03244V: (4 - 7)/(2.03244 - 1.5)
+    'c2'    : 0.0,
+    }
+
+class PhProbe():
+
+    def __init__(self, analog_in, calibration=None, log=None):
+        self.adc = analog_in
+        self.log = log
+        self.points = [] # (voltage, temperature, buffer pH) collected for the next fit
+        self.set_calibration(calibration)
+
+    def set_calibration(self, calibration):
+        if calibration is None:
+            calibration = DEFAULT_CALIBRATION
+        self.calibration = dict(calibration)
+        self.v0 = calibration['v0']
+        self.kref = calibration['tref'] + ZERO_CELSIUS
+        self.c0 = calibration['c0']
+        self.c1 = calibration['c1']
+        self.c2 = calibration['c2']
+
+    def convert(self, voltage, temperature=None):
+        x = voltage - self.v0
+        if temperature is not None:
+            x = x * self.kref / (temperature + ZERO_CELSIUS)
+        return round(self.c0 + x*(self.c1 + x*self.c2), 2)
+
+    def read_PH(self, temperature=None):
+        return self.convert(self.adc.voltage, temperature)
+
+    def add_point(self, buffer_ph, temperature=None):
+        # Records the current voltage with the pH of the buffer solution the probe is sitting in
+        voltage = self.adc.voltage
+        self.points.append((voltage, temperature, buffer_ph))
+        if self.log:
+            self.log.info(f'pH calibration point {len(self.points)}: pH {buffer_ph} at {voltage:.5f}V {temperature=}')
+        return voltage
+
+    def fit(self, degree=1):
+        # Fits the collected points and uses the result.
+        # Returns the new calibration, or None if there aren't enough points.
+        calibration = fit_points(self.points, degree)
+        if calibration is None:
+            return None
+        self.set_calibration(calibration)
+        self.points = []
+        return calibration
+
+
+def _solve(a, b):
+    # Gaussian elimination with partial pivoting, a is n x n, modified in place
+    n = len(b)
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if a[pivot][col] == 0:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        b[col], b[pivot] = b[pivot], b[col]
+        for row in range(col + 1, n):
+            f = a[row][col] / a[col][col]
+            for k in range(col, n):
+                a[row][k] -= f * a[col][k]
+            b[row] -= f * b[col]
+    x = [0.0] * n
+    for row in range(n - 1, -1, -1):
+        x[row] = (b[row] - sum([a[row][k] * x[k] for k in range(row + 1, n)])) / a[row][row]
+    return x
+
+def _least_squares(points, v0, kref, degree):
+    # Normal equations for pH = sum(c[k] * x**k)
+    n = degree + 1
+    a = [[0.0] * n for i in range(n)]
+    b = [0.0] * n
+    for voltage, temperature, ph in points:
+        x = voltage - v0
+        if temperature is not None:
+            x = x * kref / (temperature + ZERO_CELSIUS)
+        powers = [x**k for k in range(2 * n - 1)]
+        for row in range(n):
+            b[row] += ph * powers[row]
+            for col in range(n):
+                a[row][col] += powers[row + col]
+    return _solve(a, b)
+
+def fit_points(points, degree=1):
+    # Least squares fit of (voltage, temperature, buffer pH) points, degree 1 (slope and offset)
+    # or 2 (quadratic). Returns calibration coefficients, or None if under-determined.
+    # Points without a temperature are taken to be at the reference temperature.
+    buffers = set([ph for voltage, temperature, ph in points])
+    if len(buffers) < degree + 1:
+        return None
+
+    temperatures = [t for v, t, ph in points if t is not None]
+    tref = sum(temperatures) / len(temperatures) if temperatures else DEFAULT_CALIBRATION['tref']
+    kref = tref + ZERO_CELSIUS
+
+    # First pass finds v0, the voltage where a straight line fit crosses pH 7
+    v0 = sum([voltage for voltage, temperature, ph in points]) / len(points)
+    line = _least_squares(points, v0, kref, 1)
+    if line is None or line[1] == 0:
+        return None
+    v0 += (7.0 - line[0]) / line[1]
+
+    c = _least_squares(points, v0, kref, degree)
+    if c is None:
+        return None
+    c += [0.0] * (3 - len(c))
+    return {'v0': v0, 'tref': tref, 'c0': c[0], 'c1': c[1], 'c2': c[2]}
+
+def read_batch(probes, temperatures):
+    # Reads every probe voltage back to back, then converts them all, so one set of readings
+    # shares a single snapshot. temperatures[i] is the liquid temperature for probes[i], or None.
+    voltages = [probe.adc.voltage for probe in probes]
+    readings = []
+    for i, probe in enumerate(probes):
+        temperature = temperatures[i] if i < len(temperatures) else None
+        readings.append(probe.convert(voltages[i], temperature))
+    return readings
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+
+# Closed loop pump speed tuning from the gascard pressure reading.
+# Each pump line gives a different flow at the same throttle, so with hand set speeds some lines
+# take longer than others to reach a steady reading. The tuner:
+#   1. measures the baseline pressure with every pump off
+#   2. runs each pump at its current speed and measures the pressure rise, giving its gain
+#   3. picks a common target rise, by default the most the weakest pump gives at max_speed,
+#      so every line flows as fast as all of them can match
+#   4. runs each pump at target / gain, correcting in proportion to the error until the rise is
+#      within tolerance of the target
+# A measurement is taken once the pressure has settled, i.e. the last STEADY_SAMPLES readings
+# (one a second) lie within STEADY_BAND, or settle_time has passed.
+#
+# run() is a generator, stepped once per pass of the main loop while the gascard is still
+# parsed as normal, so the rest of the loop keeps running during the few minutes it takes.
+# The tuned speeds are kept in TUNING_FILE and applied over the env defaults at boot. If
+# CIRCUITPY is read-only they go to SD_TUNING_FILE on the journal's SD card instead.
+
+TUNING_FILE = '/pump_tuning.json'
+SD_TUNING_FILE = '/sd/pump_tuning.json'
+STEADY_SAMPLES = 10
+STEADY_BAND = 0.5 # mbar
+MIN_SPEED = 0.2 # below this the pumps may stall
+
+def load(path=None):
+    # From path, or by default TUNING_FILE then SD_TUNING_FILE. None if there isn't one
+    for path in [path] if path else [TUNING_FILE, SD_TUNING_FILE]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return None
+
+def save(tuning, path=None):
+    # To path, or by default TUNING_FILE falling back to SD_TUNING_FILE.
+    # Returns False if it can't be written anywhere
+    for path in [path] if path else [TUNING_FILE, SD_TUNING_FILE]:
+        try:
+            with open(path, 'w') as f:
+                json.dump(tuning, f)
+        except OSError:
+            continue
+        if path == TUNING_FILE:
+            try:
+                os.remove(SD_TUNING_FILE) # superseded, load() would find it first otherwise
+            except OSError:
+                pass
+        return True
+    return False
+
+
+class PumpTuner():
+
+    def __init__(self, pumps, valves, gascard, speeds, target_rise=None, max_speed=0.9,
+                 tolerance=0.05, max_rounds=4, settle_time=90, log=None):
+        self.pumps = pumps
+        self.valves = valves
+        self.gascard = gascard
+        self.speeds = list(speeds) # starting speeds, also the result
+        self.target_rise = target_rise
+        self.max_speed = max_speed
+        self.tolerance = tolerance
+        self.max_rounds = max_rounds
+        self.settle_time = settle_time
+        self.log = log
+
+        self.baseline = None
+        self.rises = [None] * len(pumps)
+        self.settle_seconds = [None] * len(pumps)
+
+    def _log(self, message):
+        if self.log:
+            self.log.info(f'pump tune: {message}')
+
+    def clamp(self, speed):
+        return max(MIN_SPEED, min(self.max_speed, speed))
+
+    def settle(self):
+        # Generator, returns (steady pressure, seconds to settle)
+        samples = []
+        timer_start = time.monotonic()
+        timer_sample = timer_start
+        while True:
+            yield
+            if time.monotonic() - timer_sample < 1:
+                continue
+            timer_sample = time.monotonic()
+            samples.append(self.gascard.pressure)
+            samples = samples[-STEADY_SAMPLES:]
+            elapsed = timer_sample - timer_start
+            if len(samples) == STEADY_SAMPLES and max(samples) - min(samples) <= STEADY_BAND:
+                return sum(samples) / len(samples), elapsed
+            if elapsed > self.settle_time:
+                self._log(f'pressure not steady after {int(elapsed)}s, using the latest readings')
+                return sum(samples) / len(samples), elapsed
+
+    def measure(self, i, speed):
+        # Generator, runs pump i at speed and returns (pressure rise, seconds to settle)
+        self.valves[i].throttle = 1
+        self.pumps[i].throttle = speed
+        try:
+            pressure, seconds = yield from self.settle()
+        finally:
+            self.pumps[i].throttle = 0
+        # Let the line return to baseline before the valve closes and the next pump runs
+        yield from self.settle()
+        self.valves[i].throttle = 0
+        return pressure - self.baseline, seconds
+
+    def run(self):
+        # Generator, step it once per main loop pass. Returns True if every pump was tuned.
+        self.baseline, seconds = yield from self.settle()
+        self._log(f'baseline {self.baseline:.1f}mbar')
+
+        gains = []
+        for i in range(len(self.pumps)):
+            rise, seconds = yield from self.measure(i, self.speeds[i])
+            self._log(f'pump{i+1} at {self.speeds[i]:.2f} rises {rise:.1f}mbar')
+            if rise <= STEADY_BAND:
+                self._log(f'pump{i+1} gives no pressure rise, leaving every speed as it was')
+                return False
+            gains.append(rise / self.speeds[i])
+
+        target = self.target_rise
+        if not target:
+            target = min(gains) * self.max_speed
+        self._log(f'target rise {target:.1f}mbar')
+
+        tuned = True
+        for i in range(len(self.pumps)):
+            speed = self.clamp(target / gains[i])
+            for r in range(self.max_rounds):
+                rise, seconds = yield from self.measure(i, speed)
+                self.rises[i] = rise
+                self.settle_seconds[i] = int(seconds)
+                if abs(rise - target) <= self.tolerance * target:
+                    break
+                corrected = self.clamp(speed * target / max(rise, STEADY_BAND))
+                if corrected == speed:
+                    break # at a speed limit
+                speed = corrected
+            if abs(self.rises[i] - target) > self.tolerance * target:
+                tuned = False
+            self.speeds[i] = round(speed, 3)
+            self._log(f'pump{i+1} tuned to {self.speeds[i]}, rise {rise:.1f}mbar, steady in {int(seconds)}s')
+
+        self.target_rise = target
+        return tuned
+
+    def stop(self):
+        # Everything off, e.g. after the tune failed part way through
+        for motor in self.pumps + self.valves:
+            motor.throttle = 0
+
+    def report(self):
+        return {
+            'pump-tune-speeds'  : self.speeds,
+            'pump-tune-rise'    : round(self.target_rise, 1) if self.target_rise else None,
+            'pump-tune-settle'  : self.settle_seconds,
+        }
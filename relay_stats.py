@@ -0,0 +1,75 @@
+from array import array
+import time
+
+class RelayStats():
+    # Per-relay duty cycle and switching counters, kept in fixed preallocated arrays.
+    # Counters cover one note window, report() returns them as compact note fields and starts
+    # a new window. A run still in progress at the end of a window carries on into the next.
+    # Times are held as float seconds from the start of the window, which stay small enough to
+    # keep sub-second resolution. The window start itself is kept in integer nanoseconds, as
+    # time.monotonic() a few days after boot is coarser than a second.
+
+    def __init__(self, count):
+        self.count = count
+        self.on_seconds = array('f', [0] * count)
+        self.switches = array('H', [0] * count)
+        self.longest_on = array('f', [0] * count)
+        self.longest_off = array('f', [0] * count)
+        self.state = array('b', [-1] * count) # -1 until first seen
+        self.timer_run = array('f', [0] * count) # negative if the run started in an earlier window
+        self.timer_update = array('f', [0] * count)
+        self.timer_window = time.monotonic_ns()
+
+    def _now(self):
+        # Seconds since the start of the window
+        return (time.monotonic_ns() - self.timer_window) / 1e9
+
+    def _close_run(self, i, now):
+        run = now - max(self.timer_run[i], 0)
+        if self.state[i] == 1:
+            if run > self.longest_on[i]:
+                self.longest_on[i] = run
+        elif self.state[i] == 0:
+            if run > self.longest_off[i]:
+                self.longest_off[i] = run
+
+    def update(self, i, on):
+        now = self._now()
+        on = 1 if on else 0
+
+        if self.state[i] == 1:
+            self.on_seconds[i] += now - max(self.timer_update[i], 0)
+        self.timer_update[i] = now
+
+        if self.state[i] != on:
+            if self.state[i] != -1:
+                self._close_run(i, now)
+                self.switches[i] += 1
+            self.state[i] = on
+            self.timer_run[i] = now
+
+    def report(self):
+        # Note fields, one list entry per relay: on seconds, switches, longest on and off run (seconds)
+        now = self._now()
+        for i in range(self.count):
+            if self.state[i] != -1:
+                self.update(i, self.state[i] == 1)
+                self._close_run(i, now)
+
+        fields = {
+            'jon'   : [int(v) for v in self.on_seconds],
+            'jsw'   : list(self.switches),
+            'jlon'  : [int(v) for v in self.longest_on],
+            'jloff' : [int(v) for v in self.longest_off],
+        }
+
+        # The new window starts now, so rebase the run timers onto it
+        for i in range(self.count):
+            self.on_seconds[i] = 0
+            self.switches[i] = 0
+            self.longest_on[i] = 0
+            self.longest_off[i] = 0
+            self.timer_run[i] -= now
+            self.timer_update[i] -= now
+        self.timer_window += int(now * 1e9)
+        return fields
@@ -0,0 +1,114 @@
+import time
+
+class SendPolicy():
+    # Decides when to sync queued notes to notehub, instead of a fixed send interval.
+    #   Offline: sync attempts back off exponentially from interval up to max_interval.
+    #   Connected, notes with novel data, or enough notes to make a batch: send every interval.
+    #   Connected, only a few unremarkable notes: hold them back, up to max_interval.
+    #   Nothing queued: sync only every max_interval, as a heartbeat for logs and env.
+    #   flush() (e.g. a gc sequence has completed): send as soon as min_interval allows.
+    # Call sent() after a sync that went out, or failed() after an attempt that didn't, which
+    # keeps the notes queued and backs off the next attempt.
+    # Data is novel if a new key appears, a non-numeric value changes, or a number has moved
+    # by more than deadband since the last sync. Keys starting with any of the ignore prefixes
+    # (e.g. per-window counters, which change every note) don't count.
+    # All intervals are in seconds.
+
+    def __init__(self, interval, max_interval, min_interval=60, batch_notes=10, deadband=0.5,
+                 ignore=(), log=None):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self.batch_notes = batch_notes
+        self.deadband = deadband
+        self.ignore = ignore
+        self.log = log
+
+        self.pending = 0
+        self.novel = False
+        self.flush_requested = False
+        self.retry = interval
+        self.last_sent = {}
+        self.latest = {}
+        self.timer_sent = None
+        self.timer_attempt = None # attempts straight away after boot
+
+    def _ignored(self, key):
+        for prefix in self.ignore:
+            if key.startswith(prefix):
+                return True
+        return False
+
+    def _is_novel(self, data):
+        for key, val in data.items():
+            if self._ignored(key):
+                continue
+            if key not in self.last_sent:
+                return True
+            last = self.last_sent[key]
+            if isinstance(val, (int, float)) and isinstance(last, (int, float)):
+                if abs(val - last) > self.deadband:
+                    return True
+            elif val != last:
+                return True
+        return False
+
+    def note_added(self, data):
+        self.pending += 1
+        if not self.novel and self._is_novel(data):
+            self.novel = True
+        for key, val in data.items():
+            self.latest[key] = val
+
+    def flush(self):
+        self.flush_requested = True
+
+    def configure(self, interval, max_interval, batch_notes=None):
+        # New intervals from env, used from the next due()
+        self.interval = interval
+        self.max_interval = max_interval
+        if batch_notes is not None:
+            self.batch_notes = batch_notes
+        self.retry = min(self.retry, max_interval)
+
+    def due(self, connected):
+        if self.timer_attempt is None:
+            return True
+        now = time.monotonic()
+
+        if not connected:
+            if now - self.timer_attempt < self.retry:
+                return False
+            self.retry = min(self.retry * 2, self.max_interval)
+            if self.log:
+                self.log.info(f'notecard offline, next sync attempt in {self.retry}s')
+            return True
+        self.retry = self.interval
+
+        # Nothing has gone out since boot, e.g. it started offline
+        if self.timer_sent is None:
+            return True
+        elapsed = now - self.timer_sent
+
+        if self.flush_requested:
+            return elapsed >= self.min_interval
+        if self.pending == 0:
+            return elapsed >= self.max_interval
+        if self.novel or self.pending >= self.batch_notes:
+            return elapsed >= self.interval
+        return elapsed >= self.max_interval
+
+    def sent(self):
+        if self.log:
+            self.log.debug('notes synced, %s queued, novel=%s, flush=%s',
+                           self.pending, self.novel, self.flush_requested)
+        self.timer_sent = time.monotonic()
+        self.timer_attempt = self.timer_sent
+        self.pending = 0
+        self.novel = False
+        self.flush_requested = False
+        self.last_sent = dict(self.latest)
+
+    def failed(self):
+        # The notes stay queued and count towards the next sync
+        self.timer_attempt = time.monotonic()
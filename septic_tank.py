@@ -1,13 +1,22 @@
 import time
+from circuitpy_septic_tank.boot_profiler import BootProfiler
+# Started ahead of the other imports, so their cost is the first boot phase
+boot_profiler = BootProfiler()
 from circuitpy_mcu.mcu import Mcu
 from circuitpy_mcu.notecard_manager import Notecard_manager
 from circuitpy_mcu.ota_bootloader import reset, enable_watchdog
-from circuitpy_septic_tank.gascard import Gascard
-from circuitpy_mcu.DFRobot_PH import DFRobot_PH
-import adafruit_mcp9600
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from adafruit_motorkit import MotorKit
+from circuitpy_septic_tank.env_dispatch import EnvDispatcher
+from circuitpy_septic_tank.thermocouple_poller import ThermocouplePoller
+from circuitpy_septic_tank import i2c_topology
+from circuitpy_septic_tank.boot_orchestrator import BootOrchestrator, call
+from circuitpy_septic_tank.send_policy import SendPolicy
+from circuitpy_septic_tank.log_ring import RingLogHandler, enabled
+from circuitpy_septic_tank.heap_monitor import HeapMonitor
+from circuitpy_septic_tank.loop_stats import LoopStats
+from circuitpy_septic_tank.telemetry import Telemetry
+# Device drivers are imported on demand, only for the subsystems env enables
+from circuitpy_septic_tank import drivers
+import microcontroller
 import busio
 import board
 import digitalio
@@ -26,6 +35,7 @@ MINUTES = 60
 
 # LOGLEVEL = logging.INFO
 LOGLEVEL = logging.DEBUG
+LOG_RING_RECORDS = 64 # log records held in RAM between flushes from the main loop
 
 # DELETE_ARCHIVE = False
 DELETE_ARCHIVE = True
@@ -33,12 +43,14 @@ DELETE_ARCHIVE = True
 PIN_JACKET1 = board.D9
 PIN_JACKET2 = board.D11
 PIN_JACKET3 = board.D12
+PIN_SD_CS = board.D10 # Adalogger FeatherWing
 
 # global variable so pumps can be shut down after keyboard interrupt
 pumps = []
 valves = []
 
 def main():
+    boot_profiler.mark('imports')
 
     # set defaults for environment variables, (may be overridden by notehub)
     env = {
@@ -46,12 +58,18 @@ def main():
         'pump2-speed'           : 0.6,
         'pump3-speed'           : 0.6,
         'pump4-speed'           : 0.6,
+        'pump-tune'             : 0, # change the value (e.g. to a date) to run the pump auto-tune
+        'pump-tune-rise'        : 0, # mbar above baseline to tune every pump to, 0 for the most the weakest allows
+        'pump-tune-max-speed'   : 0.9,
         'jacket-target-temps'   : [30, 30, 30],
         'jacket-hysteresis'     : 0.5,
         'jacket-control'        : True,
+        'jacket-controller'     : 'hysteresis', # or 'mpc' for the learnt model-predictive controller
         'gascard'               : True,
         'ph-temp-interval'      : 1, #minutes
-        'note-send-interval'    : 30, #minutes
+        'note-send-interval'    : 30, #minutes, when there is new data to send
+        'note-send-max-interval': 120, #minutes, longest notes are held back, or between syncs when offline
+        'note-batch-size'       : 60, #notes worth syncing even if nothing much has changed
         'gc-sample-times'       : ["02:00", "06:00", "10:00", "14:00", "18:00", "22:00"],
         'utc-offset-hours'      : 1,
         'gc-pump-time'          : 240,# 4 minutes
@@ -59,39 +77,116 @@ def main():
         'gc-pressure-settling'  : 10,
         'num-pumps'             : 4,
         'ph-channels'           : 3,
+        'site-id'               : '', # pH calibration set, e.g. 'ST20C'. Blank uses the device serial
+        'tc-reads-per-tick'     : 2, # thermocouple channels read per main loop pass
+        'tc-max-age'            : 60, # seconds without a reading before a thermocouple counts as failed
+        'journal'               : True, # SD card journal of every capture frame
+        'journal-backfill-minutes' : 10, # frames summarised per backfill note
+        'journal-backfill-batches' : 3, # backfill notes added per notecard service
         'dispay-page-time'      : 8, #seconds
+        'heap-monitor'          : False, # per loop stage heap use, sent with each sync
         'ota'                   : __version__
         }
 
-    def parse_environment():
+    def set_led_color(key, val):
+        r = int(val[1:3], 16)
+        g = int(val[3:5], 16)
+        b = int(val[5:], 16)
+        mcu.display.set_fast_backlight_rgb(r, g, b)
 
+    def set_gc_sample_alarm(key, val):
         nonlocal next_gc_sample
         nonlocal timer_gc_sample
         nonlocal next_gc_sample_countdown
 
-        for key, val in env.items():
-
-            if key == 'led-color':
-                r = int(val[1:3], 16)
-                g = int(val[3:5], 16)
-                b = int(val[5:], 16)
-                mcu.display.set_fast_backlight_rgb(r, g, b)
-
-            if key == 'gc-sample-times':
-                timer_gc_sample = time.monotonic()
-                next_gc_sample_countdown = mcu.get_next_alarm(val, env['utc-offset-hours'])
-                next_gc_sample = time.localtime(time.time() + next_gc_sample_countdown + env['utc-offset-hours']*60*60)
-                mcu.log.info(f"alarm set for {next_gc_sample.tm_hour:02d}:{next_gc_sample.tm_min:02d}:00 localtime")
+        timer_gc_sample = time.monotonic()
+        next_gc_sample_countdown = mcu.get_next_alarm(env['gc-sample-times'], env['utc-offset-hours'])
+        next_gc_sample = time.localtime(time.time() + next_gc_sample_countdown + env['utc-offset-hours']*60*60)
+        mcu.log.info(f"alarm set for {next_gc_sample.tm_hour:02d}:{next_gc_sample.tm_min:02d}:00 localtime")
+
+    def set_jacket_controller(key, val):
+        nonlocal jacket_controllers
+        jacket_controllers = []
+        if not env['jacket-control']:
+            return
+        make_controller = drivers.get('make_controller')
+        for i in range(len(env['jacket-target-temps'])):
+            jacket_controllers.append(make_controller(val, env['jacket-target-temps'][i],
+                                                      env['jacket-hysteresis'], name=f'jacket{i+1}'))
+        mcu.log.info(f"Jacket controller set to {val}")
+
+    def ph_site():
+        if env['site-id']:
+            site = str(env['site-id'])
+            if len(site.encode()) <= drivers.get('ph_calibration').NAME_LENGTH:
+                return site
+            mcu.log.warning(f"site-id {site} is too long for the pH calibration bank, using device serial")
+        # Short device serial, last 2 bytes of the cpu uid
+        return microcontroller.cpu.uid[-2:].hex()
+
+    def load_ph_calibrations(count):
+        ph_calibration_bank = drivers.get('ph_calibration')
+        site = ph_site()
+        calibrations = ph_calibration_bank.load(site)
+        if calibrations is not None:
+            mcu.log.info(f'pH calibrations loaded for site {site}')
+            return calibrations
+
+        # Older boxes have one text file per channel instead
+        mcu.log.warning(f'No pH calibration bank entry for site {site}, trying legacy files')
+        calibrations = [ph_calibration_bank.load_text(ph_calibration_bank.LEGACY_FILE.format(ch+1))
+                        for ch in range(count)]
+        if None in calibrations:
+            mcu.log.warning(f'No pH calibration for site {site}, using defaults where missing')
+        return calibrations
+
+    def set_ph_site(key, val):
+        if not ph_channels:
+            return
+        calibrations = load_ph_calibrations(len(ph_channels))
+        for i, ch in enumerate(ph_channels):
+            ch.set_calibration(calibrations[i] if i < len(calibrations) else None)
+
+    def set_heap_monitor(key, val):
+        heap.enabled = val
+        heap.reset()
+
+    def request_pump_tune(key, val):
+        nonlocal pump_tune_request
+        pump_tune_request = val
+
+    def check_ota(key, val):
+        if val == __version__:
+            mcu.log.info(f"Not performing OTA, version matches {val}")
+        else:
+            for p in pumps:
+                p.throttle = 0
+            for v in valves:
+                v.throttle = 0
+            mcu.ota_reboot()
+
+    def set_send_policy(key, val):
+        send_policy.configure(env['note-send-interval'] * MINUTES,
+                              env['note-send-max-interval'] * MINUTES,
+                              env['note-batch-size'])
+
+    # Only changed environment variables are dispatched, see parse_environment()
+    env_handlers = {
+        'led-color'             : set_led_color,
+        'gc-sample-times'       : set_gc_sample_alarm,
+        'utc-offset-hours'      : set_gc_sample_alarm,
+        'jacket-controller'     : set_jacket_controller,
+        'site-id'               : set_ph_site,
+        'heap-monitor'          : set_heap_monitor,
+        'pump-tune'             : request_pump_tune,
+        'note-send-interval'    : set_send_policy,
+        'note-send-max-interval': set_send_policy,
+        'note-batch-size'       : set_send_policy,
+        'ota'                   : check_ota,
+    }
 
-            if key == 'ota':
-                if val == __version__:
-                    mcu.log.info(f"Not performing OTA, version matches {val}")
-                else:
-                    for p in pumps:
-                        p.throttle = 0
-                    for v in valves:
-                        v.throttle = 0
-                    mcu.ota_reboot()
+    def parse_environment():
+        env_dispatcher.apply(env)
 
     pump_index = 1 # track which pump is active
     gc_sequence_index = 0 #track position in the gc_pump_sequence list
@@ -133,34 +228,76 @@ def main():
     }
     display_page = 0
     timer_display_page = time.monotonic()
+    jacket_controllers = []
+    ph_channels = []
+    heap = HeapMonitor()
+    telemetry = Telemetry() # per-second readings, mcu.data keeps the occasional ones
+    pump_tuning = {} # last pump auto-tune result, see pump_tuner.py
+    pump_tune_request = None # 'pump-tune' env value (or 'serial') waiting to be run
+    pump_tune = None # PumpTuner while a tune is running
+    pump_tune_steps = None
+    loop_stats = LoopStats(heap) # also marks the stages for the heap monitor
 
     # instantiate the MCU helper class to set up the system
     mcu = Mcu(loglevel=LOGLEVEL, i2c_freq=100000)
     mcu.enable_i2c2()
+    # Log records are batched in RAM and written out from the main loop, see log_ring.py.
+    # Boot logs are written straight out, the ring takes over at BOOT complete.
+    log_ring = RingLogHandler(mcu.loghandler, capacity=LOG_RING_RECORDS)
+    boot_profiler.mark('mcu')
     
-    # Check what devices are present on the i2c bus
-    mcu.i2c_identify(i2c_dict)
-    mcu.i2c_identify(i2c2_dict, i2c=mcu.i2c2)
+    # Check what devices are present on the i2c bus.
+    # One verification scan of each bus, every boot, is compared with the topology cached at the
+    # last full probe. If it matches, the slower identify step is skipped. Either way the
+    # connect_* functions only try addresses that answered the scan, rather than probing
+    # through exceptions.
+    timer_probe = time.monotonic_ns()
+    topology = {
+        'i2c'   : i2c_topology.scan(mcu.i2c),
+        'i2c2'  : i2c_topology.scan(mcu.i2c2),
+    }
+    cached_topology = i2c_topology.load()
+    topology_trusted = i2c_topology.matches(cached_topology, topology)
+    if not topology_trusted:
+        mcu.i2c_identify(i2c_dict)
+        mcu.i2c_identify(i2c2_dict, i2c=mcu.i2c2)
+    probe_ns = time.monotonic_ns() - timer_probe
+    boot_profiler.mark('i2c-scan')
     mcu.attach_display_sparkfun_20x4()
+    boot_profiler.mark('display')
 
     ncm = Notecard_manager(loghandler=mcu.loghandler, i2c=mcu.i2c, watchdog=120, loglevel=LOGLEVEL)
     mcu.log.info(f'STARTING {__filename__} {__version__}')
 
     ncm.set_default_envs(env)
+    # Intervals are set again from env by set_send_policy()
+    send_policy = SendPolicy(
+        interval = env['note-send-interval'] * MINUTES,
+        max_interval = env['note-send-max-interval'] * MINUTES,
+        batch_notes = env['note-batch-size'],
+        ignore = ('jon', 'jsw', 'jlon', 'jloff', 'boot-', 'backfill'),
+        log = mcu.log)
+    env_dispatcher = EnvDispatcher(env_handlers, log=mcu.log)
     parse_environment()
+    boot_profiler.mark('notecard')
 
     def connect_thermocouple_channels():
         tc_addresses = [0x60, 0x61, 0x62, 0x63, 0x64, 0x65, 0x66, 0x67]
         tc_channels = []
+        MCP9600 = drivers.get('MCP9600')
 
         for addr in tc_addresses:
+            if addr not in topology['i2c2']:
+                mcu.log.info(f'No thermocouple channel at {addr:x}')
+                continue
             try:
-                tc = adafruit_mcp9600.MCP9600(mcu.i2c2, address=addr)
+                tc = MCP9600(mcu.i2c2, address=addr)
                 tc_channels.append(tc)
                 mcu.log.info(f'Found thermocouple channel at address {addr:x}')
                 
             except Exception as e:
                 mcu.log.info(f'No thermocouple channel at {addr:x}')
+            yield
 
         return tc_channels
 
@@ -189,19 +326,29 @@ def main():
         return jacket_relays
 
     def connect_ph_channels():
+        ph_channels = []
+        if env['ph-channels'] == 0:
+            return ph_channels
+        if 0x48 not in topology['i2c2']:
+            mcu.log.info('ADC for pH probes not found')
+            return ph_channels
+
         try:
-            ph_channels = []
+            ADS = drivers.get('ADS1115')
+            AnalogIn = drivers.get('AnalogIn')
+            PhProbe = drivers.get('PhProbe')
             ads = ADS.ADS1115(mcu.i2c2)
             adc_list = [ADS.P0, ADS.P1, ADS.P2, ADS.P3]
 
             # Drop any unwanted/unused channels, as specified by ph-channels environment variable
             adc_list = adc_list[:env['ph-channels']] 
 
+            calibrations = load_ph_calibrations(len(adc_list))
             for ch in adc_list:
-                ph_channel = DFRobot_PH(
+                ph_channel = PhProbe(
                     analog_in = AnalogIn(ads, ch),
-                    calibration_file= f'/calibration/ph_calibration_ch{ch+1}.txt',
-                    log_handler = mcu.loghandler
+                    calibration = calibrations[ch] if ch < len(calibrations) else None,
+                    log = mcu.log
                     )
                 ph_channels.append(ph_channel)
 
@@ -213,9 +360,16 @@ def main():
 
 
     def connect_pumps():
+        global pumps
+        global valves
+        if env['num-pumps'] == 0:
+            return
+        if 0x6E not in topology['i2c2'] or 0x6F not in topology['i2c2']:
+            mcu.log.warning('Pump/Valve driver not found')
+            return
+
         try:
-            global pumps
-            global valves
+            MotorKit = drivers.get('MotorKit')
             # Changing pwm freq from 1600Hz to <500Hz helps a lot with matching speeds. unsure exactly why. 
             valve_driver = MotorKit(i2c=mcu.i2c2, address=0x6E, pwm_frequency=400)
             pump_driver = MotorKit(i2c=mcu.i2c2, address=0x6F, pwm_frequency=400)
@@ -235,15 +389,32 @@ def main():
             mcu.handle_exception(e)
             mcu.log.warning('Pump/Valve driver not found')
         
+    def load_pump_tuning():
+        # Speeds from the last pump auto-tune replace the defaults. Waits for the journal step,
+        # as the tuning is kept on the SD card when CIRCUITPY is read-only
+        nonlocal pump_tuning
+        while boot.pending(['pumps', 'journal']):
+            yield
+        if not pumps:
+            return
+        pump_tuning = drivers.get('pump_tuning').load() or {}
+        for i, speed in enumerate(pump_tuning.get('speeds', [])[:len(pumps)]):
+            env[f'pump{i+1}-speed'] = speed
+        if pump_tuning:
+            mcu.log.info(f"pump speeds {pump_tuning.get('speeds')} from auto-tune")
+
     def connect_gascard():
         try:
             uart = busio.UART(board.TX, board.RX, baudrate=57600)
-            gc = Gascard(uart)
-            gc.log.addHandler(mcu.loghandler)
+            gc = drivers.get('Gascard')(uart)
+            gc.log.addHandler(log_ring)
             gc.log.setLevel(logging.INFO)
-            mcu.watchdog_feed() #gascard startup can take a while
-            gc.poll_until_ready()
-            mcu.watchdog_feed() #gascard startup can take a while
+            # Same as gc.poll_until_ready(), but one line per pass of the main loop
+            while not gc.ready:
+                gc.parse_serial()
+                mcu.watchdog_feed() #gascard startup can take a while
+                yield
+            gc.log.info('Gascard Found')
 
         except Exception as e:
             mcu.handle_exception(e)
@@ -252,39 +423,84 @@ def main():
 
         return gc
 
+    def cache_i2c_topology():
+        # Waits for the I2C devices to be brought up, then records how long it took
+        while boot.pending(['thermocouples', 'ph', 'pumps']):
+            yield
+        probe_ms = probe_ns // 1000000
+        for name in ['thermocouples', 'ph', 'pumps']:
+            probe_ms += boot.step(name).elapsed_ms
+
+        if topology_trusted:
+            saved_ms = cached_topology.get('probe-ms', probe_ms) - probe_ms
+            mcu.log.info(f'I2C topology matches cache, device bring-up took {probe_ms}ms, {saved_ms}ms saved')
+        else:
+            topology['probe-ms'] = probe_ms
+            if i2c_topology.save(topology):
+                mcu.log.info(f'I2C topology changed, full device bring-up took {probe_ms}ms, saved to cache')
+            else:
+                mcu.log.info(f'I2C topology changed, full device bring-up took {probe_ms}ms, could not write cache')
+
+    def open_journal():
+        if not drivers.get('journal').mount_sd(PIN_SD_CS):
+            mcu.log.warning('SD card not found, running without journal')
+            return None
+        # Every per-second reading, see telemetry.py
+        return drivers.get('Journal')(telemetry.fields, log=mcu.log)
+
+    def attach_journal(j):
+        nonlocal journal
+        journal = j
+
+    def attach_ph_channels(channels):
+        nonlocal ph_channels
+        ph_channels = channels
+        mcu.log.info(f'{len(ph_channels)} pH channels attached')
+
+    def attach_gascard(gascard):
+        nonlocal gc
+        gc = gascard
+        if mcu.display:
+            mcu.display_text('Gascard Found')
+
+    # Devices come up as independent steps. The control loop starts once the thermocouples
+    # and jacket relays are ready, the rest attach while it runs (see boot.service() below).
+    # call() steps run in one go with no timeout, a probe that hangs is left to the watchdog.
+    tc_channels = []
+    jacket_relays = []
+    gc = None
+    journal = None
+    boot = BootOrchestrator(log=mcu.log, profiler=boot_profiler)
+    boot.add('thermocouples', connect_thermocouple_channels(), timeout=10, critical=True)
+    if env['jacket-control']:
+        boot.add('relays', call(connect_jacket_relays), timeout=None, critical=True)
+    boot.add('ph', call(connect_ph_channels), timeout=None, on_done=attach_ph_channels)
+    boot.add('pumps', call(connect_pumps), timeout=None)
+    boot.add('i2c-cache', cache_i2c_topology(), timeout=60)
+    if env['journal']:
+        boot.add('journal', call(open_journal), timeout=None, on_done=attach_journal)
+    if env['gascard']:
+        boot.add('gascard', connect_gascard(), timeout=120, on_done=attach_gascard)
+    boot.add('pump-tuning', load_pump_tuning(), timeout=15)
+    boot.run_critical()
 
-    tc_channels = connect_thermocouple_channels()
+    tc_channels = boot.step('thermocouples').result or []
+    tc_poller = ThermocouplePoller(tc_channels, per_tick=env['tc-reads-per-tick'],
+                                   max_age=env['tc-max-age'], log=mcu.log)
     if env['jacket-control']:
-        jacket_relays = connect_jacket_relays()
-    else:
-        jacket_relays = []
-    ph_channels = connect_ph_channels()
-    connect_pumps()
+        jacket_relays = boot.step('relays').result or []
+    relay_stats = None
+    if jacket_relays:
+        relay_stats = drivers.get('RelayStats')(len(jacket_relays))
 
     if mcu.display:
         mcu.display.clear()
         mcu.display.write(f'{len(tc_channels)} TC channels')
         mcu.display.set_cursor(0,1)
-        mcu.display.write(f'{len(ph_channels)} pH channels')
-        mcu.display.set_cursor(0,2)
-        mcu.display.write(f'{len(pumps)} air pumps')
-        mcu.display.set_cursor(0,3)
-        mcu.display.write(f'Waiting for gascard')
-
-    if env['gascard']:
-        gc = connect_gascard()
-    else:
-        gc = None
-
-    # Display gascard info
-    if mcu.display:
-        if gc:
-            mcu.display.clear()
-            mcu.display.write(f'Gascard Found')
-        else:
-            mcu.display.clear()
-            mcu.display.write(f'Gascard not used')
-        time.sleep(1)
+        mcu.display.write(f'{len(jacket_relays)} jacket relays')
+        if env['gascard']:
+            mcu.display.set_cursor(0,2)
+            mcu.display.write(f'Waiting for gascard')
 
 
 
@@ -307,29 +523,38 @@ def main():
             # keep keys 'url safe', i.e.
             # lower case ASCII letters, numbers, dashes only
 
-            for ph in ph_channels:
-                i = ph_channels.index(ph)
-                mcu.data[f'ph{i+1}'] = ph.read_PH()
-            
+            # Latest thermocouple values, read a few at a time by tc_poller
             tank_index=0
-            for tc in tc_channels:
-                i = tc_channels.index(tc)
+            for i in range(len(tc_channels)):
                 if (i%2 == 0): #even numbers, 0,2,4
                     tank_index+=1
-                    mcu.data[f'ts{tank_index}'] = tc.temperature
+                # None if the channel has stopped reading, so it shows as missing rather than stuck
+                temp = tc_poller.value(i)
+                if (i%2 == 0):
+                    telemetry.set(f'ts{tank_index}', temp)
                 else: # odd numbers #1,3,5
-                    mcu.data[f'tl{tank_index}'] = tc.temperature
+                    telemetry.set(f'tl{tank_index}', temp)
+
+            # pH compensated by the liquid temperature of the tank each probe sits in
+            if ph_channels:
+                temperatures = [telemetry.get(f'tl{i+1}') for i in range(len(ph_channels))]
+                for i, ph in enumerate(drivers.get('read_batch')(ph_channels, temperatures)):
+                    telemetry.set(f'ph{i+1}', ph)
 
             if gc:
-                mcu.data[f'debug-concentration'] = gc.concentration * 100
-                mcu.data[f'debug-pressure'] = gc.pressure
+                telemetry.set('debug-concentration', gc.concentration * 100)
+                telemetry.set('debug-pressure', gc.pressure)
 
             else:
-                mcu.data["debug-concentration"] = 0
-                mcu.data["debug-pressure"] = 0
+                telemetry.set('debug-concentration', 0)
+                telemetry.set('debug-pressure', 0)
+
+            if journal:
+                journal.append(telemetry)
 
         if len(pumps) > 0:
-            if time.monotonic() - timer_gc_sample > next_gc_sample_countdown:
+            # A sample falling due during a pump auto-tune waits for it to finish
+            if time.monotonic() - timer_gc_sample > next_gc_sample_countdown and not pump_tune:
                 timer_gc_sample = time.monotonic()
                 next_gc_sample_countdown = mcu.get_next_alarm(env['gc-sample-times'], env['utc-offset-hours'])
                 next_gc_sample = time.localtime(time.time() + next_gc_sample_countdown + env['utc-offset-hours']*60*60)
@@ -355,11 +580,11 @@ def main():
                 pumps[pump_index-1].throttle = 0
 
                 if gc:
-                    mcu.log.debug(f"waiting {env['gc-pressure-settling']}s for pressure to settle")
+                    mcu.log.debug("waiting %ss for pressure to settle", env['gc-pressure-settling'])
                     for i in range(env['gc-pressure-settling']):
                         gc.parse_serial()
                         mcu.display_text(f"{i} pressure={gc.pressure}")
-                        mcu.log.debug(f"{i} pressure={gc.pressure}")
+                        mcu.log.debug("%s pressure=%s", i, gc.pressure)
                         time.sleep(1)
                     mcu.data[f'pr{pump_index}'] = gc.pressure
 
@@ -372,6 +597,7 @@ def main():
                     # Push timer_pump out into the future so this won't trigger again until after the next sample alarm
                     timer_pump = time.monotonic() + 99999
                     mcu.log.info(f'GC sampling sequence complete')
+                    send_policy.flush()
 
                 else:
                     pump_index = env['gc-pump-sequence'][gc_sequence_index]
@@ -383,49 +609,87 @@ def main():
 
         display_summary()
 
-    def filter_data(filter_string=None, decimal_places=1):
-
+    def filter_data(filter_string):
+        # Readings whose names start with filter_string, already at their telemetry resolution
         data = {}
-        for key, value in mcu.data.items():
-            if filter_string:
-                if key.startswith(filter_string):
-                    data[key] = round(value, decimal_places)
-            else:
-                data[key] = round(value, decimal_places)
+        for key in telemetry.fields:
+            if key.startswith(filter_string):
+                value = telemetry.get(key)
+                if value is not None:
+                    data[key] = value
 
         return data
 
+    def liquid_temperature(tank):
+        # Fresh reading from the long thermocouple in the same tank as pH channel tank+1
+        tc_index = 2*tank + 1
+        if tc_index >= len(tc_channels):
+            return None
+        try:
+            return tc_channels[tc_index].temperature
+        except Exception as e:
+            mcu.log.warning(f'thermocouple {tc_index} read failed {e}')
+            return None
+
     def interactive_ph_calibration():
 
         try:
             print('Calibration Mode, press Ctrl-C to exit')
             while True:
-                # Need to sepcify how to get the temperature from a sensor here
-                temperature = None
                 valid_inputs = []
+                temperatures = [liquid_temperature(i) for i in range(len(ph_channels))]
                 for ch in ph_channels:
-                    index = f'{ph_channels.index(ch)+1}'
+                    i = ph_channels.index(ch)
+                    index = f'{i+1}'
                     valid_inputs.append(index)
-                    ph = ch.read_PH()
-                    print(f'Channel{index} pH={ph}, voltage={ch.adc.voltage}')
+                    ph = ch.read_PH(temperatures[i])
+                    print(f'Channel{index} pH={ph}, voltage={ch.adc.voltage}, temperature={temperatures[i]}')
 
                 print(f'Select channel to calibrate {valid_inputs}')
                 line = mcu.get_serial_line(valid_inputs)
                 ch_num = int(line)
                 channel = ph_channels[ch_num-1]
-                print(f'calibrating channel {ch_num}')
-
-                if not temperature:
-                    while True:
-                        print(f'Enter the current temperature')
-                        line = mcu.get_serial_line()
-                        try:
-                            temperature = float(line)
-                            break
-                        except Exception as e:
-                            print(e)
-
-                channel.calibrate(temperature)
+                print(f'calibrating channel {ch_num}, {len(channel.points)} points collected')
+                print('Enter the pH of the buffer the probe is in to add a point,')
+                print("'fit' (straight line) or 'fit2' (quadratic) to fit the points and save, or 'clear'")
+                line = mcu.get_serial_line()
+
+                if line in ['fit', 'fit2']:
+                    degree = 2 if line == 'fit2' else 1
+                    calibration = channel.fit(degree)
+                    if calibration is None:
+                        print(f'Need points in at least {degree+1} different buffers')
+                        continue
+                    print(f'Fitted {calibration}')
+                    site = ph_site()
+                    if drivers.get('ph_calibration').update(site, ch_num, calibration):
+                        print(f'Saved calibration for site {site} channel {ch_num}')
+                    else:
+                        print('Could not save calibration, is CIRCUITPY writeable?')
+
+                elif line == 'clear':
+                    channel.points = []
+
+                else:
+                    try:
+                        buffer_ph = float(line)
+                    except Exception as e:
+                        print(e)
+                        continue
+
+                    temperature = liquid_temperature(ch_num-1)
+                    if temperature is None:
+                        while True:
+                            print(f'Enter the current temperature')
+                            line = mcu.get_serial_line()
+                            try:
+                                temperature = float(line)
+                                break
+                            except Exception as e:
+                                print(e)
+
+                    voltage = channel.add_point(buffer_ph, temperature)
+                    print(f'Added pH {buffer_ph} at {voltage}V, {temperature}C')
         except KeyboardInterrupt:
             print('Leaving Calibration Mode')
 
@@ -457,12 +721,12 @@ def main():
 
                     lineShort = 'ts'
                     lineLong = 'tl'
-                    datashort = filter_data('ts', decimal_places=1)
+                    datashort = filter_data('ts')
                     datashort.pop('ts4', None) # Remove the ambient temperature thermocouple if it exists
                     for key in sorted(datashort):
                         lineShort += f'{datashort[key]: 3.1f}'
 
-                    datalong = filter_data('tl', decimal_places=1)
+                    datalong = filter_data('tl')
                     for key in sorted(datalong):
                         lineLong += f'{datalong[key]: 3.1f}'
 
@@ -473,7 +737,7 @@ def main():
 
                     mcu.display.set_cursor(0,3)
                     line = 'pH'
-                    data = filter_data('ph', decimal_places=1)
+                    data = filter_data('ph')
                     for key in sorted(data):
                         line+= f'{data[key]: 3.1f}'
                     mcu.display.write(f"{line:<20}"[:20])
@@ -484,7 +748,7 @@ def main():
                     mcu.display.write(f"{line:<20}"[:20])
 
                     mcu.display.set_cursor(0,1)
-                    line = f'gc{mcu.data["debug-concentration"]: 3.2f} nxtsmp={next_gc_sample.tm_hour:02d}:{next_gc_sample.tm_min:02d}      ' 
+                    line = f'gc{telemetry.get("debug-concentration", 0): 3.2f} nxtsmp={next_gc_sample.tm_hour:02d}:{next_gc_sample.tm_min:02d}      ' 
                     mcu.display.write(f"{line:<20}"[:20])
 
                     mcu.display.set_cursor(0,2)
@@ -536,22 +800,33 @@ def main():
         for j in jacket_relays:
             try:
                 target_temp = env['jacket-target-temps'][jacket_index]
-                tc = tc_channels[jacket_index*2] #assuming 2 thermocouples per tank
-                temp = tc.temperature
-
-                if temp <= (target_temp - hyst) and j.value == False:
-                    mcu.log.info(f"Jacket{jacket_index+1} at {temp}C, target {target_temp}C, turning on jacket")
-                    j.value = True
-                    mcu.log.info(f"{jacket_relays[0].value=} {jacket_relays[1].value=} {jacket_relays[2].value=}")
-                    mcu.log.info(f"{tc_channels[0].temperature=} {tc_channels[1].temperature=} {tc_channels[2].temperature=}")
-                    mcu.log.info(f"{tc_channels[3].temperature=} {tc_channels[4].temperature=} {tc_channels[5].temperature=}")
-
-                if temp >= (target_temp + hyst) and j.value == True:
-                    mcu.log.info(f"Jacket{jacket_index+1} at {temp}C, target {target_temp}C, turning off jacket")
-                    j.value = False
-                    mcu.log.info(f"{jacket_relays[0].value=} {jacket_relays[1].value=} {jacket_relays[2].value=}")
-                    mcu.log.info(f"{tc_channels[0].temperature=} {tc_channels[1].temperature=} {tc_channels[2].temperature=}")
-                    mcu.log.info(f"{tc_channels[3].temperature=} {tc_channels[4].temperature=} {tc_channels[5].temperature=}")
+                temp = tc_poller.value(jacket_index*2) #assuming 2 thermocouples per tank
+                if temp is None:
+                    # Not read yet, or the thermocouple has failed. Never heat without a reading
+                    if j.value:
+                        mcu.log.warning(f"Jacket{jacket_index+1} no thermocouple reading, turning off jacket")
+                        j.value = False
+                    relay_stats.update(jacket_index, False)
+                    continue
+
+                controller = jacket_controllers[jacket_index]
+                controller.target = target_temp
+                controller.hysteresis = hyst
+                # Liquid temperature from the long thermocouple, as captured this second
+                state = controller.update(temp, j.value, liquid_temp=telemetry.get(f'tl{jacket_index+1}'))
+
+                relay_stats.update(jacket_index, state)
+                if state != j.value:
+                    mcu.log.info("Jacket%s at %sC, target %sC, turning %s jacket",
+                                 jacket_index+1, temp, target_temp, 'on' if state else 'off')
+                    j.value = state
+                    # Latest polled values, rather than reading all six thermocouples again
+                    if enabled(mcu.log, logging.DEBUG):
+                        mcu.log.debug("relays %s thermocouples %s",
+                                      [r.value for r in jacket_relays], tc_poller.values)
+                    if env['jacket-controller'] == 'mpc' and enabled(mcu.log, logging.INFO):
+                        mcu.log.info("Jacket%s %s", jacket_index+1, controller.stats())
+
             except IndexError as e:
                 if len(tc_channels) < 6:
                     mcu.log.info(f"Jacket control IndexError, expected 6 thermocouple channels, found {len(tc_channels)}")
@@ -562,10 +837,99 @@ def main():
             finally:
                 jacket_index += 1
 
+    def start_pump_tune():
+        nonlocal pump_tune_request
+        nonlocal pump_tune
+        nonlocal pump_tune_steps
+        if boot.pending(['pump-tuning', 'gascard']):
+            return # the last tuning has to be loaded first
+        if pump_tune_request != 'serial' and pump_tune_request == pump_tuning.get('request', 0):
+            pump_tune_request = None # already tuned for this value
+            return
+        if not (gc and pumps):
+            mcu.log.warning('pump tune needs the gascard and pumps')
+            pump_tune_request = None
+            return
+        for motor in pumps + valves:
+            if motor.throttle:
+                return # gc sampling sequence running, try again once it is idle
+
+        mcu.log.info('pump tune starting')
+        speeds = [env[f'pump{i+1}-speed'] for i in range(len(pumps))]
+        pump_tune = drivers.get('PumpTuner')(pumps, valves, gc, speeds,
+                                             target_rise=env['pump-tune-rise'],
+                                             max_speed=env['pump-tune-max-speed'],
+                                             log=mcu.log)
+        pump_tune_steps = pump_tune.run()
+
+    def step_pump_tune():
+        nonlocal pump_tuning
+        nonlocal pump_tune_request
+        nonlocal pump_tune
+        nonlocal pump_tune_steps
+        try:
+            next(pump_tune_steps)
+            return
+        except StopIteration as e:
+            tuned = e.value
+        except Exception as e:
+            # e.g. an I2C error, give up on this request and leave the pumps as they were
+            mcu.handle_exception(e)
+            mcu.log.warning(f'pump tune failed {e}, speeds unchanged')
+            try:
+                pump_tune.stop()
+            except Exception as e:
+                mcu.handle_exception(e)
+            pump_tune = None
+            pump_tune_steps = None
+            pump_tune_request = None
+            return
+
+        # Recorded even if it failed, so it isn't retried at every boot. Kept in RAM as well,
+        # so if it can't be saved it still isn't repeated until the next boot
+        pump_tuning = dict(pump_tuning)
+        pump_tuning['request'] = env['pump-tune']
+        if tuned:
+            for i, speed in enumerate(pump_tune.speeds):
+                env[f'pump{i+1}-speed'] = speed
+            pump_tuning['speeds'] = pump_tune.speeds
+            pump_tuning['rise'] = round(pump_tune.target_rise, 1)
+            mcu.log.info(f'pump tune complete, speeds {pump_tune.speeds}')
+        else:
+            mcu.log.warning('pump tune could not match every pump, speeds unchanged')
+        if not drivers.get('pump_tuning').save(pump_tuning):
+            mcu.log.warning('could not save pump tuning to CIRCUITPY or SD, it will run again at the next boot')
+        report = pump_tune.report()
+        ncm.add_to_timestamped_note(report)
+        send_policy.note_added(report)
+        pump_tune = None
+        pump_tune_steps = None
+        pump_tune_request = None
+
     def usb_serial_parser(string):
+        nonlocal pump_tune_request
         if string == 'phcal':
             interactive_ph_calibration()
 
+        elif string == 'pumptune':
+            pump_tune_request = 'serial'
+
+        elif string == 'stats':
+            # Loop pass and stage latency histograms since the last sync
+            for line in loop_stats.lines():
+                mcu.log.info(line)
+
+        elif string.startswith('heap'):
+            # "heap" shows heap use per loop stage, "heap on" / "heap off" switch monitoring
+            if string == 'heap on':
+                set_heap_monitor('heap-monitor', True)
+            elif string == 'heap off':
+                set_heap_monitor('heap-monitor', False)
+            if heap.enabled:
+                mcu.log.info(f'heap {heap.report(reset=False)}')
+            else:
+                mcu.log.info('heap monitor off, enable with "heap on"')
+
         elif string.startswith('p'):
             settings = string[1:].split()
             try:
@@ -587,41 +951,88 @@ def main():
                 # gc.write_command(string)
 
 
+    boot_profiler.complete()
     mcu.log.warning(f'BOOT complete at {mcu.get_timestamp()} UTC, {mcu.get_timestamp(env["utc-offset-hours"])} local')
+    mcu.log.removeHandler(mcu.loghandler)
+    mcu.log.addHandler(log_ring)
+    boot_reported = False
     if mcu.display:
         mcu.display.clear()
 
+    def flush_log():
+        dropped = log_ring.flush()
+        if dropped:
+            mcu.log.warning(f'{dropped} log records dropped, ring was full')
+
     timer_A=0
     timer_B=0
     timer_C=0
-    timer_D=-15*MINUTES
     while True:
+        loop_stats.start()
         mcu.service(serial_parser=usb_serial_parser)
+        if boot.pending():
+            boot.service()
+        loop_stats.stage('service')
+        tc_poller.poll()
         capture_data(interval=1)
+        if pump_tune:
+            step_pump_tune()
+        elif pump_tune_request is not None:
+            start_pump_tune()
+        loop_stats.stage('capture')
 
         # Check for incoming serial messages from Gascard
         if gc:
             data_string = gc.parse_serial()
             # if gc.mode != 'Normal Channel':
             #     print(data_string)
+        loop_stats.stage('gascard')
 
         if time.monotonic() - timer_A > 1:
             timer_A = time.monotonic()
             jacket_control()
             mcu.led.value = not mcu.led.value #heartbeat LED
+        loop_stats.stage('jacket')
 
         if time.monotonic() - timer_B > (env['ph-temp-interval'] * MINUTES):
             timer_B = time.monotonic()
-            ncm.add_to_timestamped_note(mcu.data)
+            if jacket_relays:
+                mcu.data.update(relay_stats.report())
+            # Boot timings go in the first note after every boot step has finished
+            boot_fields = {}
+            if not boot_reported and not boot.pending():
+                boot_fields = boot_profiler.report()
+                mcu.log.info(f'boot profile {boot_fields}')
+                mcu.data.update(boot_fields)
+                boot_reported = True
+            note = dict(mcu.data)
+            readings = note
+            if journal and not ncm.connected:
+                # Readings wait on the SD card, to be backfilled once connected again
+                journal.note_skipped()
+            else:
+                note.update(telemetry.record())
+                # Novelty is judged in engineering units, not on the packed list
+                readings = dict(mcu.data)
+                readings.update(telemetry.readings())
+                if journal:
+                    journal.note_sent()
+            if note:
+                ncm.add_to_timestamped_note(note)
+                send_policy.note_added(readings)
             mcu.data.pop("gc1", None)
             mcu.data.pop("gc2", None)
             mcu.data.pop("gc3", None)
+            for key in boot_fields:
+                mcu.data.pop(key)
+        loop_stats.stage('note')
 
         if time.monotonic() - timer_C > 5:
             timer_C = time.monotonic()
 
-            timestamp = mcu.get_timestamp(env['utc-offset-hours'])
-            mcu.log.debug(f"servicing notecard now {timestamp}")
+            if enabled(mcu.log, logging.DEBUG):
+                mcu.log.debug("servicing notecard now %s", mcu.get_timestamp(env['utc-offset-hours']))
+            flush_log()
 
             # Checks if connected, storage availablity, etc.
             ncm.check_status(nosync_timeout=600)
@@ -637,12 +1048,33 @@ def main():
             if ncm.receive_environment(env):
                 parse_environment()
 
-        if time.monotonic() - timer_D > (env['note-send-interval'] * MINUTES):
-            timer_D = time.monotonic()
-
-            # Send note infrequently (e.g. 15 mins) to minimise consumption credit usage
+            # Catch up on frames journalled while offline, a few batches at a time
+            if journal and ncm.connected and journal.backfilling():
+                batches = journal.backfill(env['journal-backfill-minutes'] * MINUTES,
+                                           env['journal-backfill-batches'])
+                for summary in batches:
+                    note = telemetry.encode(summary)
+                    note['backfill'] = summary['backfill']
+                    ncm.add_to_timestamped_note(note)
+                    send_policy.note_added(summary)
+
+        # Sync when there is something worth sending, to minimise consumption credit and modem time
+        connected = ncm.connected
+        if send_policy.due(connected):
+            # Loop timings (and heap use if monitored) since the last sync
+            stats = loop_stats.report()
+            if heap.enabled:
+                stats.update(heap.report())
+            ncm.add_to_timestamped_note(stats)
             ncm.send_timestamped_note(sync=True)
+            flush_log()
             ncm.send_timestamped_log(sync=True)
+            # Offline, the notes stay queued on the notecard and the next attempt backs off
+            if connected:
+                send_policy.sent()
+            else:
+                send_policy.failed()
+        loop_stats.stage('notecard')
 
 
 if __name__ == "__main__":
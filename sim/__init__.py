@@ -0,0 +1,118 @@
+# Hardware-in-the-loop simulator, so septic_tank.py and feed_control.py can run on a Linux host.
+#
+# install() puts stand-in modules for board, busio, digitalio, the Adafruit drivers and
+# circuitpy_mcu into sys.modules, and swaps the time functions for a virtual clock.
+# uninstall() puts the host back as it was, so several runs can share one process.
+# See sim/run.py for running a controller and reporting benchmark figures.
+#
+# Host only, never copied to a device.
+
+import gc
+import logging
+import os
+import sys
+import time
+import types
+
+from sim import hardware
+from sim import mcu as sim_mcu
+from sim.clock import VirtualClock, SimulationComplete
+from sim.world import World
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Host state from before the first install(), restored by uninstall()
+_saved = None
+
+TIME_FUNCTIONS = ('monotonic', 'monotonic_ns', 'time', 'sleep', 'localtime')
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    for key, val in attrs.items():
+        setattr(module, key, val)
+    sys.modules[name] = module
+    return module
+
+def _save():
+    global _saved
+    if _saved is not None:
+        return
+    _saved = {
+        'modules'   : dict(sys.modules),
+        'time'      : {name: getattr(time, name) for name in TIME_FUNCTIONS},
+        'mem_free'  : getattr(gc, 'mem_free', None),
+        'handlers'  : list(logging.getLogger().handlers),
+        }
+
+def uninstall():
+    # Drops the stand-in modules and every controller module imported against them,
+    # and gives the time functions back to the host
+    global _saved
+    if _saved is None:
+        return
+    for name in list(sys.modules):
+        if name not in _saved['modules']:
+            del sys.modules[name]
+    sys.modules.update(_saved['modules'])
+    for name, function in _saved['time'].items():
+        setattr(time, name, function)
+    if _saved['mem_free'] is None:
+        if hasattr(gc, 'mem_free'):
+            del gc.mem_free
+    else:
+        gc.mem_free = _saved['mem_free']
+    logging.getLogger().handlers[:] = _saved['handlers']
+    hardware.world = None
+    _saved = None
+
+def install(controller='septic_tank', days=1.0, seed=1):
+    # Returns the World, whose clock and devices can be inspected or scripted
+    _save()
+    clock = VirtualClock(end=days * 86400)
+    clock.install()
+    world = World(clock, controller=controller, seed=seed)
+    hardware.world = world
+
+    # CircuitPython's heap query, approximated from the host allocator
+    if not hasattr(gc, 'mem_free'):
+        gc.mem_free = hardware.mem_free
+
+    # Keep logging quiet unless a handler is asked to print
+    logging.getLogger().addHandler(logging.NullHandler())
+
+    board = _module('board')
+    for pin in hardware.BOARD_PINS:
+        setattr(board, pin, pin)
+    board.SPI = hardware.SPI
+
+    # The SD card is a directory under the run's fs root, see sim/run.py
+    _module('storage', VfsFat=hardware.VfsFat, mount=hardware.mount)
+    _module('adafruit_sdcard', SDCard=hardware.SDCard)
+
+    _module('microcontroller', cpu=types.SimpleNamespace(uid=hardware.CPU_UID))
+    _module('busio', I2C=hardware.I2C, UART=hardware.UART)
+    _module('digitalio', DigitalInOut=hardware.DigitalInOut,
+            Direction=hardware.Direction, Pull=hardware.Pull)
+
+    # adafruit_logging has the same interface as the standard library for the parts used here
+    sys.modules['adafruit_logging'] = logging
+
+    _module('adafruit_mcp9600', MCP9600=hardware.MCP9600)
+    ads1115 = _module('adafruit_ads1x15.ads1115', ADS1115=hardware.ADS1115, P0=0, P1=1, P2=2, P3=3)
+    analog_in = _module('adafruit_ads1x15.analog_in', AnalogIn=hardware.AnalogIn)
+    _module('adafruit_ads1x15', ads1115=ads1115, analog_in=analog_in)
+    _module('adafruit_motorkit', MotorKit=hardware.MotorKit)
+    motor = _module('adafruit_motor.motor', DCMotor=hardware.DCMotor)
+    _module('adafruit_motor', motor=motor)
+
+    mcu = _module('circuitpy_mcu.mcu', Mcu=sim_mcu.Mcu)
+    ncm = _module('circuitpy_mcu.notecard_manager', Notecard_manager=sim_mcu.Notecard_manager)
+    ota = _module('circuitpy_mcu.ota_bootloader', reset=sim_mcu.reset,
+                  enable_watchdog=sim_mcu.enable_watchdog)
+    _module('circuitpy_mcu', mcu=mcu, notecard_manager=ncm, ota_bootloader=ota)
+
+    # The repo is installed on devices as /circuitpy_septic_tank/
+    package = _module('circuitpy_septic_tank')
+    package.__path__ = [REPO_ROOT]
+
+    return world
@@ -0,0 +1,194 @@
+# Microbenchmarks for the controller hot paths, on CPython against the simulated hardware.
+#
+#   python -m sim.benchmarks                compare against sim/benchmarks_baseline.json
+#   python -m sim.benchmarks --save         record a new baseline
+#
+# The controller closures (jacket_control, display_summary...) are taken from a septic_tank run
+# that is stopped once it has booted and settled, so they are timed with real state behind them.
+# Each benchmark is run for ROUNDS rounds and the fastest round is kept, as the one least
+# disturbed by the host. Timings are host wall clock, so a fixed pure Python workload
+# (host-reference) is timed with them, and each is compared with its baseline as a multiple of
+# that. This takes out most of the difference between hosts, though not all: for a close
+# comparison, record a baseline on the same machine before a change.
+# Exits non-zero if any benchmark is slower than its baseline by more than --threshold.
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import sim
+from sim import hardware
+from sim.clock import SimulationComplete
+from sim.run import run, perf_counter
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks_baseline.json')
+ROUNDS = 5
+REFERENCE = 'host-reference'
+SETTLE_SECONDS = 600 # virtual seconds run before the controller's state is captured
+
+# Gascard output in normal mode, plus one it can't parse the concentration from
+FRAMES = [
+    b'N 0.0412 0.0000 0.0000 0.00 0.0000 31003 1013.2 0\r\n',
+    b'N 0.0415 0.0000 0.0000 0.00 0.0000 31003 1013.4 0\r\n',
+    b'N 0.0409 0.0000 0.0000 0.00 0.0000 31003 1012.9 0\r\n',
+    b'N ----- 0.0000 0.0000 0.00 0.0000 31003 1013.1 0\r\n',
+]
+
+
+class FrameUART():
+    # Always has the next frame ready, so parse_serial is timed without waiting on the stream
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+        self.in_waiting = 0
+
+    def readline(self):
+        frame = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return frame
+
+
+def controller_state(controller):
+    # Runs the controller until it has settled, then returns the locals of its main()
+    state = {}
+    service = sim.sim_mcu.Mcu.service
+
+    def capture(self, serial_parser=None):
+        service(self, serial_parser=serial_parser)
+        if hardware.world.clock.now >= SETTLE_SECONDS:
+            state.update(sys._getframe(1).f_locals)
+            raise SimulationComplete()
+
+    sim.sim_mcu.Mcu.service = capture
+    try:
+        run(controller, days=30)
+    finally:
+        sim.sim_mcu.Mcu.service = service
+    return state
+
+def time_calls(function, calls):
+    # Best of ROUNDS, in microseconds per call
+    best = None
+    for r in range(ROUNDS):
+        start = perf_counter()
+        for i in range(calls):
+            function()
+        elapsed = (perf_counter() - start) / calls * 1e6
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def reference_workload():
+    # Dict, string and float work typical of the controllers, independent of the repo's code
+    totals = {}
+    for i in range(200):
+        key = f'k{i % 10}'
+        totals[key] = totals.get(key, 0.0) + i * 0.5
+    return totals
+
+def septic_tank_benchmarks():
+    state = controller_state('septic_tank')
+    env = state['env']
+    filter_data = state['filter_data']
+    display_summary = state['display_summary']
+    parse_environment = state['parse_environment']
+    results = {}
+
+    from gascard import Gascard
+    gc = Gascard(FrameUART(FRAMES))
+    gc.log.handlers = [logging.NullHandler()]
+    gc.log.setLevel(logging.INFO) # as septic_tank sets it
+    results['gascard-parse_serial'] = time_calls(gc.parse_serial, 2000)
+
+    results['filter_data'] = time_calls(lambda: filter_data('ts'), 2000)
+    # Both display pages, as they alternate
+    clock = hardware.world.clock
+    def display():
+        clock.advance(env['dispay-page-time'] / 2)
+        display_summary()
+    results['display_summary'] = time_calls(display, 2000)
+
+    results['jacket_control'] = time_calls(state['jacket_control'], 2000)
+
+    # One changed key per call, as when notehub pushes an update
+    hysteresis = [0.5, 0.6]
+    def env_change():
+        hysteresis.reverse()
+        env['jacket-hysteresis'] = hysteresis[0]
+        parse_environment()
+    results['parse_environment'] = time_calls(env_change, 2000)
+    return results
+
+def feed_control_benchmarks():
+    controller_state('feed_control')
+    valves = sys.modules['circuitpy_septic_tank.feed_control'].valves
+    clock = hardware.world.clock
+    results = {}
+
+    # A loop pass's worth of virtual time per call, so pulses and travel timing move on
+    def update():
+        clock.advance(0.25)
+        for v in valves:
+            v.update()
+    results[f'valve-update-x{len(valves)}'] = time_calls(update, 2000)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the controller hot paths against the simulated hardware')
+    parser.add_argument('--save', action='store_true', help='record these timings as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fractional slow down over baseline that counts as a regression')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    # Records reaching the host's own root handlers (e.g. pytest's log capture) aren't timed
+    root = logging.getLogger()
+    root_handlers = root.handlers
+    root.handlers = [logging.NullHandler()]
+    try:
+        results = {REFERENCE: time_calls(reference_workload, 2000)}
+        results.update(septic_tank_benchmarks())
+        results.update(feed_control_benchmarks())
+    finally:
+        root.handlers = root_handlers
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # Baseline timings scaled to this host
+    scale = 1.0
+    if REFERENCE in baseline:
+        scale = results[REFERENCE] / baseline[REFERENCE]
+        print(f'host speed {1 / scale:.2f}x the baseline host')
+
+    regressions = []
+    print(f'{"benchmark":30}{"us/call":>10}{"baseline":>10}{"change":>9}')
+    for name, us in results.items():
+        if name == REFERENCE:
+            continue
+        if name in baseline:
+            change = us / (baseline[name] * scale) - 1
+            status = ''
+            if change > args.threshold:
+                status = '  REGRESSION'
+                regressions.append(name)
+            print(f'{name:30}{us:10.1f}{baseline[name] * scale:10.1f}{change:+9.0%}{status}')
+        else:
+            print(f'{name:30}{us:10.1f}{"-":>10}{"-":>9}')
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({name: round(us, 2) for name, us in results.items()}, f, indent=2)
+            f.write('\n')
+        print(f'baseline saved to {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} benchmarks slower than baseline by more than {args.threshold:.0%}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import time
+
+# 2023-06-01 00:00:00 UTC, so alarms and timestamps are repeatable
+DEFAULT_EPOCH = 1685577600
+
+class SimulationComplete(BaseException):
+    # BaseException, so the controllers' own "except Exception" handlers don't swallow it
+    pass
+
+class VirtualClock():
+    # Stands in for time.monotonic(), time.time() and time.sleep().
+    # Time only moves when something advances it, e.g. Mcu.service() or a blocking UART read.
+
+    def __init__(self, epoch=DEFAULT_EPOCH, end=None):
+        self.epoch = epoch
+        self.now = 0.0
+        self.end = end
+        self.listeners = []
+
+    def advance(self, dt):
+        if dt <= 0:
+            return
+        self.now += dt
+        for listener in self.listeners:
+            listener(dt)
+
+    def advance_to(self, t):
+        self.advance(t - self.now)
+
+    def check_end(self):
+        if self.end is not None and self.now >= self.end:
+            raise SimulationComplete()
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1000000000)
+
+    def time(self):
+        return int(self.epoch + self.now)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def localtime(self, secs=None):
+        # Devices run on UTC, so localtime is gmtime regardless of the host timezone
+        if secs is None:
+            secs = self.time()
+        return time.gmtime(secs)
+
+    def install(self):
+        time.monotonic = self.monotonic
+        time.monotonic_ns = self.monotonic_ns
+        time.time = self.time
+        time.sleep = self.sleep
+        time.localtime = self.localtime
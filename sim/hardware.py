@@ -0,0 +1,252 @@
+# Stand-ins for the CircuitPython core modules and Adafruit drivers used by the controllers.
+# Only the parts of each API that this repo touches are implemented.
+# I2C traffic is counted per bus, approximating one transaction per register access.
+# Each transaction also takes virtual time, so boot probing and polling costs show up in the clock.
+
+import sys
+
+BOARD_PINS = [
+    'A0', 'A1', 'A2', 'A3', 'A4', 'A5', 'D5', 'D6', 'D9', 'D10', 'D11', 'D12', 'D13',
+    'MISO', 'MOSI', 'SCK', 'TX', 'RX', 'SCL', 'SDA', 'NEOPIXEL', 'LED',
+    ]
+
+CPU_UID = bytes.fromhex('7cdfa1e05a3c')
+
+world = None # set by sim.install()
+
+# ESP32-S2 with 2MB PSRAM
+HEAP_SIZE = 2 * 1024 * 1024
+
+def mem_free():
+    # Allocated host blocks stand in for heap use, only the trend between calls means anything
+    return max(HEAP_SIZE - sys.getallocatedblocks() * 16, 0)
+
+class I2C():
+
+    # A few bytes at 100kHz plus driver overhead
+    TRANSACTION_TIME = 0.0003
+
+    def __init__(self, addresses, name='i2c'):
+        self.addresses = list(addresses)
+        self.name = name
+        self.transactions = 0
+
+    def count(self, n=1):
+        self.transactions += n
+        world.clock.advance(n * self.TRANSACTION_TIME)
+
+    def probe(self, address):
+        self.count()
+        if address not in self.addresses:
+            raise ValueError(f'No I2C device at address: 0x{address:x}')
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def scan(self):
+        # Real scans address every 7 bit address in turn
+        self.count(0x78 - 0x08)
+        return sorted(self.addresses)
+
+
+class UART():
+    # Scripted Gascard serial stream, one frame per second.
+    # readline() blocks (advances virtual time) until a frame is available, like the real UART.
+
+    PERIOD = 1.0
+
+    def __init__(self, tx=None, rx=None, baudrate=9600, timeout=1):
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.next_frame = world.clock.now + self.PERIOD
+        self.partial = False
+        self.frames_sent = 0
+
+    def frame(self):
+        self.frames_sent += 1
+        if world.clock.now < world.gascard_ready_after:
+            return 'X 1.17 22727 4106 8 0 0'
+        conc = world.gas_line() + world.random.gauss(0, 0.0005)
+        return f'N {conc:.4f} 0.0000 0.0000 0.00 0.0000 31003 {world.pressure:.1f} 0'
+
+    def _frames_waiting(self):
+        if world.clock.now < self.next_frame:
+            return 0
+        return int((world.clock.now - self.next_frame) / self.PERIOD) + 1
+
+    @property
+    def in_waiting(self):
+        return self._frames_waiting() * 60
+
+    def read(self, nbytes):
+        waiting = self._frames_waiting()
+        self.next_frame += waiting * self.PERIOD
+        self.partial = True
+        return bytes(min(nbytes, waiting * 60))
+
+    def readline(self):
+        if self.partial:
+            # Tail end of the line that was being received when the buffer was emptied
+            self.partial = False
+            return b'0\r\n'
+
+        if self._frames_waiting() == 0:
+            wait = self.next_frame - world.clock.now
+            if wait > self.timeout:
+                world.clock.advance(self.timeout)
+                return None
+            world.clock.advance(wait)
+
+        self.next_frame += self.PERIOD
+        return (self.frame() + '\r\n').encode()
+
+    def write(self, data):
+        return len(data)
+
+
+class SPI():
+    pass
+
+class SDCard():
+
+    def __init__(self, spi, cs):
+        self.spi = spi
+        self.cs = cs
+
+class VfsFat():
+
+    def __init__(self, block_device):
+        self.block_device = block_device
+
+def mount(vfs, path, readonly=False):
+    pass
+
+
+class Direction():
+    INPUT = 'input'
+    OUTPUT = 'output'
+
+class Pull():
+    UP = 'up'
+    DOWN = 'down'
+
+class DigitalInOut():
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+        self._value = False
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value=False):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    @property
+    def value(self):
+        if self.direction == Direction.OUTPUT:
+            return self._value
+        source = world.inputs.get(self.pin)
+        if source:
+            return source()
+        return self.pull == Pull.UP
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        world.outputs[self.pin] = value
+
+
+class MCP9600():
+    # A new conversion is ready CONVERSION_TIME after the update flag was last cleared
+
+    CONVERSION_TIME = 0.32
+
+    def __init__(self, i2c, address=0x67, tctype='K', tcfilter=0):
+        i2c.probe(address)
+        self.i2c = i2c
+        self.address = address
+        self.timer_cleared = world.clock.now
+
+    @property
+    def temperature_update(self):
+        self.i2c.count()
+        return world.clock.now - self.timer_cleared >= self.CONVERSION_TIME
+
+    @temperature_update.setter
+    def temperature_update(self, value):
+        self.i2c.count()
+        if not value:
+            self.timer_cleared = world.clock.now
+
+    @property
+    def temperature(self):
+        self.i2c.count()
+        return world.thermocouple(self.address)
+
+    @property
+    def ambient_temperature(self):
+        self.i2c.count()
+        return world.ambient
+
+
+class ADS1115():
+
+    def __init__(self, i2c, gain=1, data_rate=None, mode=None, address=0x48):
+        i2c.probe(address)
+        self.i2c = i2c
+        self.address = address
+
+class AnalogIn():
+
+    def __init__(self, ads, positive_pin, negative_pin=None):
+        self.ads = ads
+        self.channel = positive_pin
+
+    @property
+    def voltage(self):
+        # Config write, conversion poll and result read
+        self.ads.i2c.count(3)
+        return world.ph_voltage(self.channel)
+
+    @property
+    def value(self):
+        return int(self.voltage / 4.096 * 32767)
+
+
+class DCMotor():
+
+    def __init__(self, i2c, address, channel):
+        self.i2c = i2c
+        self.address = address
+        self.channel = channel
+        self._throttle = None
+
+    @property
+    def throttle(self):
+        return self._throttle
+
+    @throttle.setter
+    def throttle(self, value):
+        # Two PWM channels are written per motor
+        self.i2c.count(2)
+        self._throttle = value
+        world.set_motor(self.address, self.channel, value)
+
+class MotorKit():
+
+    def __init__(self, address=0x60, i2c=None, steppers_microsteps=16, pwm_frequency=1600):
+        i2c.probe(address)
+        self.address = address
+        self.pwm_frequency = pwm_frequency
+        self.motor1 = DCMotor(i2c, address, 1)
+        self.motor2 = DCMotor(i2c, address, 2)
+        self.motor3 = DCMotor(i2c, address, 3)
+        self.motor4 = DCMotor(i2c, address, 4)
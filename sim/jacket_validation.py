@@ -0,0 +1,88 @@
+# Compares the jacket controllers against the simulated tanks.
+#
+#   python -m sim.jacket_validation --days 4
+#
+# Each controller heats the three simulated tanks from their starting temperatures to target.
+# Reports switch count and heater on-time over the whole run, then overshoot above the
+# hysteresis band and mean tracking error over the second half, once settled.
+# Exits non-zero if the predictive controller switches more or overshoots more than hysteresis.
+
+import argparse
+import sys
+
+import sim
+from sim.world import JACKET_PINS
+
+TARGET = 30
+HYSTERESIS = 0.5
+
+def simulate(kind, days, seed=1):
+    world = sim.install(days=days, seed=seed)
+    clock = world.clock
+    # Through the package, as the controllers import it on a device
+    from circuitpy_septic_tank.jacket_controller import make_controller
+
+    controllers = [make_controller(kind, TARGET, HYSTERESIS, name=f'jacket{i+1}')
+                   for i in range(len(world.tanks))]
+    results = []
+    for i in range(len(world.tanks)):
+        results.append({'switches': 0, 'on-seconds': 0, 'overshoot': 0.0,
+                        'error-sum': 0.0, 'error-count': 0})
+
+    settle_after = days * 86400 / 2
+    while clock.now < clock.end:
+        for i, controller in enumerate(controllers):
+            ts = world.thermocouple(0x60 + 2*i)
+            tl = world.thermocouple(0x61 + 2*i)
+            on = world.outputs.get(JACKET_PINS[i], False)
+            state = controller.update(ts, on, liquid_temp=tl)
+
+            r = results[i]
+            if state != on:
+                r['switches'] += 1
+            if state:
+                r['on-seconds'] += 1
+            world.outputs[JACKET_PINS[i]] = state
+
+            liquid = world.tanks[i].liquid
+            if clock.now > settle_after:
+                r['overshoot'] = max(r['overshoot'], liquid - (TARGET + HYSTERESIS))
+                r['error-sum'] += abs(liquid - TARGET)
+                r['error-count'] += 1
+
+        clock.advance(1)
+
+    for r in results:
+        r['mean-error'] = r['error-sum'] / max(r['error-count'], 1)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate jacket controllers against the simulated tanks')
+    parser.add_argument('--days', type=float, default=4.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    summary = {}
+    for kind in ('hysteresis', 'mpc'):
+        results = simulate(kind, args.days, args.seed)
+        summary[kind] = results
+        print(kind)
+        for i, r in enumerate(results):
+            print(f'  tank{i+1}: switches={r["switches"]:5d} on={r["on-seconds"]/3600:6.1f}h '
+                  f'overshoot={r["overshoot"]:.2f}C mean-error={r["mean-error"]:.2f}C')
+
+    failed = False
+    for i in range(len(summary['mpc'])):
+        h = summary['hysteresis'][i]
+        m = summary['mpc'][i]
+        if m['switches'] > h['switches'] or m['overshoot'] > h['overshoot'] + 0.05:
+            print(f'tank{i+1}: predictive controller is worse than hysteresis')
+            failed = True
+        if m['mean-error'] > HYSTERESIS:
+            print(f'tank{i+1}: predictive controller did not hold target')
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+# Stand-ins for the circuitpy_mcu helpers: Mcu, Notecard_manager and ota_bootloader.
+# Notes are kept in memory and sized as the JSON the real Notecard would store.
+
+import json
+import logging
+import time
+
+from sim import hardware
+
+class SimLogHandler(logging.Handler):
+
+    def __init__(self, verbose=False):
+        super().__init__()
+        self.verbose = verbose
+        self.records = 0
+        self.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+
+    def emit(self, record):
+        self.records += 1
+        if self.verbose:
+            print(f'[{hardware.world.clock.now:10.1f}] {record.levelname:8} {record.name}: {record.getMessage()}')
+
+
+class Display():
+
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.lines = [''] * 4
+        self.cursor = (0, 0)
+        self.labels = [''] * 4
+        self.values = [''] * 4
+
+    def clear(self):
+        self.i2c.count()
+        self.lines = [''] * 4
+        self.cursor = (0, 0)
+
+    def set_cursor(self, col, row):
+        self.i2c.count()
+        self.cursor = (col, row)
+
+    def write(self, text):
+        self.i2c.count()
+        col, row = self.cursor
+        line = self.lines[row].ljust(col)
+        self.lines[row] = (line[:col] + str(text))[:20]
+
+    def set_fast_backlight_rgb(self, r, g, b):
+        self.i2c.count()
+
+    def show_data_long(self):
+        self.i2c.count()
+
+
+class Pixel(list):
+    RED = (255, 0, 0)
+    MAGENTA = (255, 0, 255)
+    GREEN = (0, 255, 0)
+    BLUE = (0, 0, 255)
+
+
+class Led():
+    value = False
+
+
+class Mcu():
+    # One call to service() is one pass of the controller's main loop.
+    # Each pass advances virtual time by 'tick' seconds, then delivers any scripted serial input.
+
+    tick = 0.25
+    verbose = False
+    instances = []
+
+    def __init__(self, loglevel=logging.INFO, i2c_freq=100000, **kwargs):
+        Mcu.instances.append(self)
+        self.loghandler = SimLogHandler(verbose=self.verbose)
+        self.log = logging.getLogger('mcu')
+        self.log.setLevel(loglevel)
+        self.log.handlers = [self.loghandler]
+
+        self.i2c = hardware.I2C(hardware.world.buses[0], name='i2c')
+        self.i2c2 = None
+        self.buses = [self.i2c]
+        self.display = None
+        self.data = {}
+        self.led = Led()
+        self.pixel = Pixel([(0, 0, 0)])
+        self.iterations = 0
+        self.serial_input = []
+
+    def enable_i2c2(self):
+        self.i2c2 = hardware.I2C(hardware.world.buses[1], name='i2c2')
+        self.buses.append(self.i2c2)
+
+    def i2c_identify(self, i2c_dict=None, i2c=None):
+        if i2c is None:
+            i2c = self.i2c
+        for address in i2c.scan():
+            # Each device found is read back to identify it
+            i2c.count(4)
+            name = (i2c_dict or {}).get(f'0x{address:02X}', 'unknown')
+            self.log.info(f'Found {name} at {address:#x}')
+
+    def attach_display_sparkfun_20x4(self):
+        self.display = Display(self.i2c)
+
+    @property
+    def i2c_transactions(self):
+        return sum(bus.transactions for bus in self.buses)
+
+    def service(self, serial_parser=None):
+        self.iterations += 1
+        clock = hardware.world.clock
+        clock.advance(self.tick)
+        clock.check_end()
+
+        for t, kind, payload in hardware.world.due_events(('serial', 'link')):
+            if kind == 'serial':
+                if serial_parser:
+                    serial_parser(payload)
+                else:
+                    self.serial_input.append(payload)
+            elif kind == 'link':
+                hardware.world.connected = payload
+
+    def get_serial_line(self, valid_inputs=None):
+        if not self.serial_input:
+            raise KeyboardInterrupt
+        return self.serial_input.pop(0)
+
+    def get_next_alarm(self, alarm_list, utc_offset=0):
+        # Seconds until the next "HH:MM" local time in alarm_list
+        now = time.time() + utc_offset * 3600
+        seconds_today = now % 86400
+        countdowns = []
+        for alarm in alarm_list:
+            hours, minutes = alarm.split(':')
+            alarm_seconds = int(hours) * 3600 + int(minutes) * 60
+            countdown = alarm_seconds - seconds_today
+            if countdown <= 0:
+                countdown += 86400
+            countdowns.append(countdown)
+        return min(countdowns)
+
+    def get_timestamp(self, utc_offset=0):
+        t = time.localtime(time.time() + utc_offset * 3600)
+        return f'{t.tm_year}-{t.tm_mon:02d}-{t.tm_mday:02d}T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}'
+
+    def watchdog_feed(self):
+        pass
+
+    def handle_exception(self, e):
+        self.log.error(f'{type(e).__name__}: {e}')
+
+    def display_text(self, text):
+        if self.display:
+            self.display.clear()
+            self.display.write(text)
+
+    def ota_reboot(self):
+        self.log.warning('OTA reboot requested, ignored in simulation')
+
+
+class Notecard_manager():
+    # Notes added with add_to_timestamped_note() are queued in "storage" until sent with a sync
+
+    instances = []
+
+    def __init__(self, loghandler=None, i2c=None, watchdog=None, loglevel=logging.INFO):
+        self.i2c = i2c
+        self.log = logging.getLogger('ncm')
+        self.log.setLevel(loglevel)
+        if loghandler:
+            self.log.handlers = [loghandler]
+        self.connected = hardware.world.connected
+        self.env = {}
+        self.queued = []
+        self.notes_added = 0
+        self.notes_sent = 0
+        self.bytes_stored = 0
+        self.syncs = 0
+        self.logs_sent = 0
+        Notecard_manager.instances.append(self)
+
+    def request(self, n=1):
+        if self.i2c:
+            self.i2c.count(n)
+
+    def set_default_envs(self, env):
+        # Env events scheduled for time 0 are values already set on notehub, applied at boot
+        self.request()
+        self.env = dict(env)
+        for t, kind, payload in hardware.world.due_events(('env',)):
+            env.update(payload)
+
+    def receive_environment(self, env):
+        self.request()
+        changes = {}
+        for t, kind, payload in hardware.world.due_events(('env',)):
+            changes.update(payload)
+        if not changes:
+            return False
+        env.update(changes)
+        return True
+
+    def check_status(self, nosync_timeout=None):
+        self.request()
+        self.connected = hardware.world.connected
+
+    def add_to_timestamped_note(self, data):
+        self.request(2)
+        note = dict(data)
+        note['timestamp'] = time.time()
+        self.queued.append(note)
+        self.notes_added += 1
+        self.bytes_stored += len(json.dumps(note))
+
+    def send_timestamped_note(self, sync=False):
+        self.request(2)
+        if sync and self.connected:
+            self.syncs += 1
+            self.notes_sent += len(self.queued)
+            self.queued = []
+
+    def send_timestamped_log(self, sync=False):
+        self.request()
+        self.logs_sent += 1
+
+
+def reset(e=None):
+    raise e
+
+def enable_watchdog(timeout=60):
+    pass
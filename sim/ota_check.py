@@ -0,0 +1,300 @@
+# Checks delta OTA (ota_manifest.py) against a local HTTP server standing in for GitHub.
+#
+#   python -m sim.ota_check
+#
+# Serves a copy of the repo's .py files, builds a manifest for them, then updates a simulated
+# CIRCUITPY drive through a series of boots, counting the bytes the server sends each time:
+#   fresh       empty drive, every file downloaded
+#   unchanged   nothing downloaded but the manifest
+#   one-change  one file edited upstream, only that file downloaded
+#   corrupt     upstream differs from the manifest, download rejected and local file kept
+#   fixed       upstream matches again, the rejected file is downloaded
+#   resume      a verified .tmp left by an interrupted swap is used without downloading
+#   unpinned    a file listed without a hash (--offline) is downloaded at every boot
+#   truncated   an unpinned download shorter than its Content-Length is rejected
+#   missing     no manifest upstream, update raises so code.py falls back to the whole file update
+# Also compiles the real ota_list.py (hashing placeholder content) and checks every device's
+# entry comes back out of the compact manifest unchanged, and that every device running this
+# repo's code lists every module code.py and its controller import, plus their data files.
+# Fails too if the committed ota_manifest.jsonl doesn't match ota_list.py and the files in the
+# checkout, i.e. it wasn't recompiled after a change, or leaves out any file ota_list.py lists.
+# Exits non-zero if any boot downloads more or less than it should.
+
+import http.server
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+import sim
+from ota_manifest import Updater, build, compile_manifest, local_fetch, lookup, REPO_URL, TMP_SUFFIX
+
+DEVICE = 'sim0'
+CONTROLLERS = ('septic_tank', 'feed_control')
+
+# Files read at runtime by a module, as device paths
+DATA_FILES = {
+    'ph_calibration_bank' : ['/calibration/ph_calibration.bin'],
+}
+
+
+class CountingHandler(http.server.SimpleHTTPRequestHandler):
+    bytes_sent = 0
+    truncate = None # file name to send only the first half of
+
+    def copyfile(self, source, outputfile):
+        data = source.read()
+        if CountingHandler.truncate and self.path.endswith('/' + CountingHandler.truncate):
+            data = data[:len(data) // 2]
+        CountingHandler.bytes_sent += len(data)
+        outputfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Response():
+    # The parts of an adafruit_requests response that Updater uses
+
+    def __init__(self, url):
+        try:
+            self.raw = urllib.request.urlopen(url)
+            self.status_code = self.raw.status
+        except urllib.error.HTTPError as e:
+            self.raw = e
+            self.status_code = e.code
+        self.headers = dict(self.raw.headers.items())
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read()
+        return self._content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        while True:
+            chunk = self.raw.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self.raw.close()
+
+
+class Session():
+
+    def get(self, url, stream=False):
+        return Response(url)
+
+
+def boot(name, base_url, drive, expect_files, expect_bytes):
+    CountingHandler.bytes_sent = 0
+    updater = Updater(Session(), f'{base_url}/ota_manifest.jsonl', DEVICE, log=lambda msg: None)
+    updated = updater.update()
+    served = CountingHandler.bytes_sent
+    ok = len(updated) == expect_files and served == expect_bytes
+    print(f'{name:12s} files {len(updated):3d} (expected {expect_files:3d})  '
+          f'bytes {served:7d} (expected {expect_bytes:7d})  failed {len(updater.files_failed)}  '
+          f'{"ok" if ok else "FAIL"}')
+    return ok, updater
+
+def write_manifest(remote, base_url, drive, names, unpinned=()):
+    # Names in unpinned are listed without a hash, as --offline does for files it can't fetch
+    ota_list = {DEVICE: {os.path.join(drive, 'circuitpy_septic_tank', name): f'{base_url}/{name}'
+                         for name in names}}
+
+    def fetch(url):
+        name = url.rsplit('/', 1)[1]
+        if name in unpinned:
+            return None
+        with open(os.path.join(remote, name), 'rb') as f:
+            return f.read()
+
+    manifest = build(ota_list, fetch)
+    with open(os.path.join(remote, 'ota_manifest.jsonl'), 'wb') as f:
+        f.write(compile_manifest(manifest))
+    return manifest[DEVICE], os.path.getsize(os.path.join(remote, 'ota_manifest.jsonl'))
+
+def check_fleet():
+    with open(os.path.join(sim.REPO_ROOT, 'ota_list.py')) as f:
+        ota_list = json.load(f)
+    manifest = build(ota_list, lambda url: url.encode())
+    compiled = compile_manifest(manifest)
+    ok = all(lookup(compiled, device) == files for device, files in manifest.items())
+    ok = ok and lookup(compiled, 'ffff') is None
+    expanded = len(json.dumps(manifest, separators=(',', ':')))
+    print(f'{"fleet":12s} {len(manifest)} devices  compiled {len(compiled)} bytes, '
+          f'expanded {expanded} bytes  {"ok" if ok else "FAIL"}')
+    return ok
+
+def required_files(module, files=None):
+    # Device paths of module and everything it imports from this repo or circuitpy_mcu, directly,
+    # through drivers.py or through the controller code.py runs, plus their data files
+    if files is None:
+        files = set()
+    path = '/code.py' if module == 'code' else f'/circuitpy_septic_tank/{module}.py'
+    if path in files:
+        return files
+    files.add(path)
+    files.update(DATA_FILES.get(module, []))
+    with open(os.path.join(sim.REPO_ROOT, f'{module}.py')) as f:
+        source = f.read()
+    imported = set(re.findall(r'circuitpy_septic_tank[./](\w+)', source))
+    for names in re.findall(r'from circuitpy_septic_tank import ([\w, ]+)', source):
+        imported.update(name.strip() for name in names.split(','))
+    for name in re.findall(r'circuitpy_mcu\.(\w+)', source):
+        files.add(f'/circuitpy_mcu/{name}.py')
+    for name in sorted(imported):
+        if os.path.exists(os.path.join(sim.REPO_ROOT, f'{name}.py')):
+            required_files(name, files)
+    return files
+
+def check_file_sets():
+    # A box missing a module its code imports reset-loops on ImportError after an update
+    with open(os.path.join(sim.REPO_ROOT, 'ota_list.py')) as f:
+        ota_list = json.load(f)
+    ok = True
+    for device, files in sorted(ota_list.items()):
+        controllers = [c for c in CONTROLLERS if files.get(f'/circuitpy_septic_tank/{c}.py') == f'{REPO_URL}{c}.py']
+        if not controllers:
+            print(f'{"files " + device:12s} no controller from {REPO_URL}, skipped')
+            continue
+        required = required_files('code')
+        for controller in controllers:
+            required_files(controller, required)
+        missing = sorted(required - set(files))
+        print(f'{"files " + device:12s} {len(files)} listed, {len(required)} needed  '
+              f'{"missing " + ", ".join(missing) if missing else "ok"}')
+        ok = ok and not missing
+    return ok
+
+def check_committed_manifest():
+    with open(os.path.join(sim.REPO_ROOT, 'ota_list.py')) as f:
+        ota_list = json.load(f)
+    try:
+        with open(os.path.join(sim.REPO_ROOT, 'ota_manifest.jsonl'), 'rb') as f:
+            committed = f.read()
+    except OSError:
+        print(f'{"manifest":12s} ota_manifest.jsonl missing  FAIL')
+        return False
+    # Files from elsewhere can't be hashed offline, they only have to be listed with the same url,
+    # pinned or not. A box would never update a listed file left out of the manifest.
+    expected = build(ota_list, local_fetch(sim.REPO_ROOT))
+    stale = []
+    missing = []
+    unpinned = 0
+    for device, files in sorted(expected.items()):
+        entries = lookup(committed, device) or {}
+        for path in sorted(set(files) | set(entries)):
+            entry = entries.get(path)
+            if entry is None:
+                missing.append(f'{device}:{path}')
+                continue
+            if entry['sha1'] is None:
+                unpinned += 1
+            if path in files and files[path]['sha1'] is None:
+                if entry['url'] != files[path]['url']:
+                    stale.append(path)
+            elif files.get(path) != entry:
+                stale.append(path)
+    problems = []
+    if missing:
+        problems.append('missing ' + ', '.join(missing))
+    if stale:
+        problems.append('stale ' + ', '.join(sorted(set(stale))))
+    print(f'{"manifest":12s} {len(committed)} bytes, {unpinned} unpinned entries  '
+          f'{"  ".join(problems) if problems else "ok"}')
+    if problems:
+        print('recompile with: python ota_manifest.py ota_list.py ota_manifest.jsonl')
+    return not problems
+
+def main():
+    remote = tempfile.mkdtemp(prefix='ota-remote-')
+    drive = tempfile.mkdtemp(prefix='circuitpy-')
+    names = sorted(n for n in os.listdir(sim.REPO_ROOT) if n.endswith('.py'))
+    for name in names:
+        shutil.copy(os.path.join(sim.REPO_ROOT, name), remote)
+
+    handler = lambda *args: CountingHandler(*args, directory=remote)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    results = [check_fleet(), check_file_sets(), check_committed_manifest()]
+    files, manifest_size = write_manifest(remote, base_url, drive, names)
+    total = sum(entry['size'] for entry in files.values())
+    results.append(boot('fresh', base_url, drive, len(names), manifest_size + total)[0])
+    results.append(boot('unchanged', base_url, drive, 0, manifest_size)[0])
+
+    edited = names[0]
+    with open(os.path.join(remote, edited), 'a') as f:
+        f.write('\n# edited upstream\n')
+    files, manifest_size = write_manifest(remote, base_url, drive, names)
+    local = os.path.join(drive, 'circuitpy_septic_tank', edited)
+    results.append(boot('one-change', base_url, drive, 1, manifest_size + files[local]['size'])[0])
+
+    # Upstream moves on again after the manifest was rebuilt
+    with open(os.path.join(remote, edited), 'a') as f:
+        f.write('# in the manifest\n')
+    files, manifest_size = write_manifest(remote, base_url, drive, names)
+    upstream = open(os.path.join(remote, edited), 'rb').read()
+    with open(os.path.join(remote, edited), 'a') as f:
+        f.write('# not in the manifest\n')
+    before = open(local, 'rb').read()
+    ok, updater = boot('corrupt', base_url, drive, 0, manifest_size + files[local]['size'] + 22)
+    ok = ok and len(updater.files_failed) == 1
+    ok = ok and open(local, 'rb').read() == before and not os.path.exists(local + TMP_SUFFIX)
+    results.append(ok)
+
+    with open(os.path.join(remote, edited), 'wb') as f:
+        f.write(upstream)
+    results.append(boot('fixed', base_url, drive, 1, manifest_size + files[local]['size'])[0])
+
+    # Boot interrupted between removing the old file and renaming the verified download
+    target = os.path.join(drive, 'circuitpy_septic_tank', names[1])
+    os.rename(target, target + TMP_SUFFIX)
+    results.append(boot('resume', base_url, drive, 1, manifest_size)[0])
+
+    # Listed without a hash: downloaded at every boot, even when the local copy is the same
+    unpinned = names[2]
+    files, manifest_size = write_manifest(remote, base_url, drive, names, unpinned=[unpinned])
+    size = os.path.getsize(os.path.join(remote, unpinned))
+    results.append(boot('unpinned', base_url, drive, 1, manifest_size + size)[0])
+    results.append(boot('unpinned', base_url, drive, 1, manifest_size + size)[0])
+
+    # Cut short: the server promised more than it sent
+    local = os.path.join(drive, 'circuitpy_septic_tank', unpinned)
+    before = open(local, 'rb').read()
+    CountingHandler.truncate = unpinned
+    ok, updater = boot('truncated', base_url, drive, 0, manifest_size + size // 2)
+    CountingHandler.truncate = None
+    ok = ok and len(updater.files_failed) == 1 and open(local, 'rb').read() == before
+    results.append(ok)
+
+    os.remove(os.path.join(remote, 'ota_manifest.jsonl'))
+    try:
+        boot('missing', base_url, drive, 0, 0)
+        ok = False
+    except RuntimeError as e:
+        ok = True
+    print(f'{"missing":12s} {"raised" if ok else "did not raise"}  {"ok" if ok else "FAIL"}')
+    results.append(ok)
+
+    server.shutdown()
+    shutil.rmtree(remote)
+    shutil.rmtree(drive)
+    if not all(results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
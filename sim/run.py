@@ -0,0 +1,106 @@
+# Run a controller against the simulator at accelerated virtual time, then report benchmark figures.
+#
+#   python -m sim.run septic_tank --days 1
+#   python -m sim.run feed_control --days 2 --tick 0.1 --verbose
+
+import argparse
+import importlib
+import os
+import tempfile
+import time
+
+import sim
+from sim import hardware
+from sim.clock import SimulationComplete
+
+# pH calibration set the simulated device is registered to
+SIM_SITE = 'STCON'
+
+# Real wall clock, captured before the virtual clock replaces the time functions
+perf_counter = time.perf_counter
+
+def run(controller='septic_tank', days=1.0, tick=0.25, seed=1, verbose=False, setup=None, fs_root=None):
+    # setup(world) may schedule serial/env/link events before the controller starts
+    # Files the controller writes to CIRCUITPY go under fs_root, a fresh temporary directory by default.
+    # Pass the same fs_root to a later run to boot again with those files in place.
+    world = sim.install(controller=controller, days=days, seed=seed)
+    if fs_root is None:
+        fs_root = tempfile.mkdtemp(prefix='circuitpy-')
+    i2c_topology = importlib.import_module('circuitpy_septic_tank.i2c_topology')
+    i2c_topology.TOPOLOGY_FILE = os.path.join(fs_root, 'i2c_topology.json')
+
+    pump_tuner = importlib.import_module('circuitpy_septic_tank.pump_tuner')
+    pump_tuner.TUNING_FILE = os.path.join(fs_root, 'pump_tuning.json')
+    pump_tuner.SD_TUNING_FILE = os.path.join(fs_root, 'sd', 'pump_tuning.json')
+
+    journal = importlib.import_module('circuitpy_septic_tank.journal')
+    os.makedirs(os.path.join(fs_root, 'sd'), exist_ok=True)
+    journal.JOURNAL_FILE = os.path.join(fs_root, 'sd', 'journal.bin')
+
+    # The repo's pH calibration bank, with the simulated device serial as an alias for one site
+    bank = importlib.import_module('circuitpy_septic_tank.ph_calibration_bank')
+    os.makedirs(os.path.join(fs_root, 'calibration'), exist_ok=True)
+    bank.LEGACY_FILE = os.path.join(fs_root, 'calibration', 'ph_calibration_ch{}.txt')
+    bank.BANK_FILE = os.path.join(fs_root, 'calibration', 'ph_calibration.bin')
+    if not os.path.exists(bank.BANK_FILE):
+        sites, aliases = bank.load_all(os.path.join(sim.REPO_ROOT, 'calibration', 'ph_calibration.bin'))
+        aliases[hardware.CPU_UID[-2:].hex()] = SIM_SITE
+        bank.write_bank(sites, bank.BANK_FILE, aliases)
+    sim.sim_mcu.Mcu.tick = tick
+    sim.sim_mcu.Mcu.verbose = verbose
+    sim.sim_mcu.Mcu.instances = []
+    sim.sim_mcu.Notecard_manager.instances = []
+    if setup:
+        setup(world)
+
+    module = importlib.import_module(f'circuitpy_septic_tank.{controller}')
+    start = perf_counter()
+    try:
+        module.main()
+    except SimulationComplete:
+        pass
+    wall = perf_counter() - start
+
+    mcu = sim.sim_mcu.Mcu.instances[0]
+    ncm = sim.sim_mcu.Notecard_manager.instances[0]
+    sim_days = world.clock.now / 86400
+
+    return {
+        'controller'            : controller,
+        'simulated-days'        : round(sim_days, 3),
+        'wall-seconds'          : round(wall, 2),
+        'speedup'               : round(world.clock.now / wall, 1) if wall else None,
+        'loop-iterations'       : mcu.iterations,
+        'iterations-per-sec'    : round(mcu.iterations / wall, 1) if wall else None,
+        'i2c-transactions'      : mcu.i2c_transactions,
+        'i2c-per-iteration'     : round(mcu.i2c_transactions / max(mcu.iterations, 1), 2),
+        'notes-per-day'         : round(ncm.notes_added / sim_days, 1) if sim_days else None,
+        'note-bytes-per-day'    : round(ncm.bytes_stored / sim_days) if sim_days else None,
+        'syncs-per-day'         : round(ncm.syncs / sim_days, 1) if sim_days else None,
+        'log-records'           : mcu.loghandler.records,
+        'fs-root'               : fs_root,
+        'world'                 : world,
+        'mcu'                   : mcu,
+        'ncm'                   : ncm,
+    }
+
+def print_report(result):
+    for key, val in result.items():
+        if key in ('world', 'mcu', 'ncm', 'fs-root'):
+            continue
+        print(f'{key:<22}{val}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a controller against the simulated hardware')
+    parser.add_argument('controller', choices=['septic_tank', 'feed_control'])
+    parser.add_argument('--days', type=float, default=1.0, help='simulated days to run')
+    parser.add_argument('--tick', type=float, default=0.25, help='virtual seconds per loop pass')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help='print controller log output')
+    args = parser.parse_args()
+
+    result = run(args.controller, days=args.days, tick=args.tick, seed=args.seed, verbose=args.verbose)
+    print_report(result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Runs every sim script as one suite, from the repo root:
+#
+#   pytest sim
+#
+# Each script's main() is called as it would be from the command line and must exit cleanly,
+# and a few scripted runs check controller behaviour end to end.
+# The host fixture in conftest.py uninstalls the simulator after each one, see sim.uninstall().
+# The benchmarks are scaled to the host by their reference workload, and fail here only if one
+# takes twice its baseline, e.g. a hot path gone quadratic. For the 25% check, run
+# python -m sim.benchmarks on its own, against a baseline recorded on the same machine.
+
+import sys
+
+import pytest
+
+import sim
+from sim import benchmarks, jacket_validation, ota_check
+from sim import run as sim_run
+
+def call_main(monkeypatch, module, *args):
+    monkeypatch.setattr(sys, 'argv', [module.__name__] + list(args))
+    try:
+        module.main()
+    except SystemExit as e:
+        assert not e.code, f'{module.__name__} {" ".join(args)} exited with {e.code}'
+
+@pytest.mark.parametrize('controller', ['septic_tank', 'feed_control'])
+def test_run(monkeypatch, capsys, controller):
+    call_main(monkeypatch, sim_run, controller, '--days', '0.5')
+    report = dict(line.split(None, 1) for line in capsys.readouterr().out.splitlines())
+    assert float(report['simulated-days']) == pytest.approx(0.5, abs=0.01)
+    assert float(report['notes-per-day']) > 0
+    assert float(report['syncs-per-day']) > 0
+
+def test_jacket_validation(monkeypatch):
+    call_main(monkeypatch, jacket_validation, '--days', '2')
+
+def test_ota_check(monkeypatch):
+    call_main(monkeypatch, ota_check)
+
+def test_benchmarks(monkeypatch):
+    call_main(monkeypatch, benchmarks, '--threshold', '1')
+
+def test_send_interval_env():
+    # note-send-interval changed on notehub half way through takes effect without a reboot
+    def shorter_interval(world):
+        world.schedule(0.25 * 86400, 'env', {'note-send-interval': 10})
+    baseline = sim_run.run('septic_tank', days=0.5)['ncm'].syncs
+    sim.uninstall()
+    changed = sim_run.run('septic_tank', days=0.5, setup=shorter_interval)['ncm'].syncs
+    assert changed > baseline * 1.3
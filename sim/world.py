@@ -0,0 +1,167 @@
+import random
+
+# Pin assignments, as used by septic_tank.py and feed_control.py
+JACKET_PINS = ['D9', 'D11', 'D12']
+VALVE_CLOSED_PINS = ['A0', 'A1', 'A2', 'A3', 'A4', 'MISO', 'D12', 'D11', 'D10', 'D9', 'D6', 'D5']
+VALVE_DRIVERS = [0x6E, 0x6D, 0x6F]
+
+# Devices fitted on each bus for the two controllers
+SEPTIC_TANK_I2C = [0x0B, 0x17, 0x68, 0x72]
+SEPTIC_TANK_I2C2 = [0x48, 0x60, 0x61, 0x62, 0x63, 0x64, 0x65, 0x66, 0x67, 0x6E, 0x6F]
+FEED_CONTROL_I2C = [0x0B, 0x17, 0x6D, 0x6E, 0x6F, 0x72]
+
+class Tank():
+    # Two node thermal model of a jacketed tank.
+    # The heater warms the jacket/wall, which warms the liquid, which loses heat to ambient.
+    # The wall's stored heat is what makes a bang-bang controller overshoot.
+
+    def __init__(self, temperature=20.0, heater_power=500.0,
+                 wall_capacity=20000.0, liquid_capacity=800000.0,
+                 wall_coupling=40.0, ambient_loss=4.0):
+        self.wall = temperature
+        self.liquid = temperature
+        self.heater_power = heater_power # W
+        self.wall_capacity = wall_capacity # J/K
+        self.liquid_capacity = liquid_capacity # J/K
+        self.wall_coupling = wall_coupling # W/K, wall to liquid
+        self.ambient_loss = ambient_loss # W/K, liquid to ambient
+        self.heater = False
+
+    def step(self, dt, ambient):
+        # Sub-step long intervals so the wall node stays stable
+        while dt > 0:
+            h = min(dt, 10)
+            q_heater = self.heater_power if self.heater else 0
+            q_wall = self.wall_coupling * (self.wall - self.liquid)
+            q_loss = self.ambient_loss * (self.liquid - ambient)
+            self.wall += h * (q_heater - q_wall) / self.wall_capacity
+            self.liquid += h * (q_wall - q_loss) / self.liquid_capacity
+            dt -= h
+
+class ValveActuator():
+    # Motorised valve with a closed position switch
+
+    def __init__(self, travel_time=3.0):
+        self.travel_time = travel_time
+        self.position = 0.0 # 0 closed, 1 open
+        self.throttle = 0
+
+    def step(self, dt):
+        rate = dt / self.travel_time
+        if self.throttle:
+            self.position = min(1.0, self.position + rate)
+        else:
+            self.position = max(0.0, self.position - rate)
+
+    @property
+    def closed(self):
+        return self.position <= 0.0
+
+class World():
+    # Physical state shared by all of the simulated devices
+
+    def __init__(self, clock, controller='septic_tank', seed=1):
+        self.clock = clock
+        self.controller = controller
+        self.random = random.Random(seed)
+
+        self.ambient = 12.0
+        self.tanks = [Tank(temperature=t) for t in (24.0, 27.0, 29.5)]
+        self.ph_voltages = [1.62, 1.55, 1.70, 1.50]
+
+        # Gascard
+        self.gascard_ready_after = 20 # seconds of settings output before normal frames
+        self.gas_concentration = [0.0, 0.45, 0.62, 0.38, 0.0] # per pump line, index 0 is "no pump"
+        self.pressure_base = 1000.0
+        self.pressure = self.pressure_base
+        self.pressure_gain = [0, 35.0, 28.0, 41.0, 30.0] # mbar at full throttle, per pump
+        self.pressure_tau = 8.0
+
+        self.pumps = {} # (address, channel) -> throttle
+        self.valve_motors = {} # (address, channel) -> throttle
+        self.actuators = {} # (address, channel) -> ValveActuator
+        self.outputs = {} # pin name -> bool
+        self.inputs = {} # pin name -> function returning bool
+
+        if controller == 'septic_tank':
+            self.buses = [SEPTIC_TANK_I2C, SEPTIC_TANK_I2C2]
+        else:
+            self.buses = [FEED_CONTROL_I2C, []]
+            self.setup_valves()
+
+        # Notecard link state, and scripted events [(time, kind, payload)]
+        self.connected = True
+        self.events = []
+
+        clock.listeners.append(self.step)
+
+    def setup_valves(self):
+        index = 0
+        for address in VALVE_DRIVERS:
+            for channel in range(1, 5):
+                actuator = ValveActuator(travel_time=self.random.uniform(2.5, 4.0))
+                self.actuators[(address, channel)] = actuator
+                pin = VALVE_CLOSED_PINS[index]
+                # Position switches are active low
+                self.inputs[pin] = lambda a=actuator: not a.closed
+                index += 1
+
+    def schedule(self, t, kind, payload):
+        self.events.append((t, kind, payload))
+        self.events.sort(key=lambda e: e[0])
+
+    def due_events(self, kinds):
+        due = []
+        for event in list(self.events):
+            if event[0] <= self.clock.now and event[1] in kinds:
+                self.events.remove(event)
+                due.append(event)
+        return due
+
+    def step(self, dt):
+        for i, tank in enumerate(self.tanks):
+            tank.heater = self.outputs.get(JACKET_PINS[i], False)
+            tank.step(dt, self.ambient)
+
+        for actuator in self.actuators.values():
+            actuator.step(dt)
+
+        # Pressure relaxes towards the level set by whichever pumps are running
+        target = self.pressure_base
+        for (address, channel), throttle in self.pumps.items():
+            if throttle and self.valve_motors.get((0x6E, channel)):
+                target += self.pressure_gain[channel] * throttle
+        alpha = min(1.0, dt / self.pressure_tau)
+        self.pressure += (target - self.pressure) * alpha
+
+    def set_motor(self, address, channel, throttle):
+        throttle = throttle or 0
+        if self.controller == 'septic_tank':
+            if address == 0x6F:
+                self.pumps[(address, channel)] = throttle
+            else:
+                self.valve_motors[(address, channel)] = throttle
+        elif (address, channel) in self.actuators:
+            self.actuators[(address, channel)].throttle = throttle
+
+    def gas_line(self):
+        # Concentration seen by the gascard comes from whichever pump is running
+        for (address, channel), throttle in self.pumps.items():
+            if throttle:
+                return self.gas_concentration[channel]
+        return 0.0
+
+    def thermocouple(self, address):
+        noise = self.random.gauss(0, 0.05)
+        index = address - 0x60
+        tank = index // 2
+        if tank < len(self.tanks):
+            t = self.tanks[tank]
+            if index % 2 == 0:
+                # Short thermocouple sits nearer the jacket, so sees a little of the wall temperature
+                return round(t.liquid + 0.1 * (t.wall - t.liquid) + noise, 2)
+            return round(t.liquid + noise, 2)
+        return round(self.ambient + noise, 2)
+
+    def ph_voltage(self, channel):
+        return self.ph_voltages[channel] + self.random.gauss(0, 0.002)
@@ -5,6 +5,59 @@ import adafruit_logging as logging
 import digitalio
 import time
 
+# Hard limit on valve travel, used until enough travel times have been seen
+TRAVEL_TIMEOUT = 10 # seconds
+TRAVEL_TIMEOUT_MIN = 2 # seconds, adaptive timeout never goes below this
+TRAVEL_ALPHA = 0.2 # weight of each new travel time in the moving statistics
+TRAVEL_TIMEOUT_K = 4 # sigmas above the mean before declaring a blockage
+TRAVEL_SLOW_K = 2 # sigmas above the mean before warning that a valve is slowing
+TRAVEL_MIN_SAMPLES = 5 # travel times required before the statistics are trusted
+TRAVEL_SIGMA_FLOOR = 0.1 # fraction of the mean, stops very consistent valves getting a hair trigger
+
+# Health status codes, as reported in Valve.health()
+HEALTH_OK = 0
+HEALTH_SLOWING = 1
+HEALTH_BLOCKED = 2
+
+class TravelStats():
+    # Exponentially weighted mean/variance of a valve travel time
+
+    def __init__(self, alpha=TRAVEL_ALPHA):
+        self.alpha = alpha
+        self.mean = None
+        self.var = 0
+        self.samples = 0
+
+    def update(self, t):
+        if self.mean is None:
+            self.mean = t
+        else:
+            diff = t - self.mean
+            incr = self.alpha * diff
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + diff * incr)
+        self.samples += 1
+
+    @property
+    def sigma(self):
+        return max(self.var ** 0.5, TRAVEL_SIGMA_FLOOR * self.mean)
+
+    @property
+    def trusted(self):
+        return self.samples >= TRAVEL_MIN_SAMPLES
+
+    def timeout(self):
+        if not self.trusted:
+            return TRAVEL_TIMEOUT
+        t = self.mean + TRAVEL_TIMEOUT_K * self.sigma
+        return min(max(t, TRAVEL_TIMEOUT_MIN), TRAVEL_TIMEOUT)
+
+    def is_slow(self, t):
+        # Compare against the statistics *before* t is folded in
+        if not self.trusted:
+            return False
+        return t > self.mean + TRAVEL_SLOW_K * self.sigma
+
 class Valve():
 
     def __init__(self, motor:DCMotor, name, loghandler=None):
@@ -14,6 +67,9 @@ class Valve():
         # For valves that need to be actively closed, add another motor driver
         self.motor_close = None
 
+        # Index of the motor driver board the valve is on, set by the controller if it has several
+        self.driver = None
+
         self.manual = False
         self.pulsing = False
 
@@ -35,6 +91,10 @@ class Valve():
         self.opening = False
         self.closing = False
         self.blocked = False
+        self.slowing = False
+
+        self.open_stats = TravelStats()
+        self.close_stats = TravelStats()
 
         # Set up logging
         self.log = logging.getLogger(self.name)
@@ -78,7 +138,7 @@ class Valve():
             self.motor_close.throttle = 0
             time.sleep(0.1)
         self.motor.throttle = 1
-        self.log.info(f'Opening Valve')
+        self.log.info('Opening Valve')
         self.timer_open = time.monotonic()
         self.closing = False
         if self.gpio_open:
@@ -89,33 +149,72 @@ class Valve():
         if self.motor_close:
             time.sleep(0.1)
             self.motor_close.throttle = 1
-        self.log.info(f'Closing Valve')
+        self.log.info('Closing Valve')
         self.timer_close = time.monotonic()
         self.opening = False
         if self.gpio_close:
             self.closing = True
 
+    def health(self):
+        # Compact health vector for telemetry:
+        # [status, mean open time, mean close time] with times in 0.1s units.
+        # A travel time is only included for a direction with a position signal, so a valve
+        # with just the closed switch wired (as on feed_control) reports [status, mean close time]
+        if self.blocked:
+            status = HEALTH_BLOCKED
+        elif self.slowing:
+            status = HEALTH_SLOWING
+        else:
+            status = HEALTH_OK
+        vector = [status]
+        for gpio, stats in ((self.gpio_open, self.open_stats), (self.gpio_close, self.close_stats)):
+            if gpio is None:
+                continue
+            if stats.mean is None:
+                vector.append(-1)
+            else:
+                vector.append(int(stats.mean * 10))
+        return vector
+
+    def _travel_complete(self, stats, elapsed, direction):
+        self.blocked = False
+        self.slowing = stats.is_slow(elapsed)
+        if self.slowing:
+            self.log.warning('%s in %.1fs, slowing (mean %.1fs)', direction, elapsed, stats.mean)
+        else:
+            self.log.info('%s in %.1fs', direction, elapsed)
+        stats.update(elapsed)
+
+    def _travel_overdue(self, stats, elapsed, direction):
+        # Returns True once the valve should no longer be watched
+        if elapsed > TRAVEL_TIMEOUT:
+            if not self.blocked:
+                self.log.critical(f'Valve not {direction} after {TRAVEL_TIMEOUT}s, possible blockage')
+            self.blocked = True
+            return True
+        if not self.blocked and elapsed > stats.timeout():
+            # Flag early, but keep watching until the hard timeout in case it arrives late
+            self.log.critical(f'Valve not {direction} after {round(elapsed, 1)}s, possible blockage')
+            self.blocked = True
+        return False
+
     def update(self):
 
         if self.closing:
-            if time.monotonic() - self.timer_close > 10:
-                self.log.critical('Valve not closed after 10s, possible blockage')
-                self.closing = False
-                self.blocked = True
+            elapsed = time.monotonic() - self.timer_close
             if self.gpio_close.value == False:
                 self.closing = False
-                self.blocked = False
-                self.log.info(f'closed in {round(time.monotonic() - self.timer_close, 1)}s')
+                self._travel_complete(self.close_stats, elapsed, 'closed')
+            elif self._travel_overdue(self.close_stats, elapsed, 'closed'):
+                self.closing = False
 
         if self.opening:
-            if time.monotonic() - self.timer_open > 10:
-                self.log.critical('Valve not Opened after 10s, possible blockage')
-                self.opening = False
-                self.blocked = True
+            elapsed = time.monotonic() - self.timer_open
             if self.gpio_open.value == False:
                 self.opening = False
-                self.blocked = False
-                self.log.info(f'opened in {round(time.monotonic() - self.timer_open, 1)}s')
+                self._travel_complete(self.open_stats, elapsed, 'opened')
+            elif self._travel_overdue(self.open_stats, elapsed, 'opened'):
+                self.opening = False
 
         if self.manual:
             self.pulsing = False
@@ -0,0 +1,120 @@
+from array import array
+
+# Fixed-point store for the per-second readings, instead of a float per key in mcu.data.
+# Each field is held as an int16 in a preallocated array, as round((value - offset) * scale),
+# and goes into notes as one list of integers with the schema version:
+#
+#   {"tv": 1, "td": [253, 251, 262, 248, 249, 251, 263, null, 681, 679, 692, 412, 10132]}
+#
+# null is a reading that hasn't been taken. Values outside int16 saturate at its limits.
+# Decode on a host with
+#   python telemetry.py notes.json
+# which takes a JSON list (or JSON lines) of note bodies and prints them in engineering units.
+# Add a new version to SCHEMAS rather than editing one already in the field.
+
+SCHEMA_VERSION = 1
+
+# field, scale, offset
+SCHEMAS = {
+    1 : (
+        ('ts1', 10, 0), # thermocouples, 0.1C
+        ('ts2', 10, 0),
+        ('ts3', 10, 0),
+        ('ts4', 10, 0),
+        ('tl1', 10, 0),
+        ('tl2', 10, 0),
+        ('tl3', 10, 0),
+        ('tl4', 10, 0),
+        ('ph1', 100, 0), # 0.01 pH
+        ('ph2', 100, 0),
+        ('ph3', 100, 0),
+        ('debug-concentration', 1, 0), # gascard concentration, already x100 by the controller, so to 0.01
+        ('debug-pressure', 10, 0), # gascard pressure, 0.1mbar
+    ),
+}
+
+MISSING = -32768
+INT16_MAX = 32767
+
+
+class Telemetry():
+
+    def __init__(self, version=SCHEMA_VERSION):
+        schema = SCHEMAS[version]
+        self.version = version
+        self.fields = [field[0] for field in schema]
+        self.scales = [field[1] for field in schema]
+        self.offsets = [field[2] for field in schema]
+        self.index = {}
+        for i, field in enumerate(self.fields):
+            self.index[field] = i
+        self.values = array('h', [MISSING] * len(schema))
+
+    def quantise(self, i, value):
+        if value is None:
+            return MISSING
+        raw = round((value - self.offsets[i]) * self.scales[i])
+        return max(-INT16_MAX, min(INT16_MAX, raw))
+
+    def set(self, field, value):
+        i = self.index[field]
+        self.values[i] = self.quantise(i, value)
+
+    def get(self, field, default=None):
+        # In engineering units, so it can stand in for mcu.data where readings are looked up
+        i = self.index[field]
+        raw = self.values[i]
+        if raw == MISSING:
+            return default
+        return raw / self.scales[i] + self.offsets[i]
+
+    def readings(self):
+        # {field: value} in engineering units, for the readings that have been taken
+        readings = {}
+        for field in self.fields:
+            value = self.get(field)
+            if value is not None:
+                readings[field] = value
+        return readings
+
+    def record(self):
+        # Note fields for the current readings
+        return {'tv': self.version, 'td': [None if v == MISSING else v for v in self.values]}
+
+    def encode(self, data):
+        # Note fields for a dict of readings in engineering units, e.g. a journal backfill batch
+        td = []
+        for i, field in enumerate(self.fields):
+            raw = self.quantise(i, data.get(field))
+            td.append(None if raw == MISSING else raw)
+        return {'tv': self.version, 'td': td}
+
+
+def decode(note):
+    # Host side. Replaces the tv/td fields of a note with the readings in engineering units
+    note = dict(note)
+    if 'tv' not in note:
+        return note
+    telemetry = Telemetry(note.pop('tv'))
+    for i, raw in enumerate(note.pop('td')):
+        telemetry.values[i] = MISSING if raw is None else raw
+    note.update(telemetry.readings())
+    return note
+
+if __name__ == '__main__':
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print('usage: python telemetry.py notes.json')
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        text = f.read()
+    try:
+        notes = json.loads(text)
+    except ValueError:
+        notes = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(notes, dict):
+        notes = [notes]
+    for note in notes:
+        print(json.dumps(decode(note)))
@@ -0,0 +1,13 @@
+import time
+
+import pytest
+
+from sim.clock import VirtualClock
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A virtual clock standing in for the time functions, moved on with clock.advance()
+    clock = VirtualClock()
+    for name in ('monotonic', 'monotonic_ns', 'time', 'sleep'):
+        monkeypatch.setattr(time, name, getattr(clock, name))
+    return clock
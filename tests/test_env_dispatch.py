@@ -0,0 +1,45 @@
+from env_dispatch import EnvDispatcher
+
+def dispatcher(calls):
+    def record(name):
+        def handler(key, val):
+            calls.append((name, key, val))
+        return handler
+    alarm = record('alarm')
+    return EnvDispatcher({'led-color': record('led'), 'feed-times': alarm, 'utc-offset-hours': alarm})
+
+def test_first_apply_dispatches_every_handled_key():
+    calls = []
+    env = {'led-color': 'red', 'feed-times': ['09:00'], 'unhandled': 1}
+    assert dispatcher(calls).apply(env) == ['led-color', 'feed-times']
+    assert calls == [('led', 'led-color', 'red'), ('alarm', 'feed-times', ['09:00'])]
+
+def test_only_changed_keys():
+    calls = []
+    d = dispatcher(calls)
+    env = {'led-color': 'red', 'feed-times': ['09:00'], 'utc-offset-hours': 1}
+    d.apply(env)
+    calls.clear()
+    assert d.apply(env) == []
+    env['led-color'] = 'blue'
+    assert d.apply(env) == ['led-color']
+    assert calls == [('led', 'led-color', 'blue')]
+
+def test_in_place_change_is_seen():
+    calls = []
+    d = dispatcher(calls)
+    env = {'feed-times': ['09:00']}
+    d.apply(env)
+    env['feed-times'].append('17:00')
+    assert d.apply(env) == ['feed-times']
+
+def test_shared_handler_runs_once():
+    calls = []
+    d = dispatcher(calls)
+    env = {'feed-times': ['09:00'], 'utc-offset-hours': 1}
+    d.apply(env)
+    calls.clear()
+    env['feed-times'] = ['10:00']
+    env['utc-offset-hours'] = 0
+    assert d.apply(env) == ['feed-times']
+    assert len(calls) == 1
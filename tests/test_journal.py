@@ -0,0 +1,69 @@
+from journal import FLUSH_RECORDS, HEADER_RECORDS, Journal, read_header
+
+FIELDS = ['ts1', 'ph1']
+
+def frames(j, n, t0=1000):
+    for i in range(n):
+        t = t0 + j.seq + len(j.buffer)
+        j.append({'ts1': 20.0 + (t % 10), 'ph1': 7.0}, timestamp=t)
+
+def header_sent(path):
+    with open(path, 'rb') as f:
+        return read_header(f)[3]
+
+def test_note_sent_leaves_header_to_cadence(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    j = Journal(FIELDS, path=path, capacity=5000)
+    for minute in range(5):
+        frames(j, 60)
+        j.note_sent()
+    # Sent is kept in RAM, the header isn't rewritten for each note
+    assert j.sent == 300
+    assert header_sent(path) == 0
+    frames(j, HEADER_RECORDS)
+    j.flush()
+    assert header_sent(path) >= 300
+
+def test_reopen_scans_past_header(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    j = Journal(FIELDS, path=path, capacity=5000)
+    frames(j, 3 * FLUSH_RECORDS)
+    j.note_sent()
+    # Reset without a header write: records on the card carry on past the header's seq
+    reopened = Journal(FIELDS, path=path)
+    assert reopened.seq == 3 * FLUSH_RECORDS
+    assert reopened.capacity == 5000
+    # Frames since the header's sent go out again as backfill
+    assert reopened.skipped
+    reopened.note_sent()
+    assert reopened.backfilling()
+    assert reopened.remaining() == 3 * FLUSH_RECORDS
+
+def test_backfill_after_outage(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    j = Journal(FIELDS, path=path, capacity=5000)
+    frames(j, 60)
+    j.note_sent()
+    # Offline for 10 minutes
+    frames(j, 600)
+    j.note_skipped()
+    frames(j, 60)
+    j.note_sent()
+    assert j.remaining() == 660
+    batches = j.backfill(300, max_batches=2)
+    assert [b['backfill'][2] for b in batches] == [300, 300]
+    assert batches[0]['ph1'] == 7.0
+    assert j.remaining() == 60
+    batches = j.backfill(300, max_batches=2)
+    assert [b['backfill'][2] for b in batches] == [60]
+    j.backfill(300)
+    assert not j.backfilling()
+    assert j.sent == j.seq
+
+def test_ring_wraps(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    j = Journal(FIELDS, path=path, capacity=100)
+    frames(j, 250)
+    j.flush()
+    records = j.read(j.seq - 100, 100)
+    assert [r[0] for r in records] == list(range(150, 250))
@@ -0,0 +1,56 @@
+import logging
+import sys
+
+import pytest
+
+class ListHandler(logging.Handler):
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+@pytest.fixture
+def ring(monkeypatch):
+    # adafruit_logging has the same interface as the standard library, as in the simulator
+    monkeypatch.setitem(sys.modules, 'adafruit_logging', logging)
+    monkeypatch.delitem(sys.modules, 'log_ring', raising=False)
+    from log_ring import RingLogHandler
+    target = ListHandler(logging.INFO)
+    ring = RingLogHandler(target, capacity=4)
+    log = logging.Logger('test', logging.DEBUG)
+    log.addHandler(ring)
+    return log, ring, target
+
+def test_held_until_flush(ring):
+    log, ring, target = ring
+    log.info('one')
+    log.info('two')
+    assert target.messages == []
+    assert ring.flush() == 0
+    assert target.messages == ['one', 'two']
+
+def test_drops_oldest_and_counts(ring):
+    log, ring, target = ring
+    for i in range(7):
+        log.info('%s', i)
+    assert ring.flush() == 3
+    assert target.messages == ['3', '4', '5', '6']
+    # The count starts again after each flush
+    log.info('7')
+    assert ring.flush() == 0
+
+def test_warning_flushes_at_once(ring):
+    log, ring, target = ring
+    log.info('one')
+    log.warning('two')
+    assert target.messages == ['one', 'two']
+
+def test_target_level_applied_on_flush(ring):
+    log, ring, target = ring
+    log.debug('hidden')
+    log.info('shown')
+    ring.flush()
+    assert target.messages == ['shown']
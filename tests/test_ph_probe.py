@@ -0,0 +1,54 @@
+import pytest
+
+from ph_probe import DEFAULT_CALIBRATION, PhProbe, _solve, fit_points
+
+def test_default_calibration():
+    probe = PhProbe(None)
+    tref = DEFAULT_CALIBRATION['tref']
+    assert probe.convert(1.5, tref) == 7.0
+    assert probe.convert(2.03244, tref) == 4.0
+    assert probe.convert(2.03244) == 4.0
+
+def test_solve():
+    a = [[2.0, 1.0, -1.0], [-3.0, -1.0, 2.0], [-2.0, 1.0, 2.0]]
+    b = [8.0, -11.0, -3.0]
+    assert _solve(a, b) == pytest.approx([2.0, 3.0, -1.0])
+
+def test_solve_singular():
+    assert _solve([[1.0, 2.0], [2.0, 4.0]], [1.0, 2.0]) is None
+
+def test_fit_two_points_matches_default():
+    calibration = fit_points([(1.5, None, 7.0), (2.03244, None, 4.0)])
+    assert calibration['v0'] == pytest.approx(1.5)
+    assert calibration['c0'] == pytest.approx(7.0)
+    assert calibration['c1'] == pytest.approx(DEFAULT_CALIBRATION['c1'], abs=1e-4)
+    assert calibration['c2'] == 0.0
+
+def test_fit_with_temperature():
+    # Points taken off a known line at 15C and 35C fit back to it, referred to their mean, 25C
+    truth = PhProbe(None, {'v0': 1.48, 'tref': 25.0, 'c0': 7.0, 'c1': -5.5, 'c2': 0.0})
+    points = []
+    for temperature in (15.0, 35.0):
+        for ph in (4.0, 7.0, 10.0):
+            x = (7.0 - ph) / 5.5 * (temperature + 273.15) / (25.0 + 273.15)
+            points.append((1.48 + x, temperature, ph))
+    calibration = fit_points(points)
+    assert calibration['tref'] == pytest.approx(25.0)
+    assert calibration['v0'] == pytest.approx(1.48)
+    assert calibration['c1'] == pytest.approx(-5.5)
+    probe = PhProbe(None, calibration)
+    for voltage, temperature, ph in points:
+        assert probe.convert(voltage, temperature) == truth.convert(voltage, temperature) == ph
+
+def test_fit_quadratic():
+    points = [(1.5 + x, None, 7.0 - 5.6 * x + 0.8 * x * x) for x in (-0.5, -0.2, 0.0, 0.3, 0.6)]
+    calibration = fit_points(points, degree=2)
+    # Expanded about the v0 where the straight line fit crosses pH 7, so compare readings
+    assert calibration['c2'] == pytest.approx(0.8)
+    probe = PhProbe(None, calibration)
+    for voltage, temperature, ph in points:
+        assert probe.convert(voltage) == round(ph, 2)
+
+def test_fit_under_determined():
+    assert fit_points([(1.5, None, 7.0), (1.51, None, 7.0)]) is None
+    assert fit_points([(1.5, None, 7.0), (2.0, None, 4.0)], degree=2) is None
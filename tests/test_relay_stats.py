@@ -0,0 +1,39 @@
+from relay_stats import RelayStats
+
+def test_window(clock):
+    stats = RelayStats(2)
+    stats.update(0, True)
+    stats.update(1, False)
+    clock.advance(30)
+    stats.update(0, False)
+    clock.advance(10)
+    stats.update(0, True)
+    clock.advance(20)
+    assert stats.report() == {'jon': [50, 0], 'jsw': [2, 0], 'jlon': [30, 0], 'jloff': [10, 60]}
+
+def test_run_carries_into_next_window(clock):
+    stats = RelayStats(1)
+    stats.update(0, True)
+    clock.advance(100)
+    assert stats.report() == {'jon': [100], 'jsw': [0], 'jlon': [100], 'jloff': [0]}
+    # Still on: only this window's part of the run counts towards it
+    clock.advance(50)
+    stats.update(0, False)
+    clock.advance(50)
+    assert stats.report() == {'jon': [50], 'jsw': [1], 'jlon': [50], 'jloff': [50]}
+    clock.advance(100)
+    assert stats.report() == {'jon': [0], 'jsw': [0], 'jlon': [0], 'jloff': [100]}
+
+def test_unseen_relay_reports_zero(clock):
+    stats = RelayStats(1)
+    clock.advance(60)
+    assert stats.report() == {'jon': [0], 'jsw': [0], 'jlon': [0], 'jloff': [0]}
+
+def test_resolution_days_after_boot(clock):
+    # Float seconds from the window start, so a long uptime doesn't cost resolution
+    clock.advance(10 * 86400)
+    stats = RelayStats(1)
+    for i in range(600):
+        stats.update(0, i % 2 == 0)
+        clock.advance(0.5)
+    assert stats.report() == {'jon': [150], 'jsw': [599], 'jlon': [0], 'jloff': [0]}
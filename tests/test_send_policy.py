@@ -0,0 +1,52 @@
+from send_policy import SendPolicy
+
+def test_backoff_while_offline(clock):
+    policy = SendPolicy(interval=100, max_interval=400)
+    assert policy.due(False)
+    policy.failed()
+    attempts = []
+    for t in range(1, 2000):
+        clock.advance_to(t)
+        if policy.due(False):
+            attempts.append(t)
+            policy.failed()
+    # Waits 100, 200, then 400 between attempts, capped at max_interval
+    assert attempts[:5] == [100, 300, 700, 1100, 1500]
+
+def test_failed_attempts_keep_notes_queued(clock):
+    policy = SendPolicy(interval=100, max_interval=400)
+    policy.due(True)
+    policy.sent()
+    policy.note_added({'ts1': 25.0})
+    clock.advance_to(100)
+    assert policy.due(False)
+    policy.failed()
+    assert policy.pending == 1 and policy.novel
+    # Back online, the held notes go out without waiting for the backoff
+    clock.advance_to(101)
+    assert policy.due(True)
+    policy.sent()
+    assert policy.pending == 0
+
+def test_deadband_and_batch(clock):
+    policy = SendPolicy(interval=100, max_interval=400, batch_notes=3, deadband=0.5, ignore=('jon',))
+    policy.note_added({'ts1': 25.0})
+    policy.due(True)
+    policy.sent()
+    policy.note_added({'ts1': 25.3, 'jon': 12})
+    clock.advance_to(100)
+    assert not policy.due(True)
+    policy.note_added({'ts1': 25.2})
+    policy.note_added({'ts1': 25.4})
+    assert policy.due(True)
+
+def test_configure(clock):
+    policy = SendPolicy(interval=100, max_interval=400)
+    policy.due(True)
+    policy.sent()
+    policy.note_added({'ts1': 25.0})
+    clock.advance_to(50)
+    assert not policy.due(True)
+    policy.configure(interval=30, max_interval=400, batch_notes=5)
+    assert policy.due(True)
+    assert policy.batch_notes == 5
@@ -0,0 +1,60 @@
+import pytest
+
+from telemetry import INT16_MAX, MISSING, Telemetry, decode
+
+# Gascard concentrations as septic_tank.py stores them, x100, from the -100.0 parse error sentinel
+# through to a full scale reading
+@pytest.mark.parametrize('concentration', [-100.0, 0.0, 0.0123, 0.5, 2.5, 37.21, 100.0])
+def test_concentration_round_trip(concentration):
+    telemetry = Telemetry()
+    telemetry.set('debug-concentration', concentration * 100)
+    assert telemetry.get('debug-concentration') == pytest.approx(concentration * 100, abs=0.5)
+    note = decode(telemetry.record())
+    assert note['debug-concentration'] == pytest.approx(concentration * 100, abs=0.5)
+
+def test_concentration_sentinel():
+    telemetry = Telemetry()
+    telemetry.set('debug-concentration', -100.0 * 100)
+    assert telemetry.record()['td'][telemetry.index['debug-concentration']] == -10000
+
+def test_quantise():
+    telemetry = Telemetry()
+    i = telemetry.index['ts1']
+    assert telemetry.quantise(i, 25.34) == 253
+    assert telemetry.quantise(i, -3.26) == -33
+    assert telemetry.quantise(i, None) == MISSING
+    # Saturates rather than wrapping, and never lands on MISSING
+    assert telemetry.quantise(i, 1e6) == INT16_MAX
+    assert telemetry.quantise(i, -1e6) == -INT16_MAX
+
+def test_set_get():
+    telemetry = Telemetry()
+    assert telemetry.get('ph1') is None
+    assert telemetry.get('ph1', 7.0) == 7.0
+    telemetry.set('ph1', 6.987)
+    assert telemetry.get('ph1') == pytest.approx(6.99)
+    telemetry.set('ph1', None)
+    assert telemetry.get('ph1') is None
+
+def test_record_and_decode():
+    telemetry = Telemetry()
+    telemetry.set('ts1', 30.1)
+    telemetry.set('debug-pressure', 1013.2)
+    note = telemetry.record()
+    assert note['tv'] == 1
+    assert len(note['td']) == len(telemetry.fields)
+    assert note['td'][telemetry.index['ts1']] == 301
+    assert note['td'][telemetry.index['ts2']] is None
+    decoded = decode(dict(note, timestamp=1685577600))
+    assert decoded == {'timestamp': 1685577600, 'ts1': pytest.approx(30.1), 'debug-pressure': pytest.approx(1013.2)}
+
+def test_encode_matches_record():
+    data = {'ts1': 30.1, 'ph2': 7.25, 'debug-pressure': 1013.2}
+    telemetry = Telemetry()
+    for field, value in data.items():
+        telemetry.set(field, value)
+    assert Telemetry().encode(data) == telemetry.record()
+
+def test_decode_passes_other_notes_through():
+    note = {'jon': [1, 2], 'timestamp': 5}
+    assert decode(note) == note
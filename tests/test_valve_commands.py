@@ -0,0 +1,37 @@
+import pytest
+
+from valve_commands import parse_command
+
+@pytest.mark.parametrize('string, expected', [
+    ('v3', ('toggle', [2], None)),
+    ('v1-4 open', ('open', [0, 1, 2, 3], None)),
+    ('v1,3,5 auto', ('auto', [0, 2, 4], None)),
+    ('v1-3,8 close', ('close', [0, 1, 2, 7], None)),
+    ('v2,1-3 open', ('open', [0, 1, 2], None)),
+    ('v* close', ('close', list(range(12)), None)),
+    ('pulse v2 3', ('pulse', [1], 3)),
+    ('pulse v* 1', ('pulse', list(range(12)), 1)),
+])
+def test_valid(string, expected):
+    assert parse_command(string, 12) == expected
+
+@pytest.mark.parametrize('string', [
+    '',
+    'v6-1 open',    # reversed range
+    'v0',
+    'v13',
+    'v1-13 open',
+    'v1 shut',
+    'x1 open',
+    'v1 open now',
+    'pulse v1',
+    'pulse v1 0',
+    'pulse v1 x',
+])
+def test_invalid(string):
+    with pytest.raises(ValueError):
+        parse_command(string, 12)
+
+def test_reversed_range_suggests_order():
+    with pytest.raises(ValueError, match='v1-6'):
+        parse_command('v6-1 open', 12)
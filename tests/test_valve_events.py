@@ -0,0 +1,31 @@
+from valve_events import ValveEvents
+
+def test_coalesces_a_window(clock):
+    events = ValveEvents(window=30)
+    events.update(0, 0, 0)
+    assert not events.pending and events.poll() is None
+
+    events.update(0b001, 0, 1)
+    clock.advance(5)
+    events.update(0b011, 0, 1)
+    clock.advance(5)
+    # A short pulse on valve 1 that is shut again before the window closes
+    events.update(0b010, 0b100, 1)
+    clock.advance(10)
+    assert events.poll() is None
+    clock.advance(10)
+    assert events.poll() == {'vo': 0b010, 'vb': 0b100, 'va': 0b011, 'vx': 0b100, 'vp': 1, 'vt': 3}
+    assert not events.pending
+
+def test_next_window_starts_clean(clock):
+    events = ValveEvents(window=30)
+    events.update(0b001, 0, 1)
+    clock.advance(30)
+    events.poll()
+    # No change, no record
+    events.update(0b001, 0, 1)
+    clock.advance(60)
+    assert events.poll() is None
+    events.update(0, 0, 0)
+    clock.advance(30)
+    assert events.poll() == {'vo': 0, 'vb': 0, 'va': 0, 'vx': 0, 'vp': 0, 'vt': 1}
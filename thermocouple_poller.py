@@ -0,0 +1,49 @@
+import time
+
+class ThermocouplePoller():
+    # Reads MCP9600 thermocouple amplifiers round-robin, a fixed number per tick, so the I2C time
+    # spent per loop pass doesn't grow with the number of channels fitted.
+    # Each channel's status register is checked first and the temperature is only read once a
+    # new conversion is ready. The latest value and when it was read are kept per channel.
+    # value() gives None once a channel hasn't been read for max_age seconds, e.g. a failed or
+    # unplugged amplifier, so nothing carries on acting on its last good reading.
+
+    def __init__(self, channels, per_tick=2, max_age=60, log=None):
+        self.channels = channels
+        self.per_tick = per_tick
+        self.max_age = max_age
+        self.log = log
+
+        self.values = [None] * len(channels)
+        self.stamps = [None] * len(channels)
+        self.next_channel = 0
+
+    def poll(self):
+        count = len(self.channels)
+        for n in range(min(self.per_tick, count)):
+            i = self.next_channel
+            self.next_channel = (i + 1) % count
+            tc = self.channels[i]
+            try:
+                if tc.temperature_update:
+                    self.values[i] = tc.temperature
+                    self.stamps[i] = time.monotonic()
+                    # Flag has to be cleared by hand, ready for the next conversion
+                    tc.temperature_update = False
+            except Exception as e:
+                # Keep the previous value, value() drops it once it is older than max_age
+                if self.log:
+                    self.log.warning(f'thermocouple {i} read failed {e}')
+
+    def value(self, i):
+        # Latest reading of channel i, None if it hasn't been read or has gone stale
+        age = self.age(i)
+        if age is None or age > self.max_age:
+            return None
+        return self.values[i]
+
+    def age(self, i):
+        # Seconds since channel i was last read, None if it never has been
+        if self.stamps[i] is None:
+            return None
+        return time.monotonic() - self.stamps[i]
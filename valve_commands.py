@@ -0,0 +1,61 @@
+# Grammar for valve commands typed on the USB serial console
+#
+#   v3              toggle valve 3 (manual mode)
+#   v1-6 open       open valves 1 to 6 (manual mode)
+#   v1,3,5 auto     return valves 1, 3 and 5 to scheduled mode
+#   v* close        close every valve (manual mode)
+#   pulse v2 3      run 3 pulses on valve 2 now
+#
+# Valve numbers are 1-based, selections can mix ranges and lists e.g. v1-3,8
+
+ACTIONS = ('toggle', 'open', 'close', 'auto')
+
+def parse_selection(token, count):
+    # Returns a sorted list of 0-based valve indices
+    if not token.startswith('v'):
+        raise ValueError(f'valve selection must start with v, got {token}')
+
+    body = token[1:]
+    if body == '*':
+        return list(range(count))
+
+    indices = []
+    for part in body.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            if int(first) > int(last):
+                raise ValueError(f'valve range {part} is reversed, use v{last}-{first}')
+            numbers = range(int(first), int(last)+1)
+        else:
+            numbers = [int(part)]
+
+        for n in numbers:
+            if n < 1 or n > count:
+                raise ValueError(f'valve {n} out of range 1-{count}')
+            if n-1 not in indices:
+                indices.append(n-1)
+
+    return sorted(indices)
+
+def parse_command(string, count):
+    # Returns (action, indices, argument). Raises ValueError if the string is not valid.
+    # The whole command is parsed before anything is returned, so it is applied all or nothing.
+    words = string.split()
+    if not words:
+        raise ValueError('empty command')
+
+    if words[0] == 'pulse':
+        if len(words) != 3:
+            raise ValueError('pulse command format is "pulse v<selection> <pulses>"')
+        pulses = int(words[2])
+        if pulses < 1:
+            raise ValueError('number of pulses must be at least 1')
+        return 'pulse', parse_selection(words[1], count), pulses
+
+    indices = parse_selection(words[0], count)
+    if len(words) == 1:
+        return 'toggle', indices, None
+    if len(words) == 2 and words[1] in ACTIONS:
+        return words[1], indices, None
+
+    raise ValueError(f'unknown valve command {string}')
@@ -0,0 +1,61 @@
+import time
+
+class ValveEvents():
+    # Coalesces valve state changes into compact bitmask records.
+    # Bit n of each mask corresponds to valve n+1.
+    # Any transitions seen within 'window' seconds of the first one are
+    # folded into a single record, so a feed produces a handful of notes
+    # rather than one per valve edge.
+
+    def __init__(self, window=30):
+        self.window = window
+
+        self.open_mask = 0
+        self.blocked_mask = 0
+        self.pulse = 0
+
+        # Valves that were open or blocked at any point in the current window,
+        # so short pulses aren't lost when the window closes with them shut again
+        self.opened_mask = 0
+        self.blocked_seen_mask = 0
+
+        self.transitions = 0
+        self.timer_window = None
+
+    def update(self, open_mask, blocked_mask, pulse):
+        if open_mask != self.open_mask or blocked_mask != self.blocked_mask:
+            self.transitions += 1
+            if self.timer_window is None:
+                self.timer_window = time.monotonic()
+
+        self.open_mask = open_mask
+        self.blocked_mask = blocked_mask
+        self.pulse = pulse
+        if self.pending:
+            self.opened_mask |= open_mask
+            self.blocked_seen_mask |= blocked_mask
+
+    @property
+    def pending(self):
+        return self.timer_window is not None
+
+    def poll(self):
+        # Returns a record dict once the coalescing window has elapsed, otherwise None
+        if not self.pending:
+            return None
+        if time.monotonic() - self.timer_window < self.window:
+            return None
+
+        record = {
+            'vo' : self.open_mask,
+            'vb' : self.blocked_mask,
+            'va' : self.opened_mask,
+            'vx' : self.blocked_seen_mask,
+            'vp' : self.pulse,
+            'vt' : self.transitions,
+        }
+        self.transitions = 0
+        self.opened_mask = 0
+        self.blocked_seen_mask = 0
+        self.timer_window = None
+        return record